@@ -0,0 +1 @@
+# Benchmarks do projeto. Cada módulo pode ser executado com 'python -m benchmarks.<modulo>'.
\ No newline at end of file
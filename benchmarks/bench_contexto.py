@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Mede o tamanho das requisições ao modelo em uma conversa longa, com e sem o orçamento de contexto
+('gmailbucket_agent.context_budget').
+
+A conversa é roteirizada: cada email passa por um pedido, uma revisão (o agente devolve o rascunho no
+formato de confirmação) e um "sim", que faz o modelo falso chamar 'enviar_email' (atendido pelo Gmail
+falso). O modelo falso não chama nenhuma API: ele só conta os tokens estimados de cada requisição que
+recebe (instrução + histórico), que é o que cresce turno a turno.
+
+Uso:
+    python -m benchmarks.bench_contexto --emails 10 --orcamento 4000
+"""
+
+# --- Importações Padrão ---
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import datetime
+import tempfile
+
+from benchmarks.bench_desempenho import PASTA_RESULTADOS, _resumo, configurar_ambiente
+
+
+def criar_modelo_roteirizado(tokens_por_chamada: list, palavras_corpo: int):
+    """Modelo do ADK que segue o roteiro da conversa e anota os tokens estimados de cada requisição."""
+    from google.adk.models.base_llm import BaseLlm
+    from google.adk.models.llm_response import LlmResponse
+    from google.genai import types
+    from gmailbucket_agent.context_budget import estimar_tokens
+
+    class ModeloRoteirizado(BaseLlm):
+        model: str = "roteirizado"
+
+        async def generate_content_async(self, llm_request, stream=False):
+            instrucao = str(llm_request.config.system_instruction or "") if llm_request.config else ""
+            tokens_por_chamada.append(len(instrucao) // 4 + sum(estimar_tokens(c) for c in llm_request.contents))
+            ultimo = llm_request.contents[-1]
+            texto = "".join(parte.text for parte in ultimo.parts or [] if parte.text)
+            if any(parte.function_response for parte in ultimo.parts or []):
+                parte = types.Part(text="Email enviado com sucesso!")
+            elif texto.strip() == "sim":
+                # Envia o rascunho apresentado na revisão anterior.
+                parte = types.Part(function_call=types.FunctionCall(name="enviar_email", args={
+                    "destinatarios": ["destino@example.com"], "assunto": f"Relatório {len(tokens_por_chamada)}",
+                    "corpo_mensagem": "Prezados, segue o relatório. " * (palavras_corpo // 5),
+                }))
+            else:
+                parte = types.Part(text=(
+                    "Eu fiz algumas melhorias no seu email. Veja como ficou:\n\n"
+                    "**Destinatários:** destino@example.com\n"
+                    f"**Assunto:** Relatório {len(tokens_por_chamada)}\n"
+                    f"**Corpo:**\n{'Prezados, segue o relatório. ' * (palavras_corpo // 5)}\n"
+                    "**Anexos:** Nenhum\n\nVocê aprova esta versão? Posso enviar?"
+                ))
+            yield LlmResponse(content=types.Content(role="model", parts=[parte]))
+
+    return ModeloRoteirizado()
+
+
+def medir_conversa(main, orcamento: int, emails: int, palavras_corpo: int) -> dict:
+    """Roda a conversa inteira em uma sessão nova e resume os tokens por chamada e a duração dos turnos."""
+    from gmailbucket_agent import context_budget
+    from gmailbucket_agent.chat_stream import garantir_sessao, responder
+
+    context_budget.CONTEXTO_ORCAMENTO_TOKENS = orcamento
+    tokens: list = []
+    main.root_agent.model = criar_modelo_roteirizado(tokens, palavras_corpo)
+
+    async def executar() -> list:
+        usuario = f"bench-contexto-{orcamento}"
+        sessao = await garantir_sessao(main.program, usuario, None)
+        duracoes = []
+        for n in range(emails):
+            for mensagem in (f"Quero mandar o relatório {n} para destino@example.com", "Deixe mais formal", "sim"):
+                inicio = time.perf_counter()
+                await responder(main.program, usuario, sessao, mensagem)
+                duracoes.append(time.perf_counter() - inicio)
+        return duracoes
+
+    duracoes = asyncio.run(executar())
+    resumo = _resumo(duracoes)
+    resumo.update({
+        "tokens_total": sum(tokens),
+        "tokens_ultima_chamada": tokens[-1],
+        "tokens_maximo": max(tokens),
+        "chamadas": len(tokens),
+    })
+    return resumo
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=10, help="Emails enviados na conversa (padrão: 10).")
+    parser.add_argument("--palavras-corpo", type=int, default=300, help="Palavras do corpo de cada rascunho.")
+    parser.add_argument("--orcamento", type=int, default=4000, help="Orçamento de tokens do histórico (padrão: 4000).")
+    parser.add_argument("--saida", help="Arquivo JSON do resultado (padrão: benchmarks/resultados/contexto-<data>.json).")
+    args = parser.parse_args()
+
+    from benchmarks.fakes import GCSFalso, GmailFalso, credenciais_falsas
+
+    with tempfile.TemporaryDirectory() as pasta, GCSFalso() as gcs, GmailFalso() as gmail:
+        configurar_ambiente(gcs.url, gmail.url, pasta, False)
+        from gmailbucket_agent import main as servidor
+        from gmailbucket_agent.tools import gmail_client
+
+        gmail_client._gerenciador = gmail_client.GmailClientManager(credenciais=credenciais_falsas())
+        resultados = {"contexto": {
+            "sem_orcamento": medir_conversa(servidor, 0, args.emails, args.palavras_corpo),
+            "com_orcamento": medir_conversa(servidor, args.orcamento, args.emails, args.palavras_corpo),
+        }}
+
+    relatorio = {
+        "data": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "parametros": {chave: valor for chave, valor in vars(args).items() if chave != "saida"},
+        "resultados": resultados,
+    }
+    saida = args.saida or os.path.join(
+        PASTA_RESULTADOS, f"contexto-{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(saida)), exist_ok=True)
+    with open(saida, "w", encoding="utf-8") as f:
+        json.dump(relatorio, f, indent=2, ensure_ascii=False)
+
+    for caso, medidas in resultados["contexto"].items():
+        print(f"{caso:>14}: {medidas['chamadas']} chamadas, {medidas['tokens_total']:8d} tokens no total,"
+              f" última {medidas['tokens_ultima_chamada']:6d}, máximo {medidas['tokens_maximo']:6d},"
+              f" turno mediano {medidas['mediana_s'] * 1000:6.1f} ms")
+    print(f"Resultado gravado em {saida}")
+
+
+if __name__ == "__main__":
+    main()
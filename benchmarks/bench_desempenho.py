@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Suíte de desempenho do projeto, sem acesso à rede: sobe um GCS falso e um Gmail falso locais
+(ver 'benchmarks.fakes'), troca o modelo do agente por um modelo falso e mede:
+
+- "upload": vazão do endpoint /upload para vários tamanhos de arquivo;
+- "envio": latência de 'enviar_email' sem anexo, com um anexo pequeno e com um anexo grande
+  (acima de GMAIL_LIMIAR_MENSAGEM_GRANDE, que usa o upload de mídia);
+- "chat": vazão do endpoint /chat com várias conversas simultâneas.
+
+O resultado é gravado em JSON (ver '--saida') e pode ser comparado com outra execução por
+'python -m benchmarks.comparar base.json novo.json'.
+
+Uso:
+    python -m benchmarks.bench_desempenho --repeticoes 5 --tamanhos-mb 1 8 32 --concorrencia 16
+"""
+
+# --- Importações Padrão ---
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import datetime
+import statistics
+import tempfile
+
+# Pasta padrão dos resultados (ignorada pelo git).
+PASTA_RESULTADOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resultados")
+BUCKET = "bench-bucket"
+PASTA = "anexos"
+
+
+def _resumo(amostras: list) -> dict:
+    """Mediana, p95, mínimo e máximo de uma lista de durações (em segundos)."""
+    ordenadas = sorted(amostras)
+    p95 = ordenadas[min(len(ordenadas) - 1, int(round(0.95 * (len(ordenadas) - 1))))]
+    return {"mediana_s": statistics.median(ordenadas), "p95_s": p95, "min_s": ordenadas[0], "max_s": ordenadas[-1]}
+
+
+def configurar_ambiente(gcs_url: str, gmail_url: str, pasta: str, com_cache: bool) -> None:
+    """Aponta o projeto para os servidores falsos. Deve rodar ANTES de importar 'gmailbucket_agent'."""
+    os.environ.update({
+        "STORAGE_EMULATOR_HOST": gcs_url,
+        "GMAIL_API_ENDPOINT": gmail_url + "/",
+        "GCS_ATTACHMENT_PATH": f"{BUCKET}/{PASTA}",
+        "GOOGLE_CLOUD_PROJECT": "bench",
+        "SESSOES_DB_PATH": os.path.join(pasta, "sessoes.db"),
+        "ENVIOS_DB_PATH": os.path.join(pasta, "envios.db"),
+        "ANEXOS_CACHE_DIR": os.path.join(pasta, "cache"),
+    })
+    if not com_cache:
+        # Sem cache, cada envio mede o download real dos anexos.
+        os.environ.update({"ANEXOS_CACHE_MEMORIA_BYTES": "0", "ANEXOS_CACHE_DISCO_BYTES": "0"})
+
+
+def medir_upload(cliente, tamanhos_mb: list, repeticoes: int) -> dict:
+    """Envia arquivos de cada tamanho ao endpoint /upload e mede a vazão (MiB/s)."""
+    resultados = {}
+    for tamanho_mb in tamanhos_mb:
+        conteudo = os.urandom(int(tamanho_mb * 1024 * 1024))
+        duracoes = []
+        for i in range(repeticoes):
+            inicio = time.perf_counter()
+            resposta = cliente.post("/upload", files={"file": (f"upload_{tamanho_mb}mb_{i}.bin", conteudo, "application/octet-stream")})
+            duracoes.append(time.perf_counter() - inicio)
+            if not resposta.json().get("success"):
+                raise RuntimeError(f"Upload falhou: {resposta.text}")
+        resumo = _resumo(duracoes)
+        resumo["mib_por_s"] = tamanho_mb / resumo["mediana_s"]
+        resultados[f"{tamanho_mb}MiB"] = resumo
+    return resultados
+
+
+def medir_envio(gcs, repeticoes: int, tamanho_pequeno_kb: int, tamanho_grande_mb: int) -> dict:
+    """Mede a latência de 'enviar_email' (a mesma função chamada pela ferramenta do agente)."""
+    from gmailbucket_agent.tools.funcs import enviar_email
+
+    gcs.guardar(BUCKET, f"{PASTA}/pequeno.pdf", os.urandom(tamanho_pequeno_kb * 1024), "application/pdf")
+    gcs.guardar(BUCKET, f"{PASTA}/grande.bin", os.urandom(tamanho_grande_mb * 1024 * 1024))
+    casos = {
+        "sem_anexo": None,
+        f"anexo_{tamanho_pequeno_kb}KiB": ["pequeno.pdf"],
+        f"anexo_{tamanho_grande_mb}MiB": ["grande.bin"],
+    }
+
+    async def executar() -> dict:
+        resultados = {}
+        for nome, anexos in casos.items():
+            duracoes = []
+            for _ in range(repeticoes):
+                inicio = time.perf_counter()
+                mensagem = await enviar_email(["destino@example.com"], "Benchmark", "Corpo do email.", anexos)
+                duracoes.append(time.perf_counter() - inicio)
+                if "sucesso" not in mensagem:
+                    raise RuntimeError(f"Envio falhou: {mensagem}")
+            resultados[nome] = _resumo(duracoes)
+        return resultados
+
+    return asyncio.run(executar())
+
+
+def medir_chat(app, concorrencia: int, mensagens_por_conversa: int) -> dict:
+    """Conversas simultâneas no endpoint /chat; mede a vazão (mensagens/s) e a latência de cada mensagem."""
+    import httpx
+
+    async def conversa(indice: int, duracoes: list) -> None:
+        # Cada conversa vem de um IP diferente, como usuários distintos para o controle de admissão.
+        transporte = httpx.ASGITransport(app=app, client=(f"10.0.{indice // 250}.{indice % 250 + 1}", 40000))
+        session_id = None
+        async with httpx.AsyncClient(transport=transporte, base_url="http://bench", timeout=120) as cliente:
+            for n in range(mensagens_por_conversa):
+                inicio = time.perf_counter()
+                resposta = await cliente.post("/chat", json={
+                    "message": f"mensagem {n}", "session_id": session_id, "user_id": f"bench-{indice}",
+                })
+                duracoes.append(time.perf_counter() - inicio)
+                dados = resposta.json()
+                if not dados.get("success"):
+                    raise RuntimeError(f"Chat falhou: {dados}")
+                session_id = dados["session_id"]
+
+    async def executar() -> dict:
+        duracoes: list = []
+        inicio = time.perf_counter()
+        await asyncio.gather(*(conversa(i, duracoes) for i in range(concorrencia)))
+        total = time.perf_counter() - inicio
+        resumo = _resumo(duracoes)
+        resumo.update({"mensagens": len(duracoes), "total_s": total, "mensagens_por_s": len(duracoes) / total})
+        return resumo
+
+    return asyncio.run(executar())
+
+
+def executar(args) -> dict:
+    """Roda a suíte inteira e devolve o relatório."""
+    from benchmarks.fakes import (
+        GCSFalso, GmailFalso, credenciais_falsas, criar_modelo_falso, permitir_upload_de_midia_por_http,
+    )
+
+    with tempfile.TemporaryDirectory() as pasta, \
+            GCSFalso(latencia=args.latencia_gcs_ms / 1000) as gcs, \
+            GmailFalso(latencia=args.latencia_gmail_ms / 1000) as gmail:
+        configurar_ambiente(gcs.url, gmail.url, pasta, args.com_cache)
+
+        # Só agora o projeto é importado, já apontado para os servidores falsos.
+        from fastapi.testclient import TestClient
+        from gmailbucket_agent import main
+        from gmailbucket_agent.tools import gmail_client
+
+        gmail_client._gerenciador = gmail_client.GmailClientManager(credenciais=credenciais_falsas())
+        permitir_upload_de_midia_por_http()
+        main.root_agent.model = criar_modelo_falso(latencia=args.latencia_llm_ms / 1000)
+
+        resultados = {}
+        if "upload" in args.casos:
+            with TestClient(main.app) as cliente:
+                resultados["upload"] = medir_upload(cliente, args.tamanhos_mb, args.repeticoes)
+        if "envio" in args.casos:
+            resultados["envio"] = medir_envio(gcs, args.repeticoes, args.anexo_pequeno_kb, args.anexo_grande_mb)
+        if "chat" in args.casos:
+            resultados["chat"] = medir_chat(main.app, args.concorrencia, args.mensagens_por_conversa)
+
+    return {
+        "data": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "plataforma": platform.platform(),
+        "parametros": {chave: valor for chave, valor in vars(args).items() if chave != "saida"},
+        "resultados": resultados,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--casos", nargs="+", choices=("upload", "envio", "chat"), default=["upload", "envio", "chat"])
+    parser.add_argument("--repeticoes", type=int, default=5, help="Repetições de cada upload e envio (padrão: 5).")
+    parser.add_argument("--tamanhos-mb", type=float, nargs="+", default=[1, 8, 32], help="Tamanhos dos uploads, em MiB.")
+    parser.add_argument("--anexo-pequeno-kb", type=int, default=256, help="Anexo pequeno, em KiB (padrão: 256).")
+    parser.add_argument("--anexo-grande-mb", type=int, default=8, help="Anexo grande, em MiB (padrão: 8).")
+    parser.add_argument("--concorrencia", type=int, default=16, help="Conversas simultâneas no /chat (padrão: 16).")
+    parser.add_argument("--mensagens-por-conversa", type=int, default=5, help="Mensagens por conversa (padrão: 5).")
+    parser.add_argument("--latencia-gcs-ms", type=float, default=0, help="Latência artificial do GCS falso.")
+    parser.add_argument("--latencia-gmail-ms", type=float, default=0, help="Latência artificial do Gmail falso.")
+    parser.add_argument("--latencia-llm-ms", type=float, default=0, help="Latência artificial do modelo falso.")
+    parser.add_argument("--com-cache", action="store_true", help="Mantém o cache de anexos ligado nos envios.")
+    parser.add_argument("--saida", help="Arquivo JSON do resultado (padrão: benchmarks/resultados/bench-<data>.json).")
+    args = parser.parse_args()
+
+    relatorio = executar(args)
+    saida = args.saida or os.path.join(
+        PASTA_RESULTADOS, f"bench-{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(saida)), exist_ok=True)
+    with open(saida, "w", encoding="utf-8") as f:
+        json.dump(relatorio, f, indent=2, ensure_ascii=False)
+
+    for grupo, casos in relatorio["resultados"].items():
+        if "mediana_s" in casos:
+            casos = {"": casos}
+        for caso, medidas in casos.items():
+            extra = ""
+            if "mib_por_s" in medidas:
+                extra = f"  {medidas['mib_por_s']:8.1f} MiB/s"
+            elif "mensagens_por_s" in medidas:
+                extra = f"  {medidas['mensagens_por_s']:8.1f} mensagens/s"
+            print(f"{grupo:>7} {caso:>14}: mediana {medidas['mediana_s'] * 1000:8.1f} ms  p95 {medidas['p95_s'] * 1000:8.1f} ms{extra}")
+    print(f"Resultado gravado em {saida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Compara o pico de memória (RSS) ao montar uma mensagem com um anexo grande:
+
+- "atual": o caminho do campo 'raw' (download_as_bytes -> MIMEBase -> Base64 -> as_bytes -> urlsafe_b64encode -> JSON);
+- "streaming": o caminho de mensagens grandes (arquivo temporário + upload de mídia em blocos).
+
+Cada modo roda em um processo separado, porque o pico de RSS de um processo nunca diminui.
+Nenhuma chamada de rede é feita: o "download" lê um arquivo local e o "upload" apenas percorre os blocos.
+
+Uso:
+    python -m benchmarks.bench_memoria_mime --tamanho-mb 20
+"""
+
+# --- Importações Padrão ---
+import os
+import sys
+import json
+import argparse
+import resource
+import subprocess
+import tempfile
+
+
+def _pico_rss_bytes() -> int:
+    """Pico de RSS do processo atual, em bytes (o Linux informa em KiB; o macOS, em bytes)."""
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico if sys.platform == "darwin" else pico * 1024
+
+
+def _modo_atual(caminho_anexo: str) -> None:
+    """Monta a mensagem como o envio normal faz: tudo na memória, até o corpo JSON da requisição."""
+    from gmailbucket_agent.tools.funcs import codificar_mensagem, definir_cabecalhos, montar_mensagem, montar_parte_anexo
+    base = _pico_rss_bytes()
+    with open(caminho_anexo, "rb") as f:
+        # Equivale a 'blob.download_as_bytes()'.
+        conteudo = f.read()
+    message = montar_mensagem("Segue o anexo.", [montar_parte_anexo("anexo.bin", conteudo)])
+    definir_cabecalhos(message, ["destino@example.com"], "Benchmark")
+    # A biblioteca do Google serializa o corpo da requisição em JSON antes de enviá-lo.
+    corpo_json = json.dumps(codificar_mensagem(message))
+    print(json.dumps({"modo": "atual", "pico_bytes": _pico_rss_bytes() - base, "tamanho_enviado": len(corpo_json)}))
+
+
+def _modo_streaming(caminho_anexo: str, tamanho_chunk: int) -> None:
+    """Monta a mensagem em arquivo temporário e percorre os blocos do upload de mídia."""
+    from googleapiclient.http import MediaIoBaseUpload
+    from gmailbucket_agent.tools.large_message import escrever_mensagem_rfc822
+    base = _pico_rss_bytes()
+    enviado = 0
+    with open(caminho_anexo, "rb") as anexo, tempfile.TemporaryFile() as mensagem:
+        escrever_mensagem_rfc822(mensagem, ["destino@example.com"], "Benchmark", "Segue o anexo.", [("anexo.bin", anexo)])
+        mensagem.seek(0)
+        media = MediaIoBaseUpload(mensagem, mimetype="message/rfc822", chunksize=tamanho_chunk, resumable=True)
+        # Lê os blocos exatamente como 'next_chunk()' faria antes de cada PUT.
+        while enviado < media.size():
+            enviado += len(media.getbytes(enviado, media.chunksize()))
+    print(json.dumps({"modo": "streaming", "pico_bytes": _pico_rss_bytes() - base, "tamanho_enviado": enviado}))
+
+
+def executar(tamanho_mb: int, tamanho_chunk: int) -> dict:
+    """Gera um anexo aleatório de 'tamanho_mb' MiB e mede os dois modos, cada um em um subprocesso."""
+    with tempfile.NamedTemporaryFile(delete=False) as f:
+        for _ in range(tamanho_mb):
+            f.write(os.urandom(1024 * 1024))
+        caminho_anexo = f.name
+    try:
+        resultados = {}
+        for modo in ("atual", "streaming"):
+            saida = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_memoria_mime", "--modo", modo,
+                 "--arquivo", caminho_anexo, "--chunk", str(tamanho_chunk)],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            resultados[modo] = json.loads(saida.strip().splitlines()[-1])
+    finally:
+        os.remove(caminho_anexo)
+    return {"tamanho_anexo_bytes": tamanho_mb * 1024 * 1024, "tamanho_chunk": tamanho_chunk, "resultados": resultados}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanho-mb", type=int, default=20, help="Tamanho do anexo em MiB (padrão: 20).")
+    parser.add_argument("--chunk", type=int, default=1024 * 1024, help="Tamanho do bloco de upload (padrão: 1 MiB).")
+    parser.add_argument("--modo", choices=("atual", "streaming"), help=argparse.SUPPRESS)
+    parser.add_argument("--arquivo", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # Processo filho: mede um único modo.
+    if args.modo == "atual":
+        return _modo_atual(args.arquivo)
+    if args.modo == "streaming":
+        return _modo_streaming(args.arquivo, args.chunk)
+
+    relatorio = executar(args.tamanho_mb, args.chunk)
+    for modo, resultado in relatorio["resultados"].items():
+        print(f"{modo:>10}: pico de RSS +{resultado['pico_bytes'] / 1024 / 1024:8.1f} MiB")
+    print(json.dumps(relatorio, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Mede a partida a frio do servidor do chat ('gmailbucket_agent.main'):
+
+- o tempo para importar o módulo (o que o uvicorn faz antes de aceitar conexões);
+- a latência da primeira requisição a "/" e da primeira (e da segunda) mensagem a "/chat";
+- quais bibliotecas pesadas já estão carregadas logo após a importação.
+
+Cada medição roda em um processo novo (a importação só é "fria" uma vez por processo).
+O modelo é substituído por um modelo falso que responde na hora, e as sessões e a fila de
+envios usam bancos temporários: nenhuma chamada de rede é feita.
+
+Uso:
+    python -m benchmarks.bench_startup --repeticoes 5
+"""
+
+# --- Importações Padrão ---
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+# Bibliotecas que não deveriam ser carregadas só para o servidor subir.
+MODULOS_PESADOS = (
+    "vertexai", "googleapiclient.discovery", "googleapiclient.http",
+    "google_auth_oauthlib", "google.cloud.storage",
+)
+
+
+def _modo_filho() -> None:
+    """Importa o servidor, faz as primeiras requisições e imprime as medições em JSON."""
+    inicio = time.perf_counter()
+    from gmailbucket_agent import main
+    tempo_importacao = time.perf_counter() - inicio
+    carregados = [modulo for modulo in MODULOS_PESADOS if modulo in sys.modules]
+
+    from fastapi.testclient import TestClient
+    from benchmarks.fakes import criar_modelo_falso
+
+    main.root_agent.model = criar_modelo_falso()
+    cliente = TestClient(main.app)
+
+    def medir(metodo, *args, **kwargs) -> float:
+        inicio = time.perf_counter()
+        resposta = metodo(*args, **kwargs)
+        resposta.raise_for_status()
+        return time.perf_counter() - inicio
+
+    resultado = {
+        "importacao_s": tempo_importacao,
+        "primeira_pagina_s": medir(cliente.get, "/"),
+        "primeiro_chat_s": medir(cliente.post, "/chat", json={"message": "oi", "user_id": "bench"}),
+        "segundo_chat_s": medir(cliente.post, "/chat", json={"message": "oi de novo", "user_id": "bench"}),
+        "modulos_pesados_carregados": carregados,
+    }
+    print(json.dumps(resultado))
+
+
+def executar(repeticoes: int) -> dict:
+    """Roda 'repeticoes' processos novos e devolve as medianas de cada medição."""
+    medicoes = []
+    with tempfile.TemporaryDirectory() as pasta:
+        ambiente = dict(
+            os.environ,
+            SESSOES_DB_PATH=os.path.join(pasta, "sessoes.db"),
+            ENVIOS_DB_PATH=os.path.join(pasta, "envios.db"),
+        )
+        for _ in range(repeticoes):
+            saida = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_startup", "--filho"],
+                check=True, capture_output=True, text=True, env=ambiente,
+            ).stdout
+            medicoes.append(json.loads(saida.strip().splitlines()[-1]))
+    chaves = ("importacao_s", "primeira_pagina_s", "primeiro_chat_s", "segundo_chat_s")
+    return {
+        "repeticoes": repeticoes,
+        "mediana": {chave: statistics.median(m[chave] for m in medicoes) for chave in chaves},
+        "modulos_pesados_carregados": medicoes[-1]["modulos_pesados_carregados"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticoes", type=int, default=5, help="Quantos processos medir (padrão: 5).")
+    parser.add_argument("--filho", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.filho:
+        return _modo_filho()
+
+    relatorio = executar(args.repeticoes)
+    for chave, valor in relatorio["mediana"].items():
+        print(f"{chave:>18}: {valor * 1000:8.1f} ms")
+    print(json.dumps(relatorio, indent=2))
+
+
+if __name__ == "__main__":
+    main()
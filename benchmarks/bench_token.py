@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+Simula vários workers (processos) com várias threads renovando o mesmo token.json ao mesmo tempo,
+contra um endpoint de token do OAuth falso ('benchmarks.fakes.OAuthFalso'), e conta:
+
+- quantas renovações chegaram ao servidor OAuth em cada fase;
+- quantas leituras encontraram o token.json corrompido (ou falharam de outro jeito).
+
+Fase 1: todos pedem as credenciais com o token.json já vencido (partida dos workers).
+Fase 2: todos recebem um 401 ao mesmo tempo e pedem um token novo (o que o google-auth faz sozinho).
+
+O modo "ingenuo" repete o comportamento anterior (cada chamada lê, renova e regrava o arquivo sem trava);
+o modo "corretor" usa o 'CorretorDeToken' ('gmailbucket_agent.tools.token_broker'), que deveria fazer
+uma única renovação por fase, somando todos os processos.
+
+Uso:
+    python -m benchmarks.bench_token --processos 4 --threads 8
+"""
+
+# --- Importações Padrão ---
+import os
+import sys
+import json
+import time
+import argparse
+import datetime
+import tempfile
+import threading
+import subprocess
+
+from benchmarks.bench_desempenho import PASTA_RESULTADOS
+
+# Intervalo (em segundos) entre o início combinado das duas fases.
+INTERVALO_FASES = 1.5
+# Raiz do repositório: os processos filhos rodam nela para importar 'benchmarks' e 'gmailbucket_agent'.
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _esperar_ate(instante: float) -> None:
+    time.sleep(max(0.0, instante - time.time()))
+
+
+def _modo_filho(modo: str, caminho: str, threads: int, oauth_url: str) -> None:
+    """
+    Avisa que está pronto, lê do stdin o instante combinado de início e roda as duas fases com
+    'threads' threads. Imprime, em JSON, os erros e os tokens vistos.
+    """
+    from benchmarks.fakes import apontar_oauth_para
+    from google.auth.transport.requests import Request
+    from google.oauth2.credentials import Credentials
+    from gmailbucket_agent.tools.gmail_client import SCOPES
+    from gmailbucket_agent.tools.token_broker import CorretorDeToken
+
+    apontar_oauth_para(oauth_url)
+    corretor = CorretorDeToken(caminho, "", SCOPES)
+    erros: list = []
+    tokens: set = set()
+    lock = threading.Lock()
+    print("pronto", flush=True)
+    inicio = float(sys.stdin.readline())
+
+    def partida():
+        if modo == "corretor":
+            return corretor.credenciais()
+        # Comportamento anterior: cada chamada lê o arquivo, renova se preciso e o regrava sem trava.
+        creds = Credentials.from_authorized_user_file(caminho, SCOPES)
+        if not creds.valid:
+            creds.refresh(Request())
+            with open(caminho, "w") as arquivo:
+                arquivo.write(creds.to_json())
+        return creds
+
+    def recusa(creds):
+        # A API respondeu 401: o google-auth chama 'refresh' nas credenciais que fizeram a requisição.
+        creds.refresh(Request())
+        if modo != "corretor":
+            with open(caminho, "w") as arquivo:
+                arquivo.write(creds.to_json())
+
+    def trabalhador():
+        creds = None
+        for fase, instante in ((1, inicio), (2, inicio + INTERVALO_FASES)):
+            _esperar_ate(instante)
+            try:
+                creds = partida() if fase == 1 else recusa(creds) or creds
+                with lock:
+                    tokens.add(creds.token)
+            except Exception as e:
+                with lock:
+                    erros.append(f"fase {fase}: {type(e).__name__}: {e}")
+                return
+
+    grupo = [threading.Thread(target=trabalhador) for _ in range(threads)]
+    for thread in grupo:
+        thread.start()
+    for thread in grupo:
+        thread.join()
+    print(json.dumps({"erros": erros, "tokens": sorted(tokens)}))
+
+
+def medir(modo: str, processos: int, threads: int, latencia: float) -> dict:
+    """Roda os processos contra um OAuth falso novo e resume as renovações e os erros de cada fase."""
+    from benchmarks.fakes import OAuthFalso
+
+    with tempfile.TemporaryDirectory() as pasta, OAuthFalso(latencia=latencia) as oauth:
+        caminho = os.path.join(pasta, "token.json")
+        vencido = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(minutes=5)
+        with open(caminho, "w") as arquivo:
+            json.dump({
+                "token": "token-vencido", "refresh_token": "refresh-falso",
+                "client_id": "cliente-falso", "client_secret": "segredo-falso",
+                "scopes": ["https://www.googleapis.com/auth/gmail.send"],
+                "expiry": vencido.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            }, arquivo)
+        ambiente = dict(
+            os.environ,
+            GCS_ATTACHMENT_PATH="bench/anexos",
+            SESSOES_DB_PATH=os.path.join(pasta, "sessoes.db"),
+            ENVIOS_DB_PATH=os.path.join(pasta, "envios.db"),
+        )
+        filhos = [
+            subprocess.Popen(
+                [sys.executable, "-m", "benchmarks.bench_token", "--filho", modo, caminho, str(threads), oauth.url],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, env=ambiente, cwd=RAIZ,
+            )
+            for _ in range(processos)
+        ]
+        # Os processos demoram a importar o pacote; as fases começam em um instante combinado,
+        # informado quando todos estão prontos.
+        for filho in filhos:
+            filho.stdout.readline()
+        inicio = time.time() + 0.5
+        for filho in filhos:
+            filho.stdin.write(f"{inicio}\n")
+            filho.stdin.flush()
+        _esperar_ate(inicio + INTERVALO_FASES - 0.1)
+        renovacoes_fase1 = oauth.renovacoes
+        saidas = [json.loads(filho.communicate()[0].strip().splitlines()[-1]) for filho in filhos]
+        renovacoes_total = oauth.renovacoes
+
+    erros = [erro for saida in saidas for erro in saida["erros"]]
+    return {
+        "renovacoes_fase1": renovacoes_fase1,
+        "renovacoes_fase2": renovacoes_total - renovacoes_fase1,
+        "erros": len(erros),
+        "exemplos_de_erro": erros[:3],
+        "tokens_distintos": len({token for saida in saidas for token in saida["tokens"]}),
+    }
+
+
+def main() -> None:
+    if len(sys.argv) > 1 and sys.argv[1] == "--filho":
+        _modo_filho(sys.argv[2], sys.argv[3], int(sys.argv[4]), sys.argv[5])
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processos", type=int, default=4, help="Workers simulados (padrão: 4).")
+    parser.add_argument("--threads", type=int, default=8, help="Threads por worker (padrão: 8).")
+    parser.add_argument("--latencia", type=float, default=0.2, help="Latência do OAuth falso em segundos (padrão: 0,2).")
+    parser.add_argument("--saida", help="Arquivo JSON do resultado (padrão: benchmarks/resultados/token-<data>.json).")
+    args = parser.parse_args()
+
+    resultados = {"token": {
+        modo: medir(modo, args.processos, args.threads, args.latencia) for modo in ("ingenuo", "corretor")
+    }}
+    relatorio = {
+        "data": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "parametros": {chave: valor for chave, valor in vars(args).items() if chave != "saida"},
+        "resultados": resultados,
+    }
+    saida = args.saida or os.path.join(
+        PASTA_RESULTADOS, f"token-{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(saida)), exist_ok=True)
+    with open(saida, "w", encoding="utf-8") as f:
+        json.dump(relatorio, f, indent=2, ensure_ascii=False)
+
+    for modo, medidas in resultados["token"].items():
+        print(f"{modo:>9}: renovações {medidas['renovacoes_fase1']:3d} (partida) + {medidas['renovacoes_fase2']:3d} (401),"
+              f" {medidas['erros']:3d} erros, {medidas['tokens_distintos']:3d} tokens distintos")
+        for erro in medidas["exemplos_de_erro"]:
+            print(f"{'':>11}{erro}")
+    print(f"Resultado gravado em {saida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Compara dois resultados da suíte de desempenho ('benchmarks.bench_desempenho') e aponta regressões.
+
+Cada medida numérica de 'resultados' é comparada pelo seu caminho (ex: 'envio.anexo_8MiB.mediana_s').
+Medidas terminadas em '_por_s' (vazão) são "quanto maior, melhor"; as demais (durações) são
+"quanto menor, melhor". Uma piora acima da tolerância é uma regressão e o processo sai com código 1,
+o que permite usar o script como verificação no CI.
+
+Uso:
+    python -m benchmarks.comparar base.json novo.json --tolerancia 10
+"""
+
+# --- Importações Padrão ---
+import sys
+import json
+import argparse
+
+# Medidas ignoradas na comparação (extremos são muito ruidosos; contagens não são desempenho).
+MEDIDAS_IGNORADAS = ("min_s", "max_s", "mensagens", "chamadas")
+
+
+def achatar(dados: dict, prefixo: str = "") -> dict:
+    """Transforma o dicionário aninhado de resultados em {'grupo.caso.medida': valor}."""
+    medidas = {}
+    for chave, valor in dados.items():
+        caminho = f"{prefixo}.{chave}" if prefixo else chave
+        if isinstance(valor, dict):
+            medidas.update(achatar(valor, caminho))
+        elif isinstance(valor, (int, float)) and not isinstance(valor, bool) and chave not in MEDIDAS_IGNORADAS:
+            medidas[caminho] = float(valor)
+    return medidas
+
+
+def comparar(base: dict, novo: dict, tolerancia: float) -> list:
+    """
+    Devolve uma linha por medida presente nos dois resultados: (caminho, base, novo, variação %, regressão?).
+    A variação é positiva quando o novo resultado é PIOR que a base.
+    """
+    medidas_base = achatar(base.get("resultados", {}))
+    medidas_novo = achatar(novo.get("resultados", {}))
+    linhas = []
+    for caminho in sorted(medidas_base.keys() & medidas_novo.keys()):
+        antes, depois = medidas_base[caminho], medidas_novo[caminho]
+        if antes == 0:
+            continue
+        variacao = (depois - antes) / antes * 100
+        if caminho.endswith("_por_s"):
+            variacao = -variacao
+        linhas.append((caminho, antes, depois, variacao, variacao > tolerancia))
+    return linhas
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base", help="Resultado de referência (JSON).")
+    parser.add_argument("novo", help="Resultado a comparar (JSON).")
+    parser.add_argument("--tolerancia", type=float, default=10.0,
+                        help="Piora máxima aceita, em porcentagem (padrão: 10).")
+    args = parser.parse_args()
+
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.novo, encoding="utf-8") as f:
+        novo = json.load(f)
+
+    linhas = comparar(base, novo, args.tolerancia)
+    if not linhas:
+        print("Nenhuma medida em comum entre os dois resultados.")
+        sys.exit(2)
+
+    regressoes = 0
+    for caminho, antes, depois, variacao, regressao in linhas:
+        marca = "REGRESSÃO" if regressao else ""
+        print(f"{caminho:<40} {antes:12.4f} -> {depois:12.4f}  {variacao:+7.1f}% {marca}")
+        regressoes += regressao
+    print(f"{regressoes} regressão(ões) acima de {args.tolerancia:.0f}% em {len(linhas)} medidas.")
+    sys.exit(1 if regressoes else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,471 @@
+# -*- coding: utf-8 -*-
+"""
+Servidores HTTP locais que imitam as partes do GCS e do Gmail usadas pelo projeto, e um modelo
+falso para o Runner do ADK. Servem para medir o código sem acesso à rede.
+
+- 'GCSFalso': metadados, download (com 'Range'), upload simples, multipart e resumível, cópia e remoção
+  de objetos (com a precondição 'ifGenerationMatch' nos uploads e nas cópias).
+  O cliente do GCS é apontado para ele pela variável STORAGE_EMULATOR_HOST.
+- 'GmailFalso': 'messages.send' pelo campo 'raw', por upload de mídia resumível e em lote ('/batch/gmail/v1',
+  multipart/mixed, com a resposta de cada envio em uma parte). O projeto é apontado para ele pela variável
+  GMAIL_API_ENDPOINT.
+- 'OAuthFalso': o endpoint de token do OAuth (renovação pelo 'refresh_token'), apontado por
+  'apontar_oauth_para'.
+- 'ModeloFalso': responde com um texto fixo depois de uma latência configurável.
+
+Os servidores aceitam uma latência artificial por requisição e uma lista de respostas de erro
+(ex: [429, 503]) devolvidas, em ordem, antes das respostas normais.
+"""
+
+# --- Importações Padrão ---
+import re
+import json
+import time
+import uuid
+import base64
+import hashlib
+import threading
+import datetime
+from email import message_from_bytes
+from email.parser import BytesHeaderParser
+from email.policy import HTTP
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, quote, unquote, urlparse
+
+
+def _agora_iso() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+class _ServidorFalso:
+    """Base dos servidores falsos: um 'ThreadingHTTPServer' em uma thread, com latência e erros injetáveis."""
+
+    def __init__(self, latencia: float = 0.0, erros: Optional[list] = None):
+        self.latencia = latencia
+        self.erros = list(erros or [])
+        self.lock = threading.Lock()
+        self.requisicoes = 0
+        servidor = self
+
+        class Manipulador(BaseHTTPRequestHandler):
+            # HTTP/1.1 mantém as conexões abertas entre requisições, como os servidores do Google.
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _atender(self):
+                tamanho = int(self.headers.get("Content-Length") or 0)
+                corpo = self.rfile.read(tamanho) if tamanho else b""
+                with servidor.lock:
+                    servidor.requisicoes += 1
+                    erro = servidor.erros.pop(0) if servidor.erros else None
+                if servidor.latencia:
+                    time.sleep(servidor.latencia)
+                if erro is not None:
+                    status, cabecalhos, resposta = erro, {"Content-Type": "application/json"}, json.dumps(
+                        {"error": {"code": erro, "message": "Erro injetado pelo servidor falso."}}
+                    ).encode()
+                else:
+                    status, cabecalhos, resposta = servidor.atender(self.command, self.path, self.headers, corpo)
+                self.send_response(status)
+                for nome, valor in cabecalhos.items():
+                    self.send_header(nome, valor)
+                self.send_header("Content-Length", str(len(resposta)))
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(resposta)
+
+            do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = do_HEAD = _atender
+
+        self._http = ThreadingHTTPServer(("127.0.0.1", 0), Manipulador)
+        self._http.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._http.server_address[1]}"
+
+    def iniciar(self) -> "_ServidorFalso":
+        self._thread = threading.Thread(target=self._http.serve_forever, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self) -> None:
+        self._http.shutdown()
+        self._http.server_close()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.parar()
+
+    def atender(self, metodo: str, caminho: str, cabecalhos, corpo: bytes) -> tuple:
+        raise NotImplementedError
+
+    @staticmethod
+    def _json(status: int, dados: dict, cabecalhos: Optional[dict] = None) -> tuple:
+        return status, dict({"Content-Type": "application/json; charset=UTF-8"}, **(cabecalhos or {})), json.dumps(dados).encode()
+
+    @staticmethod
+    def _erro(status: int, mensagem: str) -> tuple:
+        return _ServidorFalso._json(status, {"error": {"code": status, "message": mensagem}})
+
+
+class _SessoesResumiveis:
+    """Sessões de upload resumível (protocolo comum ao GCS e às APIs do Google)."""
+
+    def __init__(self):
+        self._sessoes: dict = {}
+
+    def criar(self, dados: dict) -> str:
+        id_sessao = uuid.uuid4().hex
+        self._sessoes[id_sessao] = dict(dados, buffer=bytearray())
+        return id_sessao
+
+    def receber(self, id_sessao: str, cabecalhos, corpo: bytes) -> tuple:
+        """Grava um bloco. Devolve (sessao_concluida, estado): a sessão, se terminou, ou o nº de bytes gravados."""
+        sessao = self._sessoes.get(id_sessao)
+        if sessao is None:
+            return None, None
+        intervalo = cabecalhos.get("Content-Range", "")
+        encontrado = re.match(r"bytes (\*|(\d+)-(\d+))/(\*|\d+)", intervalo)
+        total = None
+        if encontrado:
+            if encontrado.group(2) is not None:
+                inicio = int(encontrado.group(2))
+                # Bytes já gravados são ignorados; os novos são acrescentados.
+                novos = corpo[max(0, len(sessao["buffer"]) - inicio):] if inicio <= len(sessao["buffer"]) else b""
+                sessao["buffer"].extend(novos)
+            if encontrado.group(4) != "*":
+                total = int(encontrado.group(4))
+        elif corpo:
+            sessao["buffer"].extend(corpo)
+            total = len(sessao["buffer"])
+        if total is not None and len(sessao["buffer"]) >= total:
+            return self._sessoes.pop(id_sessao), None
+        return None, len(sessao["buffer"])
+
+    @staticmethod
+    def resposta_incompleta(gravados: int) -> tuple:
+        cabecalhos = {"Range": f"bytes=0-{gravados - 1}"} if gravados else {}
+        return 308, cabecalhos, b""
+
+
+class GCSFalso(_ServidorFalso):
+    """Imita a API JSON do Cloud Storage para os objetos (buckets são criados implicitamente)."""
+
+    def __init__(self, latencia: float = 0.0, erros: Optional[list] = None):
+        super().__init__(latencia, erros)
+        self.objetos: dict = {}
+        self._geracao = 1000
+        self._resumiveis = _SessoesResumiveis()
+        self.bytes_recebidos = 0
+        self.bytes_enviados = 0
+
+    # --- Estado ---
+
+    def guardar(self, bucket: str, nome: str, dados: bytes, content_type: str = "application/octet-stream",
+                metadados: Optional[dict] = None) -> dict:
+        """Cria (ou substitui) um objeto, como se tivesse sido enviado ao bucket."""
+        with self.lock:
+            self._geracao += 1
+            self.objetos[(bucket, nome)] = {
+                "dados": bytes(dados), "geracao": self._geracao, "contentType": content_type or "application/octet-stream",
+                "metadados": dict(metadados or {}), "md5": base64.b64encode(hashlib.md5(dados).digest()).decode(),
+                "criado": _agora_iso(),
+            }
+            return self._recurso(bucket, nome)
+
+    def _precondicao_falhou(self, bucket: str, nome: str, geracao_esperada) -> bool:
+        """'ifGenerationMatch': 0 exige que o objeto não exista; outro valor, que ele esteja nessa geração."""
+        if geracao_esperada is None:
+            return False
+        objeto = self.objetos.get((bucket, nome))
+        return (objeto["geracao"] if objeto else 0) != int(geracao_esperada)
+
+    def _recurso(self, bucket: str, nome: str) -> dict:
+        objeto = self.objetos[(bucket, nome)]
+        recurso = {
+            "kind": "storage#object", "id": f"{bucket}/{nome}/{objeto['geracao']}", "name": nome, "bucket": bucket,
+            "generation": str(objeto["geracao"]), "metageneration": "1", "contentType": objeto["contentType"],
+            "size": str(len(objeto["dados"])), "md5Hash": objeto["md5"],
+            "timeCreated": objeto["criado"], "updated": objeto["criado"],
+            "selfLink": f"{self.url}/storage/v1/b/{bucket}/o/{quote(nome, safe='')}",
+            "mediaLink": f"{self.url}/download/storage/v1/b/{bucket}/o/{quote(nome, safe='')}?generation={objeto['geracao']}&alt=media",
+        }
+        if objeto["metadados"]:
+            recurso["metadata"] = objeto["metadados"]
+        return recurso
+
+    # --- Rotas ---
+
+    def atender(self, metodo: str, caminho: str, cabecalhos, corpo: bytes) -> tuple:
+        url = urlparse(caminho)
+        consulta = {chave: valores[0] for chave, valores in parse_qs(url.query).items()}
+        partes = url.path.split("/")
+        with self.lock:
+            self.bytes_recebidos += len(corpo)
+
+        # Upload: /upload/storage/v1/b/<bucket>/o
+        encontrado = re.fullmatch(r"/upload/storage/v1/b/([^/]+)/o", url.path)
+        if encontrado:
+            bucket = unquote(encontrado.group(1))
+            tipo = consulta.get("uploadType")
+            if metodo == "POST" and tipo == "resumable":
+                dados = json.loads(corpo) if corpo else {}
+                nome = consulta.get("name") or dados.get("name")
+                id_sessao = self._resumiveis.criar({
+                    "bucket": bucket, "nome": nome, "contentType": dados.get("contentType") or cabecalhos.get("X-Upload-Content-Type"),
+                    "metadados": dados.get("metadata"), "ifGenerationMatch": consulta.get("ifGenerationMatch"),
+                })
+                return 200, {"Location": f"{self.url}{url.path}?uploadType=resumable&upload_id={id_sessao}"}, b""
+            if metodo == "PUT" and "upload_id" in consulta:
+                sessao, gravados = self._resumiveis.receber(consulta["upload_id"], cabecalhos, corpo)
+                if sessao is None and gravados is None:
+                    return self._erro(404, "Sessão de upload inexistente.")
+                if sessao is None:
+                    return self._resumiveis.resposta_incompleta(gravados)
+                if self._precondicao_falhou(sessao["bucket"], sessao["nome"], sessao["ifGenerationMatch"]):
+                    return self._erro(412, "Precondição de geração não atendida.")
+                return self._json(200, self.guardar(sessao["bucket"], sessao["nome"], bytes(sessao["buffer"]),
+                                                    sessao["contentType"], sessao["metadados"]))
+            if self._precondicao_falhou(bucket, consulta.get("name", ""), consulta.get("ifGenerationMatch")):
+                return self._erro(412, "Precondição de geração não atendida.")
+            if metodo == "POST" and tipo == "media":
+                return self._json(200, self.guardar(bucket, consulta["name"], corpo, cabecalhos.get("Content-Type")))
+            if metodo == "POST" and tipo == "multipart":
+                mensagem = message_from_bytes(
+                    b"Content-Type: " + cabecalhos.get("Content-Type", "").encode() + b"\r\n\r\n" + corpo, policy=HTTP
+                )
+                metadados_parte, dados_parte = list(mensagem.iter_parts())[:2]
+                dados = json.loads(metadados_parte.get_content())
+                conteudo = dados_parte.get_payload(decode=True)
+                return self._json(200, self.guardar(bucket, dados.get("name") or consulta.get("name"), conteudo,
+                                                    dados.get("contentType") or dados_parte.get_content_type(), dados.get("metadata")))
+            return self._erro(400, "Tipo de upload não suportado pelo servidor falso.")
+
+        # Download: /download/storage/v1/b/<bucket>/o/<objeto>
+        encontrado = re.fullmatch(r"/download/storage/v1/b/([^/]+)/o/(.+)", url.path)
+        if encontrado or (len(partes) > 6 and consulta.get("alt") == "media"):
+            if not encontrado:
+                encontrado = re.fullmatch(r"/storage/v1/b/([^/]+)/o/(.+)", url.path)
+            chave = (unquote(encontrado.group(1)), unquote(encontrado.group(2)))
+            objeto = self.objetos.get(chave)
+            if objeto is None or ("generation" in consulta and int(consulta["generation"]) != objeto["geracao"]):
+                return self._erro(404, "Objeto não encontrado.")
+            dados = objeto["dados"]
+            cabecalhos_resposta = {
+                "Content-Type": objeto["contentType"], "x-goog-generation": str(objeto["geracao"]),
+                "x-goog-hash": f"md5={objeto['md5']}", "x-goog-stored-content-length": str(len(dados)),
+            }
+            intervalo = re.fullmatch(r"bytes=(\d+)-(\d*)", cabecalhos.get("Range", ""))
+            status = 200
+            if intervalo:
+                inicio = int(intervalo.group(1))
+                fim = int(intervalo.group(2)) if intervalo.group(2) else len(dados) - 1
+                fim = min(fim, len(dados) - 1)
+                cabecalhos_resposta["Content-Range"] = f"bytes {inicio}-{fim}/{len(dados)}"
+                dados, status = dados[inicio:fim + 1], 206
+            with self.lock:
+                self.bytes_enviados += len(dados)
+            return status, cabecalhos_resposta, dados
+
+        # Cópia: /storage/v1/b/<bucket>/o/<objeto>/copyTo/b/<bucket>/o/<destino>
+        encontrado = re.fullmatch(r"/storage/v1/b/([^/]+)/o/(.+)/copyTo/b/([^/]+)/o/(.+)", url.path)
+        if encontrado and metodo == "POST":
+            origem = (unquote(encontrado.group(1)), unquote(encontrado.group(2)))
+            destino = (unquote(encontrado.group(3)), unquote(encontrado.group(4)))
+            if origem not in self.objetos:
+                return self._erro(404, "Objeto não encontrado.")
+            if self._precondicao_falhou(*destino, consulta.get("ifGenerationMatch")):
+                return self._erro(412, "Precondição de geração não atendida.")
+            objeto = self.objetos[origem]
+            return self._json(200, self.guardar(*destino, objeto["dados"], objeto["contentType"], objeto["metadados"]))
+
+        # Metadados: /storage/v1/b/<bucket>/o/<objeto>
+        encontrado = re.fullmatch(r"/storage/v1/b/([^/]+)/o/(.+)", url.path)
+        if encontrado:
+            chave = (unquote(encontrado.group(1)), unquote(encontrado.group(2)))
+            if chave not in self.objetos:
+                return self._erro(404, "Objeto não encontrado.")
+            if metodo == "DELETE":
+                with self.lock:
+                    del self.objetos[chave]
+                return 204, {}, b""
+            if metodo == "PATCH":
+                dados = json.loads(corpo or b"{}")
+                with self.lock:
+                    objeto = self.objetos[chave]
+                    if "metadata" in dados:
+                        objeto["metadados"].update(dados["metadata"] or {})
+                    if dados.get("contentType"):
+                        objeto["contentType"] = dados["contentType"]
+            return self._json(200, self._recurso(*chave))
+
+        # Listagem: /storage/v1/b/<bucket>/o
+        encontrado = re.fullmatch(r"/storage/v1/b/([^/]+)/o", url.path)
+        if encontrado and metodo == "GET":
+            bucket = unquote(encontrado.group(1))
+            prefixo = consulta.get("prefix", "")
+            itens = [self._recurso(b, n) for (b, n) in sorted(self.objetos) if b == bucket and n.startswith(prefixo)]
+            return self._json(200, {"kind": "storage#objects", "items": itens})
+
+        return self._erro(404, f"Rota não suportada pelo servidor falso: {metodo} {url.path}")
+
+
+class GmailFalso(_ServidorFalso):
+    """
+    Imita 'users.messages.send' da API do Gmail (campo 'raw', upload de mídia resumível e requisições em lote).
+    Os envios para os endereços em 'recusados' são respondidos com 400, como um destinatário inválido.
+    """
+
+    # Máximo de envios em uma requisição em lote (o mesmo limite da API).
+    MAX_LOTE = 100
+
+    def __init__(self, latencia: float = 0.0, erros: Optional[list] = None):
+        super().__init__(latencia, erros)
+        self.enviados: list = []
+        self.recusados: set = set()
+        # Quantos envios veio em cada requisição em lote recebida.
+        self.lotes: list = []
+        self._resumiveis = _SessoesResumiveis()
+
+    def _registrar(self, mensagem: bytes) -> tuple:
+        destinatario = BytesHeaderParser().parsebytes(mensagem).get("To", "")
+        if destinatario in self.recusados:
+            return self._erro(400, f"Invalid To header: {destinatario}")
+        id_mensagem = uuid.uuid4().hex[:16]
+        with self.lock:
+            self.enviados.append({"id": id_mensagem, "tamanho": len(mensagem), "instante": time.monotonic()})
+        return self._json(200, {"id": id_mensagem, "threadId": id_mensagem, "labelIds": ["SENT"]})
+
+    def _enviar_raw(self, corpo: bytes) -> tuple:
+        dados = json.loads(corpo or b"{}")
+        if "raw" not in dados:
+            return self._erro(400, "Campo 'raw' ausente.")
+        return self._registrar(base64.urlsafe_b64decode(dados["raw"]))
+
+    def _lote(self, cabecalhos, corpo: bytes) -> tuple:
+        """Atende uma requisição em lote: cada parte é uma requisição HTTP inteira, com a resposta na mesma ordem."""
+        mensagem = message_from_bytes(
+            b"Content-Type: " + cabecalhos.get("Content-Type", "").encode() + b"\r\n\r\n" + corpo, policy=HTTP
+        )
+        if not mensagem.is_multipart():
+            return self._erro(400, "O lote deve ser multipart/mixed.")
+        partes = list(mensagem.iter_parts())
+        if len(partes) > self.MAX_LOTE:
+            return self._erro(400, f"Um lote aceita no máximo {self.MAX_LOTE} requisições.")
+        with self.lock:
+            self.lotes.append(len(partes))
+        fronteira = f"batch_{uuid.uuid4().hex}"
+        respostas = []
+        for parte in partes:
+            requisicao = parte.get_payload(decode=True).decode()
+            inicio, corpo_parte = re.split(r"\r?\n\r?\n", requisicao, maxsplit=1)
+            metodo, caminho = inicio.split(" ", 2)[:2]
+            if metodo == "POST" and urlparse(caminho).path.endswith("/gmail/v1/users/me/messages/send"):
+                status, _, resposta = self._enviar_raw(corpo_parte.encode())
+            else:
+                status, _, resposta = self._erro(404, f"Rota não suportada no lote: {metodo} {caminho}")
+            respostas.append(
+                f"--{fronteira}\r\nContent-Type: application/http\r\n"
+                f"Content-ID: <response-{parte['Content-ID'].strip('<>')}>\r\n\r\n"
+                f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\nContent-Type: application/json; charset=UTF-8\r\n\r\n"
+                f"{resposta.decode()}\r\n"
+            )
+        corpo_resposta = "".join(respostas) + f"--{fronteira}--\r\n"
+        return 200, {"Content-Type": f"multipart/mixed; boundary={fronteira}"}, corpo_resposta.encode()
+
+    def atender(self, metodo: str, caminho: str, cabecalhos, corpo: bytes) -> tuple:
+        url = urlparse(caminho)
+        consulta = {chave: valores[0] for chave, valores in parse_qs(url.query).items()}
+        if url.path.endswith("/batch/gmail/v1") and metodo == "POST":
+            return self._lote(cabecalhos, corpo)
+        if url.path.endswith("/gmail/v1/users/me/messages/send") and url.path.startswith("/upload/"):
+            if metodo == "POST" and consulta.get("uploadType") == "resumable":
+                id_sessao = self._resumiveis.criar({})
+                return 200, {"Location": f"{self.url}{url.path}?uploadType=resumable&upload_id={id_sessao}"}, b""
+            if metodo == "PUT" and "upload_id" in consulta:
+                sessao, gravados = self._resumiveis.receber(consulta["upload_id"], cabecalhos, corpo)
+                if sessao is None and gravados is None:
+                    return self._erro(404, "Sessão de upload inexistente.")
+                if sessao is None:
+                    return self._resumiveis.resposta_incompleta(gravados)
+                return self._registrar(bytes(sessao["buffer"]))
+            if metodo == "POST":
+                return self._registrar(corpo)
+        if url.path.endswith("/gmail/v1/users/me/messages/send") and metodo == "POST":
+            return self._enviar_raw(corpo)
+        return self._erro(404, f"Rota não suportada pelo servidor falso: {metodo} {url.path}")
+
+
+
+class OAuthFalso(_ServidorFalso):
+    """Imita o endpoint de token do OAuth do Google ('grant_type=refresh_token'), contando as renovações."""
+
+    def __init__(self, latencia: float = 0.0, erros: Optional[list] = None, validade: int = 3600):
+        super().__init__(latencia, erros)
+        self.validade = validade
+        self.renovacoes = 0
+
+    def atender(self, metodo: str, caminho: str, cabecalhos, corpo: bytes) -> tuple:
+        dados = {chave: valores[0] for chave, valores in parse_qs(corpo.decode()).items()}
+        if metodo != "POST" or dados.get("grant_type") != "refresh_token" or not dados.get("refresh_token"):
+            return self._json(400, {"error": "invalid_request"})
+        with self.lock:
+            self.renovacoes += 1
+            numero = self.renovacoes
+        return self._json(200, {"access_token": f"token-{numero}", "expires_in": self.validade, "token_type": "Bearer"})
+
+def permitir_upload_de_midia_por_http() -> None:
+    """
+    Com 'client_options.api_endpoint', o googleapiclient troca o host das URLs de upload de mídia,
+    mas mantém o esquema 'https' do documento de descoberta. Como o Gmail falso atende por 'http',
+    esta função faz a troca incluir também o esquema (só afeta o processo do benchmark).
+    """
+    from urllib.parse import urlparse as _urlparse, urlunparse
+    from googleapiclient import discovery
+
+    def corrigir(media_path_url, base_url):
+        base = _urlparse(base_url)
+        return urlunparse(_urlparse(media_path_url)._replace(scheme=base.scheme, netloc=base.netloc))
+
+    discovery._fix_up_media_path_base_url = corrigir
+
+
+def apontar_oauth_para(url: str) -> None:
+    """
+    'Credentials.from_authorized_user_info' ignora o 'token_uri' do token.json e sempre usa o endpoint
+    oficial; esta função o troca pelo do OAuth falso (só afeta o processo do benchmark).
+    """
+    from google.oauth2 import credentials
+
+    credentials._GOOGLE_OAUTH2_TOKEN_ENDPOINT = f"{url}/token"
+
+def credenciais_falsas():
+    """Credenciais OAuth que não expiram durante o benchmark (nenhuma renovação é tentada)."""
+    from google.oauth2.credentials import Credentials
+    expira = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) + datetime.timedelta(days=1)
+    return Credentials(token="token-falso", expiry=expira)
+
+
+def criar_modelo_falso(latencia: float = 0.0, texto: str = "ok"):
+    """Cria um modelo do ADK que responde 'texto' depois de 'latencia' segundos (sem chamar nenhuma API)."""
+    import asyncio
+    from google.adk.models.base_llm import BaseLlm
+    from google.adk.models.llm_response import LlmResponse
+    from google.genai import types
+
+    class ModeloFalso(BaseLlm):
+        model: str = "falso"
+
+        async def generate_content_async(self, llm_request, stream=False):
+            if latencia:
+                await asyncio.sleep(latencia)
+            yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=texto)]))
+
+    return ModeloFalso()
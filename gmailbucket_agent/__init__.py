@@ -1 +1,2 @@
+from . import config
 from . import agent
\ No newline at end of file
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+
+# --- Importações Padrão ---
+# Importa o módulo 'os' para ler os limites das variáveis de ambiente.
+import os
+# Importa 'json' para montar o corpo das respostas de recusa.
+import json
+# Importa 'math' para arredondar para cima o tempo sugerido em 'Retry-After'.
+import math
+# Importa 'time' para medir quanto cada requisição esperou e quanto durou.
+import time
+# Importa 'asyncio' para as esperas na fila (todas as requisições rodam no mesmo laço de eventos).
+import asyncio
+# Importa 'deque' para a fila de espera, atendida por ordem de chegada.
+from collections import deque
+# Importa os tipos usados nas anotações.
+from typing import Optional
+
+# Importa o registro de métricas (recusas e tempo de espera na fila).
+from .metrics import registro
+
+# Liga ou desliga o controle de admissão (use "0" para aceitar todas as requisições, como antes).
+ADMISSAO_ATIVA = os.getenv("ADMISSAO_ATIVA", "1").strip().lower() not in ("0", "false", "nao", "não")
+# Requisições simultâneas aceitas em cada grupo de endpoints (o excedente espera na fila).
+ADMISSAO_LIMITES = {
+    "chat": int(os.getenv("ADMISSAO_CHAT_SIMULTANEOS", "16")),
+    "upload": int(os.getenv("ADMISSAO_UPLOAD_SIMULTANEOS", "4")),
+    "envio": int(os.getenv("ADMISSAO_ENVIO_SIMULTANEOS", "8")),
+}
+# Requisições simultâneas (em execução + na fila) de um mesmo usuário em cada grupo; acima disso, 429.
+ADMISSAO_POR_USUARIO = int(os.getenv("ADMISSAO_POR_USUARIO", "4"))
+# Tamanho máximo da fila de espera de cada grupo; com a fila cheia, 503 na hora.
+ADMISSAO_FILA_MAX = int(os.getenv("ADMISSAO_FILA_MAX", "32"))
+# Quanto tempo (em segundos) uma requisição pode esperar na fila antes de ser recusada com 503.
+ADMISSAO_ESPERA_MAX = float(os.getenv("ADMISSAO_ESPERA_MAX_S", "10"))
+# Endpoints controlados e o grupo (limite compartilhado) de cada um.
+ROTAS_ADMISSAO = {
+    "/chat": "chat",
+    "/chat/stream": "chat",
+    "/upload": "upload",
+    "/upload/direto": "upload",
+    "/upload/direto/concluir": "upload",
+    "/send": "envio",
+    "/send/lote": "envio",
+}
+
+RECUSAS = registro.contador(
+    "gmailbucket_admissao_recusadas_total", "Requisições recusadas pelo controle de admissão.", ("endpoint", "motivo")
+)
+ESPERA = registro.histograma(
+    "gmailbucket_admissao_espera_segundos", "Tempo de espera na fila das requisições admitidas.", ("endpoint",)
+)
+
+
+class Recusa(Exception):
+    """Requisição recusada pelo controle de admissão: 429 (limite do usuário) ou 503 (servidor sobrecarregado)."""
+
+    def __init__(self, status: int, motivo: str, tentar_apos: int, mensagem: str):
+        super().__init__(mensagem)
+        self.status = status
+        self.motivo = motivo
+        self.tentar_apos = tentar_apos
+
+
+class ControleDeAdmissao:
+    """
+    Limita as requisições simultâneas de um grupo de endpoints, no total e por usuário.
+
+    Quem passa do limite total espera em uma fila (por ordem de chegada) de tamanho limitado, até um prazo.
+    Acima do limite do usuário, a recusa é imediata (429); com a fila cheia ou o prazo vencido, também (503).
+    Assim a latência das requisições admitidas fica estável mesmo com sobrecarga, em vez de todas piorarem.
+    Deve ser usado por um único laço de eventos (não é seguro entre threads).
+    """
+
+    def __init__(self, nome: str, limite: int, por_usuario: int = ADMISSAO_POR_USUARIO,
+                 fila_max: int = ADMISSAO_FILA_MAX, espera_max: float = ADMISSAO_ESPERA_MAX):
+        self.nome = nome
+        self.limite = max(1, limite)
+        self.por_usuario = max(1, por_usuario)
+        self.fila_max = max(0, fila_max)
+        self.espera_max = espera_max
+        self._em_execucao = 0
+        self._fila: deque = deque()
+        self._usuarios: dict = {}
+        # Média móvel da duração das requisições, usada para sugerir o 'Retry-After'.
+        self._duracao_media = 1.0
+        self._admitidas = 0
+
+    def _tentar_apos(self, posicao: int = 0) -> int:
+        """Segundos sugeridos até haver vaga: a duração média vezes as "rodadas" de fila à frente."""
+        return max(1, min(60, math.ceil(self._duracao_media * (posicao // self.limite + 1))))
+
+    def _recusar(self, status: int, motivo: str, posicao: int, mensagem: str) -> Recusa:
+        RECUSAS.incrementar(endpoint=self.nome, motivo=motivo)
+        return Recusa(status, motivo, self._tentar_apos(posicao), mensagem)
+
+    async def entrar(self, usuario: str) -> float:
+        """
+        Espera uma vaga (ou lança 'Recusa'). Devolve o instante da admissão, a ser passado para 'sair'.
+        Toda entrada bem-sucedida deve ser seguida de 'sair(usuario, inicio)'.
+        """
+        if self._usuarios.get(usuario, 0) >= self.por_usuario:
+            raise self._recusar(429, "usuario", 0, "Muitas requisições simultâneas deste usuário. Tente novamente em instantes.")
+        chegada = time.monotonic()
+        # A requisição conta para o limite do usuário desde a chegada (inclusive enquanto espera na fila).
+        self._usuarios[usuario] = self._usuarios.get(usuario, 0) + 1
+        try:
+            if self._em_execucao < self.limite and not self._fila:
+                self._em_execucao += 1
+            else:
+                await self._esperar_na_fila()
+        except BaseException:
+            self._soltar_usuario(usuario)
+            raise
+        self._admitidas += 1
+        agora = time.monotonic()
+        ESPERA.observar(agora - chegada, endpoint=self.nome)
+        return agora
+
+    async def _esperar_na_fila(self) -> None:
+        """Espera na fila até 'sair' repassar uma vaga (já contada em '_em_execucao') ou o prazo vencer."""
+        if len(self._fila) >= self.fila_max:
+            raise self._recusar(503, "fila_cheia", len(self._fila), "Servidor sobrecarregado. Tente novamente em instantes.")
+        vaga = asyncio.get_running_loop().create_future()
+        self._fila.append(vaga)
+        try:
+            await asyncio.wait_for(vaga, self.espera_max)
+        except BaseException as e:
+            # Desistiu (prazo vencido ou cliente desconectado): sai da fila e, se a vaga chegou junto
+            # com o cancelamento, repassa-a para o próximo.
+            try:
+                self._fila.remove(vaga)
+            except ValueError:
+                pass
+            if vaga.done() and not vaga.cancelled():
+                self._liberar_vaga()
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._recusar(503, "prazo", len(self._fila), "Servidor sobrecarregado: a espera na fila passou do prazo.")
+            raise
+
+    def _soltar_usuario(self, usuario: str) -> None:
+        self._usuarios[usuario] -= 1
+        if not self._usuarios[usuario]:
+            del self._usuarios[usuario]
+
+    def sair(self, usuario: str, inicio: float) -> None:
+        """Libera a vaga de uma requisição admitida, repassando-a para o primeiro da fila."""
+        self._soltar_usuario(usuario)
+        self._duracao_media = 0.8 * self._duracao_media + 0.2 * (time.monotonic() - inicio)
+        self._liberar_vaga()
+
+    def _liberar_vaga(self) -> None:
+        while self._fila:
+            vaga = self._fila.popleft()
+            if not vaga.done():
+                vaga.set_result(None)
+                return
+        self._em_execucao -= 1
+
+    def estado(self) -> dict:
+        """Limite, requisições em execução e na fila, usuários ativos e admitidas (para as métricas)."""
+        return {
+            "limite": self.limite,
+            "em_execucao": self._em_execucao,
+            "em_fila": len(self._fila),
+            "usuarios_ativos": len(self._usuarios),
+            "admitidas": self._admitidas,
+            "duracao_media_segundos": self._duracao_media,
+        }
+
+
+def criar_controles(limites: Optional[dict] = None) -> dict:
+    """Um 'ControleDeAdmissao' por grupo de endpoints, com os limites de ADMISSAO_LIMITES."""
+    return {nome: ControleDeAdmissao(nome, limite) for nome, limite in (limites or ADMISSAO_LIMITES).items()}
+
+
+def _usuario(scope) -> str:
+    """
+    O usuário da requisição, para o limite por usuário: o endereço IP do cliente. Nada que o cliente escolhe
+    (como um cabeçalho com um identificador) entra na chave, senão bastaria trocá-lo a cada requisição para
+    escapar do limite. Atrás de um proxy, o uvicorn põe em 'client' o IP de 'X-Forwarded-For' quando o proxy
+    é confiável ('--forwarded-allow-ips').
+    """
+    cliente = scope.get("client")
+    return cliente[0] if cliente else "anonimo"
+
+
+async def _responder_recusa(send, recusa: Recusa) -> None:
+    """Responde na hora, sem ler o corpo da requisição (um upload recusado nem chega a ser recebido)."""
+    corpo = json.dumps({"success": False, "error": str(recusa), "motivo": recusa.motivo}, ensure_ascii=False).encode()
+    await send({
+        "type": "http.response.start",
+        "status": recusa.status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(corpo)).encode()),
+            (b"retry-after", str(recusa.tentar_apos).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": corpo})
+
+
+class AdmissaoMiddleware:
+    """
+    Middleware ASGI que aplica o controle de admissão aos endpoints de ROTAS_ADMISSAO.
+
+    A vaga é pedida antes de o corpo ser lido e só é liberada quando a resposta termina (inclusive
+    as respostas em streaming do '/chat/stream'), então o limite vale para todo o trabalho da requisição.
+    """
+
+    def __init__(self, app, controles: dict, rotas: Optional[dict] = None):
+        self.app = app
+        self.controles = controles
+        self.rotas = rotas or ROTAS_ADMISSAO
+
+    async def __call__(self, scope, receive, send):
+        controle = None
+        if scope["type"] == "http" and scope.get("method") == "POST":
+            controle = self.controles.get(self.rotas.get(scope.get("path", "").rstrip("/") or "/"))
+        if controle is None:
+            await self.app(scope, receive, send)
+            return
+        usuario = _usuario(scope)
+        try:
+            inicio = await controle.entrar(usuario)
+        except Recusa as recusa:
+            await _responder_recusa(send, recusa)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            controle.sair(usuario, inicio)
@@ -1,5 +1,5 @@
-# Importa a biblioteca principal do Vertex AI, que permite a interação com os modelos de IA do Google Cloud.
-import vertexai
+# Importa 'asyncio' para inicializar o Vertex AI fora do laço de eventos, na primeira chamada ao modelo.
+import asyncio
 
 # Importa o módulo 'sys' para interagir com o sistema, embora não seja utilizado neste trecho de código.
 import sys
@@ -8,13 +8,9 @@ import sys
 # usado aqui para acessar variáveis de ambiente.
 import os
 
-# Da biblioteca 'dotenv', importa a função 'load_dotenv'.
-# Esta função é usada para carregar variáveis de ambiente a partir de um arquivo .env.
+# Importa a configuração compartilhada: carrega o arquivo .env (uma única vez) e inicializa o Vertex AI sob demanda.
 # Isso é útil para manter informações sensíveis (como chaves de API e IDs de projeto) fora do código-fonte.
-from dotenv import load_dotenv
-
-# Executa a função para carregar as variáveis de ambiente do arquivo .env para o ambiente do sistema.
-load_dotenv()
+from .config import inicializar_vertexai
 
 # Da biblioteca 'google.adk.agents', importa a classe 'Agent'.
 # Esta classe é a base para a criação de agentes de IA, definindo seu comportamento, ferramentas e modelo.
@@ -24,26 +20,49 @@ from google.adk.agents import Agent
 # Importa a variável 'ROOT_AGENT_INSTRUCTION', que provavelmente contém o texto da instrução principal para o agente.
 from .prompt import ROOT_AGENT_INSTRUCTION
 
+# Importa o orçamento de contexto (histórico resumido depois de cada envio) e o cache opcional da instrução.
+from .context_budget import limitar_contexto, usar_cache_da_instrucao
+
 # Realiza uma importação relativa do arquivo 'tools.py'.
 # Importa a função 'enviar_email', que será uma das ferramentas que o agente pode utilizar.
 # A função 'baixar_drive_para_gcs' também é importada, mas não está sendo usada na definição deste agente específico.
-from .tools import enviar_email
+# A função 'enviar_emails_em_lote' envia uma cópia individual para cada destinatário usando requisições em lote.
+# As funções 'agendar_email' e 'consultar_envio' colocam um email na fila de envio em segundo plano e consultam a sua situação.
+# As funções de mala direta enviam um email personalizado para cada linha de um arquivo de contatos do bucket.
+from .tools import (
+    agendar_email, consultar_envio, enviar_email, enviar_emails_em_lote,
+    consultar_mala_direta, iniciar_mala_direta, retomar_mala_direta,
+)
 
 # Inicializa o SDK do Vertex AI com as configurações do projeto.
-# Esta etapa é crucial para autenticar e conectar sua aplicação aos serviços do Google Cloud.
-vertexai.init(
-    project=os.getenv("GOOGLE_CLOUD_PROJECT"),
-    location=os.getenv("GOOGLE_CLOUD_LOCATION"),
-)
+# A biblioteca é pesada: em vez de carregá-la ao importar este arquivo (o que atrasa a partida do servidor),
+# ela é carregada na primeira chamada ao modelo, em uma thread, e as chamadas seguintes não fazem nada.
+async def preparar_vertexai(callback_context, llm_request):
+    await asyncio.to_thread(inicializar_vertexai)
+    return None
+
+# A instrução é entregue por uma função para que o ADK a use como está: com uma string, ele trocaria
+# cada '{nome}' do texto por uma variável da sessão (e falharia com os exemplos de modelos da mala direta).
+def instrucao_do_agente(contexto) -> str:
+    return ROOT_AGENT_INSTRUCTION
 
 # Cria uma instância da classe 'Agent' para definir o agente principal.
 root_agent = Agent(
     model="gemini-2.0-flash",
     name='AGENT_GMAIL',
     description="Um agente para ajudar a enviar emails.",
-    instruction=ROOT_AGENT_INSTRUCTION,
+    instruction=instrucao_do_agente,
+    # Antes de cada chamada ao modelo: inicializa o Vertex AI (só na primeira), reduz o histórico ao orçamento
+    # de tokens e, se ligado, troca a instrução estática pelo cache explícito do Gemini.
+    before_model_callback=[preparar_vertexai, limitar_contexto, usar_cache_da_instrucao],
     tools=[
-        enviar_email
+        enviar_email,
+        enviar_emails_em_lote,
+        agendar_email,
+        consultar_envio,
+        iniciar_mala_direta,
+        consultar_mala_direta,
+        retomar_mala_direta,
     ],
 )
 
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""
+Autoriza o acesso ao Gmail no navegador e grava o token.json usado pelo servidor.
+
+O servidor nunca abre o navegador: ele só renova o token que este passo grava. Rode-o uma vez, em uma
+máquina com navegador, e copie o token.json para o servidor se ele rodar em outro lugar.
+
+Uso:
+    python -m gmailbucket_agent.autorizar [--credenciais credentials.json] [--token token.json]
+"""
+
+# --- Importações Padrão ---
+# Importa o módulo 'os' para mostrar o caminho completo do token gravado.
+import os
+# Importa 'argparse' para ler os caminhos dos arquivos na linha de comando.
+import argparse
+
+from .tools.gmail_client import CREDENTIALS_PATH, SCOPES, TOKEN_PATH
+from .tools.token_broker import autorizar
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--credenciais", default=CREDENTIALS_PATH, help="Arquivo do cliente OAuth (padrão: credentials.json do pacote).")
+    parser.add_argument("--token", default=TOKEN_PATH, help="Onde gravar o token (padrão: token.json do pacote).")
+    args = parser.parse_args()
+    autorizar(args.token, args.credenciais, SCOPES)
+    print(f"Token gravado em {os.path.abspath(args.token)}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+# --- Importações Padrão ---
+# Importa 'json' para serializar os dados de cada evento enviado ao navegador.
+import json
+# Importa 'uuid' para criar um identificador de sessão quando o cliente não envia um.
+import uuid
+# Importa 'time' para medir quanto do turno foi gasto no modelo e em cada ferramenta.
+import time
+# Importa os tipos usados nas anotações.
+from typing import AsyncIterator, Optional
+
+# --- Importações do ADK ---
+# 'types' define o formato das mensagens (Content/Part) trocadas com o modelo.
+from google.genai import types
+# 'RunConfig' e 'StreamingMode' ativam o envio do texto em pedaços (parciais) pelo Runner.
+from google.adk.agents.run_config import RunConfig, StreamingMode
+# 'Runner' executa o agente e produz o fluxo de eventos da conversa.
+from google.adk.runners import Runner
+
+# Importa a instrumentação (duração do turno, do modelo e das ferramentas; turnos em andamento).
+from .metrics import em_andamento, medir, observar_etapa
+
+
+async def garantir_sessao(runner: Runner, user_id: str, session_id: Optional[str]) -> str:
+    """Devolve o id de uma sessão existente do usuário, criando-a se ainda não existir."""
+    session_id = session_id or uuid.uuid4().hex
+    sessao = await runner.session_service.get_session(
+        app_name=runner.app_name, user_id=user_id, session_id=session_id
+    )
+    if sessao is None:
+        await runner.session_service.create_session(
+            app_name=runner.app_name, user_id=user_id, session_id=session_id
+        )
+    return session_id
+
+
+def _evento_sse(nome: str, dados: dict) -> str:
+    """Formata um evento no padrão Server-Sent Events ('event:' + 'data:' + linha em branco)."""
+    return f"event: {nome}\ndata: {json.dumps(dados, ensure_ascii=False, default=str)}\n\n"
+
+
+def _texto(evento) -> str:
+    """Junta o texto de todas as partes de um evento (ignorando chamadas de ferramentas)."""
+    if not evento.content or not evento.content.parts:
+        return ""
+    return "".join(parte.text for parte in evento.content.parts if parte.text)
+
+
+async def executar_turno(runner: Runner, user_id: str, session_id: str, mensagem: str,
+                         streaming: bool = False) -> AsyncIterator:
+    """
+    Envia a mensagem do usuário ao agente e devolve os eventos produzidos pelo Runner, à medida que chegam.
+
+    O turno inteiro é medido (e vira o span pai das ferramentas e das chamadas externas). O tempo do
+    modelo é o intervalo entre o início do turno (ou o fim da última ferramenta) e a resposta completa
+    seguinte; o de cada ferramenta, o intervalo entre a chamada e o seu resultado.
+    """
+    run_config = RunConfig(streaming_mode=StreamingMode.SSE if streaming else StreamingMode.NONE)
+    with em_andamento("chat"), medir("chat.turno", session_id=session_id):
+        marca = time.perf_counter()
+        chamadas: dict = {}
+        async for evento in runner.run_async(
+            user_id=user_id,
+            session_id=session_id,
+            new_message=types.Content(role="user", parts=[types.Part(text=mensagem)]),
+            run_config=run_config,
+        ):
+            agora = time.perf_counter()
+            respostas = evento.get_function_responses()
+            if respostas:
+                for resposta in respostas:
+                    inicio = chamadas.pop(resposta.id or resposta.name, None)
+                    if inicio is not None:
+                        observar_etapa(f"ferramenta.{resposta.name}", agora - inicio)
+                # O modelo volta a ser chamado depois das ferramentas.
+                marca = agora
+            elif not evento.partial:
+                observar_etapa("llm.resposta", agora - marca)
+                for chamada in evento.get_function_calls():
+                    chamadas[chamada.id or chamada.name] = agora
+                marca = agora
+            yield evento
+
+
+async def responder(runner: Runner, user_id: str, session_id: str, mensagem: str) -> str:
+    """Executa um turno completo e devolve o texto final do agente (usado pelo endpoint /chat)."""
+    partes = []
+    async for evento in executar_turno(runner, user_id, session_id, mensagem):
+        if evento.is_final_response():
+            partes.append(_texto(evento))
+    return "\n".join(parte for parte in partes if parte)
+
+
+async def eventos_sse(runner: Runner, user_id: str, session_id: str, mensagem: str) -> AsyncIterator[str]:
+    """
+    Executa um turno e repassa os eventos ao navegador no formato SSE, assim que são produzidos:
+
+    - 'inicio': o id da sessão (enviado antes da primeira chamada ao modelo);
+    - 'parcial': um pedaço de texto a ser acrescentado à resposta em andamento;
+    - 'mensagem': o texto completo de uma resposta (substitui os pedaços parciais dela);
+    - 'ferramenta' / 'resultado_ferramenta': o início e o fim de cada chamada de ferramenta;
+    - 'erro' e, por último, 'fim'.
+    """
+    yield _evento_sse("inicio", {"session_id": session_id})
+    try:
+        async for evento in executar_turno(runner, user_id, session_id, mensagem, streaming=True):
+            texto = _texto(evento)
+            if evento.partial:
+                if texto:
+                    yield _evento_sse("parcial", {"texto": texto})
+                continue
+            for chamada in evento.get_function_calls():
+                yield _evento_sse("ferramenta", {"nome": chamada.name, "argumentos": chamada.args or {}})
+            for resposta in evento.get_function_responses():
+                yield _evento_sse("resultado_ferramenta", {"nome": resposta.name, "resposta": resposta.response})
+            if texto:
+                yield _evento_sse("mensagem", {"texto": texto})
+    except Exception as e:
+        yield _evento_sse("erro", {"erro": str(e)})
+    yield _evento_sse("fim", {"session_id": session_id})
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+# --- Importações Padrão ---
+# Importa o módulo 'os' para ler as variáveis de ambiente.
+import os
+# Importa 'threading' para criar o cliente do GCS uma única vez, mesmo com várias threads.
+import threading
+# Importa 'lru_cache' para ler e validar as configurações apenas na primeira utilização.
+from functools import lru_cache
+# Importa os tipos usados nas anotações.
+from typing import NamedTuple
+
+# Importa a função 'load_dotenv' para carregar as variáveis de ambiente do arquivo .env.
+from dotenv import load_dotenv
+
+# Carrega o .env uma única vez, quando o pacote é importado (os outros módulos leem o ambiente depois disto).
+load_dotenv()
+
+# Número de conexões HTTP mantidas pelo cliente do GCS (padrão: o limite do pool de E/S do GCS).
+GCS_POOL_CONEXOES = int(os.getenv("GCS_POOL_CONEXOES", os.getenv("IO_LIMITE_GCS", "8")))
+
+
+class DestinoGCS(NamedTuple):
+    """Bucket e pasta (prefixo, sem barras nas pontas) definidos em GCS_ATTACHMENT_PATH."""
+    bucket: str
+    prefixo: str
+
+    def nome_do_objeto(self, nome_do_arquivo: str) -> str:
+        """Nome completo do objeto de um arquivo dentro da pasta (ex: 'anexos/relatorio.pdf')."""
+        return f"{self.prefixo}/{nome_do_arquivo}" if self.prefixo else nome_do_arquivo
+
+    def caminho(self, nome_do_arquivo: str) -> str:
+        """Caminho "bucket/objeto" de um arquivo dentro da pasta."""
+        return f"{self.bucket}/{self.nome_do_objeto(nome_do_arquivo)}"
+
+
+@lru_cache(maxsize=None)
+def obter_destino_gcs() -> DestinoGCS:
+    """
+    Lê e valida GCS_ATTACHMENT_PATH ('bucket/pasta', com ou sem 'gs://') uma única vez.
+    Lança ValueError se a variável estiver faltando ou não tiver o nome do bucket.
+    """
+    caminho = os.getenv("GCS_ATTACHMENT_PATH", "").strip()
+    if not caminho:
+        raise ValueError("Erro de configuração: A variável 'GCS_ATTACHMENT_PATH' não foi encontrada no arquivo .env.")
+    # Remove o prefixo "gs://" se ele existir, pois a biblioteca não o utiliza.
+    if caminho.startswith("gs://"):
+        caminho = caminho[5:]
+    bucket, _, prefixo = caminho.strip("/").partition("/")
+    if not bucket:
+        raise ValueError("Erro de configuração: 'GCS_ATTACHMENT_PATH' deve conter o nome do bucket (ex: 'meu-bucket/anexos').")
+    return DestinoGCS(bucket, prefixo.strip("/"))
+
+
+# Cliente único do GCS, criado na primeira utilização.
+_cliente_storage = None
+_lock_cliente = threading.Lock()
+
+
+def obter_cliente_storage():
+    """
+    Devolve o cliente do Google Cloud Storage compartilhado pelo processo.
+
+    A biblioteca só é importada aqui, na primeira utilização, e a descoberta de credenciais é
+    bloqueante: a primeira chamada deve rodar fora do laço de eventos (no pool de E/S do GCS).
+    O pool de conexões do cliente é dimensionado para o número de threads que o usam ao mesmo tempo.
+    """
+    global _cliente_storage
+    if _cliente_storage is None:
+        with _lock_cliente:
+            if _cliente_storage is None:
+                from google.cloud import storage
+                from requests.adapters import HTTPAdapter
+                cliente = storage.Client()
+                adaptador = HTTPAdapter(pool_connections=GCS_POOL_CONEXOES, pool_maxsize=GCS_POOL_CONEXOES)
+                cliente._http.mount("https://", adaptador)
+                cliente._http.mount("http://", adaptador)
+                _cliente_storage = cliente
+    return _cliente_storage
+
+
+@lru_cache(maxsize=None)
+def inicializar_vertexai() -> None:
+    """Inicializa o SDK do Vertex AI (uma única vez, na primeira utilização) com o projeto e a região do .env."""
+    import vertexai
+    vertexai.init(
+        project=os.getenv("GOOGLE_CLOUD_PROJECT"),
+        location=os.getenv("GOOGLE_CLOUD_LOCATION"),
+    )
+
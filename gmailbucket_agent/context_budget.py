@@ -0,0 +1,353 @@
+# -*- coding: utf-8 -*-
+
+# --- Importações Padrão ---
+# Importa o módulo 'os' para ler o orçamento de contexto e as opções do cache das variáveis de ambiente.
+import os
+# Importa 're' para reconhecer o rascunho no formato de confirmação pedido pela instrução do agente.
+import re
+# Importa 'json' para estimar o tamanho das chamadas de ferramentas e montar o bloco do rascunho.
+import json
+# Importa 'time' para controlar a validade do cache da instrução.
+import time
+# Importa 'asyncio' para que só uma requisição crie o cache da instrução de cada vez.
+import asyncio
+# Importa 'hashlib' para identificar a instrução (e as ferramentas) guardada em cada cache.
+import hashlib
+# Importa 'threading' para criar o cliente da API do Gemini uma única vez.
+import threading
+# Importa 'logging' para registrar as falhas na criação do cache da instrução.
+import logging
+# Importa os tipos usados nas anotações.
+from typing import Optional
+
+# --- Importações do ADK ---
+# 'types' define o formato das mensagens (Content/Part) e da configuração do cache.
+from google.genai import types
+# As exceções da API do Gemini (para reconhecer a recusa do cache por falta de tokens).
+from google.genai import errors as genai_errors
+
+# Importa o registro de métricas (tokens enviados e economizados a cada chamada ao modelo).
+from .metrics import registro
+
+# Orçamento (estimado) de tokens do histórico enviado ao modelo a cada chamada. Use 0 para enviar tudo, como antes.
+CONTEXTO_ORCAMENTO_TOKENS = int(os.getenv("CONTEXTO_ORCAMENTO_TOKENS", "8000"))
+# Quantos turnos mais recentes (mensagem do usuário + respostas e ferramentas) são sempre enviados por inteiro.
+CONTEXTO_TURNOS_RECENTES = max(1, int(os.getenv("CONTEXTO_TURNOS_RECENTES", "2")))
+# Ao cortar, o histórico é reduzido a esta fração do orçamento, para que o corte (e o prefixo da requisição,
+# aproveitado pelo cache implícito do Gemini) continue o mesmo por vários turnos, em vez de mudar a cada turno.
+CONTEXTO_FRACAO_APOS_CORTE = 0.6
+# Guarda a instrução e as ferramentas em um cache explícito do Gemini ('cachedContents'); use "1" para ligar.
+# O Gemini exige um mínimo de tokens para criar o cache; abaixo dele, a instrução continua indo em cada chamada.
+CONTEXTO_CACHE_INSTRUCAO = os.getenv("CONTEXTO_CACHE_INSTRUCAO", "0").strip().lower() in ("1", "true", "sim")
+# Validade de cada cache da instrução, em segundos (ele é recriado perto de expirar).
+CONTEXTO_CACHE_TTL = int(os.getenv("CONTEXTO_CACHE_TTL_S", "3600"))
+# Espera inicial e máxima (em segundos) antes de tentar criar de novo um cache cuja criação falhou por outro
+# motivo que não o mínimo de tokens (ex: 429, 5xx, rede); a espera dobra a cada falha seguida.
+CONTEXTO_CACHE_ESPERA_INICIAL = 5.0
+CONTEXTO_CACHE_ESPERA_MAX = float(os.getenv("CONTEXTO_CACHE_ESPERA_MAX_S", "600"))
+
+# Ferramentas que concluem um rascunho: depois delas, as mensagens sobre aquele email podem ser resumidas.
+FERRAMENTAS_DE_ENVIO = ("enviar_email", "enviar_emails_em_lote", "agendar_email", "iniciar_mala_direta")
+# Chave do estado da sessão com o ponto de corte do histórico (índice do primeiro conteúdo enviado por inteiro).
+CHAVE_CORTE = "contexto_corte"
+# Campos do rascunho, na ordem e com os rótulos do formato de confirmação de ROOT_AGENT_INSTRUCTION.
+_CAMPOS_RASCUNHO = (
+    ("destinatarios", r"\*\*Destinat[aá]rios:\*\*[ \t]*(.+)"),
+    ("assunto", r"\*\*Assunto:\*\*[ \t]*(.+)"),
+    ("corpo", r"\*\*Corpo:\*\*[ \t]*\n?(.*?)\n[ \t]*\*\*Anexos:\*\*"),
+    ("anexos", r"\*\*Anexos:\*\*[ \t]*(.+)"),
+)
+# Tamanho máximo do resultado de cada envio citado no resumo.
+_RESULTADO_MAX = 160
+
+TOKENS = registro.contador(
+    "gmailbucket_contexto_tokens_total", "Tokens estimados do histórico: enviados ao modelo e removidos pelo orçamento.",
+    ("tipo",),
+)
+FALHAS_CACHE = registro.contador(
+    "gmailbucket_contexto_cache_falhas_total", "Falhas ao criar o cache da instrução, por motivo.", ("motivo",),
+)
+
+logger = logging.getLogger(__name__)
+
+
+def estimar_tokens(conteudo: types.Content) -> int:
+    """Estimativa rápida (sem chamar a API) dos tokens de um conteúdo: cerca de 4 caracteres por token."""
+    caracteres = 0
+    for parte in conteudo.parts or []:
+        if parte.text:
+            caracteres += len(parte.text)
+        elif parte.function_call:
+            caracteres += len(parte.function_call.name or "") + len(json.dumps(parte.function_call.args or {}, default=str))
+        elif parte.function_response:
+            caracteres += len(json.dumps(parte.function_response.response or {}, default=str))
+        else:
+            # Outras partes (arquivos, imagens) raramente aparecem aqui; contam como um bloco fixo.
+            caracteres += 1000
+    return caracteres // 4 + 1
+
+
+def _inicio_de_turno(conteudo: types.Content) -> bool:
+    """Um turno começa em cada mensagem de texto do usuário (e não nas respostas de ferramentas)."""
+    return conteudo.role == "user" and any(parte.text for parte in conteudo.parts or [])
+
+
+def _texto(conteudo: types.Content) -> str:
+    return "".join(parte.text for parte in conteudo.parts or [] if parte.text)
+
+
+def _ultimo_envio(conteudos: list) -> int:
+    """Índice da última resposta de uma ferramenta de envio (ou -1 se nenhum email foi enviado)."""
+    for indice in range(len(conteudos) - 1, -1, -1):
+        if any(parte.function_response and parte.function_response.name in FERRAMENTAS_DE_ENVIO
+               for parte in conteudos[indice].parts or []):
+            return indice
+    return -1
+
+
+def extrair_rascunho(texto: str) -> Optional[dict]:
+    """Lê o rascunho de uma resposta do agente no formato de confirmação (ou None se ela não tiver um)."""
+    rascunho = {}
+    for campo, padrao in _CAMPOS_RASCUNHO:
+        achado = re.search(padrao, texto, re.DOTALL if campo == "corpo" else 0)
+        if achado:
+            rascunho[campo] = achado.group(1).strip()
+    return rascunho if "assunto" in rascunho else None
+
+
+def rascunho_atual(conteudos: list) -> tuple:
+    """
+    O último rascunho apresentado pelo agente depois do último envio: (índice do conteúdo, rascunho).
+    Devolve (-1, None) se não houver rascunho em andamento.
+    """
+    ultimo_envio = _ultimo_envio(conteudos)
+    for indice in range(len(conteudos) - 1, ultimo_envio, -1):
+        if conteudos[indice].role == "model":
+            rascunho = extrair_rascunho(_texto(conteudos[indice]))
+            if rascunho:
+                return indice, rascunho
+    return -1, None
+
+
+def _resumir_envios(conteudos: list) -> list:
+    """Uma linha por envio concluído nos conteúdos: ferramenta, destinatários, assunto e resultado."""
+    chamadas = {}
+    linhas = []
+    for conteudo in conteudos:
+        for parte in conteudo.parts or []:
+            if parte.function_call and parte.function_call.name in FERRAMENTAS_DE_ENVIO:
+                chamadas[parte.function_call.id or parte.function_call.name] = parte.function_call
+            elif parte.function_response and parte.function_response.name in FERRAMENTAS_DE_ENVIO:
+                resposta = parte.function_response
+                chamada = chamadas.pop(resposta.id or resposta.name, None)
+                argumentos = dict(chamada.args or {}) if chamada else {}
+                destinatarios = argumentos.get("destinatarios") or []
+                descricao = f"- {resposta.name}"
+                if destinatarios:
+                    extras = f" (+{len(destinatarios) - 5})" if len(destinatarios) > 5 else ""
+                    descricao += f" para {', '.join(map(str, destinatarios[:5]))}{extras}"
+                assunto = argumentos.get("assunto") or argumentos.get("assunto_modelo")
+                if assunto:
+                    descricao += f", assunto '{assunto}'"
+                if argumentos.get("nomes_dos_arquivos_anexos"):
+                    descricao += f", anexos {', '.join(map(str, argumentos['nomes_dos_arquivos_anexos']))}"
+                resultado = json.dumps(resposta.response or {}, ensure_ascii=False, default=str)
+                linhas.append(f"{descricao}: {resultado[:_RESULTADO_MAX]}")
+    return linhas
+
+
+def montar_resumo(conteudos: list, corte: int, rascunho: Optional[tuple] = None) -> types.Content:
+    """
+    O conteúdo que substitui 'conteudos[:corte]': os envios já concluídos e, se a última versão
+    do rascunho em andamento ficou na parte cortada, o rascunho como um bloco JSON.
+    """
+    linhas = ["[Contexto mantido pelo sistema: o início desta conversa foi resumido para economizar contexto.]"]
+    envios = _resumir_envios(conteudos[:corte])
+    if envios:
+        linhas.append("Emails já enviados nesta conversa:")
+        linhas.extend(envios)
+    indice, dados = rascunho if rascunho is not None else rascunho_atual(conteudos)
+    if dados and indice < corte:
+        linhas.append("Rascunho atual (ainda não enviado): " + json.dumps(dados, ensure_ascii=False))
+    return types.Content(role="user", parts=[types.Part(text="\n".join(linhas))])
+
+
+def escolher_corte(conteudos: list, orcamento: int, turnos_recentes: int = CONTEXTO_TURNOS_RECENTES) -> int:
+    """
+    Onde cortar o histórico para caber em 'orcamento' (0 se não for preciso cortar).
+
+    O corte é sempre no início de um turno, para nunca separar uma chamada de ferramenta da sua resposta,
+    e os últimos 'turnos_recentes' turnos são sempre mantidos. O primeiro corte considerado é logo depois do
+    último email enviado (o rascunho daquele email já está concluído); se ainda não couber, os turnos mais
+    antigos do rascunho em andamento também saem (o rascunho continua no resumo).
+    """
+    inicios = [indice for indice, conteudo in enumerate(conteudos) if _inicio_de_turno(conteudo)]
+    if len(inicios) <= turnos_recentes:
+        return 0
+    corte_maximo = inicios[-turnos_recentes]
+    ultimo_envio = _ultimo_envio(conteudos[:corte_maximo])
+    candidatos = [inicio for inicio in inicios if 0 < inicio <= corte_maximo and inicio > ultimo_envio]
+    if ultimo_envio < 0:
+        candidatos = [inicio for inicio in inicios if 0 < inicio <= corte_maximo]
+    elif not candidatos:
+        candidatos = [corte_maximo]
+    tamanhos = [estimar_tokens(conteudo) for conteudo in conteudos]
+    rascunho = rascunho_atual(conteudos)
+    for corte in candidatos:
+        if estimar_tokens(montar_resumo(conteudos, corte, rascunho)) + sum(tamanhos[corte:]) <= orcamento:
+            return corte
+    return candidatos[-1]
+
+
+def aplicar_orcamento(conteudos: list, orcamento: int, corte_anterior: int = 0,
+                      turnos_recentes: int = CONTEXTO_TURNOS_RECENTES) -> tuple:
+    """
+    Reduz o histórico ao orçamento. Devolve (conteúdos a enviar, corte usado).
+
+    Um corte anterior é mantido enquanto o histórico (a partir dele) couber no orçamento: assim a requisição
+    muda apenas no fim de um turno para o outro. Quando não cabe mais, um novo corte reduz o histórico a
+    CONTEXTO_FRACAO_APOS_CORTE do orçamento.
+    """
+    total = sum(estimar_tokens(conteudo) for conteudo in conteudos)
+    if orcamento <= 0 or total <= orcamento:
+        return conteudos, 0
+    if 0 < corte_anterior < len(conteudos) and _inicio_de_turno(conteudos[corte_anterior]):
+        reduzidos = [montar_resumo(conteudos, corte_anterior)] + conteudos[corte_anterior:]
+        if sum(estimar_tokens(conteudo) for conteudo in reduzidos) <= orcamento:
+            return reduzidos, corte_anterior
+    corte = escolher_corte(conteudos, int(orcamento * CONTEXTO_FRACAO_APOS_CORTE), turnos_recentes)
+    if not corte:
+        return conteudos, 0
+    return [montar_resumo(conteudos, corte)] + conteudos[corte:], corte
+
+
+async def limitar_contexto(callback_context, llm_request):
+    """
+    'before_model_callback' que aplica o orçamento de tokens ao histórico enviado ao modelo.
+    O histórico completo continua guardado na sessão; só a requisição desta chamada é reduzida.
+    """
+    if CONTEXTO_ORCAMENTO_TOKENS <= 0 or not llm_request.contents:
+        return None
+    antes = sum(estimar_tokens(conteudo) for conteudo in llm_request.contents)
+    corte_anterior = callback_context.state.get(CHAVE_CORTE, 0) or 0
+    conteudos, corte = aplicar_orcamento(llm_request.contents, CONTEXTO_ORCAMENTO_TOKENS, corte_anterior)
+    if corte != corte_anterior:
+        # Guardado na sessão, para que os próximos turnos partam do mesmo corte.
+        callback_context.state[CHAVE_CORTE] = corte
+    llm_request.contents = conteudos
+    depois = sum(estimar_tokens(conteudo) for conteudo in conteudos)
+    TOKENS.incrementar(depois, tipo="enviados")
+    if antes > depois:
+        TOKENS.incrementar(antes - depois, tipo="removidos")
+    return None
+
+
+# --- Cache explícito da instrução (opcional) ---
+
+# Cliente da API do Gemini (o mesmo tipo usado pelo ADK), criado na primeira utilização.
+_cliente_genai = None
+_lock_cliente = threading.Lock()
+# Caches já criados: {chave da instrução: (nome do cache, instante em que expira)}.
+_caches: dict = {}
+# Instruções abaixo do mínimo de tokens do cache: a API sempre recusaria, então não se tenta de novo.
+_caches_recusados: set = set()
+# Instruções cuja criação do cache falhou por outro motivo: {chave: (falhas seguidas, instante da próxima tentativa)}.
+_caches_adiados: dict = {}
+_lock_caches: Optional[asyncio.Lock] = None
+
+
+def obter_cliente_genai():
+    """Devolve o cliente da API do Gemini do processo (configurado pelas mesmas variáveis de ambiente do ADK)."""
+    global _cliente_genai
+    if _cliente_genai is None:
+        with _lock_cliente:
+            if _cliente_genai is None:
+                from google import genai
+                _cliente_genai = genai.Client()
+    return _cliente_genai
+
+
+def _chave_da_instrucao(llm_request) -> str:
+    """Identifica o modelo, a instrução e as ferramentas (tudo o que vai para o cache)."""
+    config = llm_request.config
+    ferramentas = [ferramenta.model_dump(exclude_none=True) for ferramenta in config.tools or []]
+    bruto = json.dumps([llm_request.model, str(config.system_instruction), ferramentas], sort_keys=True, default=str)
+    return hashlib.sha256(bruto.encode()).hexdigest()
+
+
+def _abaixo_do_minimo(erro: Exception) -> bool:
+    """Se a API recusou o cache por ele ter menos tokens que o mínimo do modelo (400, 'min_total_token_count')."""
+    if not isinstance(erro, genai_errors.ClientError) or erro.code != 400:
+        return False
+    mensagem = str(erro).lower()
+    return "min_total_token_count" in mensagem or "too small" in mensagem
+
+
+async def _obter_cache(llm_request) -> Optional[str]:
+    """
+    Nome do cache com a instrução e as ferramentas desta requisição, criando-o (ou renovando-o) se preciso.
+
+    Se a instrução tiver menos tokens que o mínimo do cache, ela segue sem cache para sempre. Outras falhas
+    (limite de taxa, erro do servidor, rede) são passageiras: a requisição segue sem cache e a criação é
+    tentada de novo depois de uma espera que dobra a cada falha seguida.
+    """
+    global _lock_caches
+    chave = _chave_da_instrucao(llm_request)
+    if chave in _caches_recusados or time.time() < _caches_adiados.get(chave, (0, 0.0))[1]:
+        return None
+    nome, expira_em = _caches.get(chave, (None, 0.0))
+    if nome and time.time() < expira_em - 60:
+        return nome
+    _lock_caches = _lock_caches or asyncio.Lock()
+    async with _lock_caches:
+        # Outra requisição pode ter criado o cache (ou falhado ao criá-lo) enquanto esta esperava.
+        nome, expira_em = _caches.get(chave, (None, 0.0))
+        if nome and time.time() < expira_em - 60:
+            return nome
+        if chave in _caches_recusados or time.time() < _caches_adiados.get(chave, (0, 0.0))[1]:
+            return None
+        config = llm_request.config
+        try:
+            cache = await obter_cliente_genai().aio.caches.create(
+                model=llm_request.model,
+                config=types.CreateCachedContentConfig(
+                    system_instruction=config.system_instruction,
+                    tools=config.tools,
+                    tool_config=config.tool_config,
+                    ttl=f"{CONTEXTO_CACHE_TTL}s",
+                    display_name="gmailbucket-instrucao",
+                ),
+            )
+        except Exception as e:
+            if _abaixo_do_minimo(e):
+                FALHAS_CACHE.incrementar(motivo="abaixo_do_minimo")
+                logger.info("Cache da instrução desativado: a instrução tem menos tokens que o mínimo do modelo (%s).", e)
+                _caches_recusados.add(chave)
+                return None
+            falhas = _caches_adiados.get(chave, (0, 0.0))[0] + 1
+            espera = min(CONTEXTO_CACHE_ESPERA_MAX, CONTEXTO_CACHE_ESPERA_INICIAL * 2 ** (falhas - 1))
+            _caches_adiados[chave] = (falhas, time.time() + espera)
+            FALHAS_CACHE.incrementar(motivo="erro")
+            logger.warning("Falha ao criar o cache da instrução (%d seguida(s)); nova tentativa em %.0fs: %s",
+                           falhas, espera, e)
+            return None
+        _caches_adiados.pop(chave, None)
+        _caches[chave] = (cache.name, time.time() + CONTEXTO_CACHE_TTL)
+        return cache.name
+
+
+async def usar_cache_da_instrucao(callback_context, llm_request):
+    """
+    'before_model_callback' que troca a instrução e as ferramentas da requisição pelo cache explícito
+    (CONTEXTO_CACHE_INSTRUCAO). A instrução é estática, então o mesmo cache serve a todas as conversas.
+    """
+    if not CONTEXTO_CACHE_INSTRUCAO or not llm_request.config or not llm_request.config.system_instruction:
+        return None
+    nome = await _obter_cache(llm_request)
+    if nome:
+        # Com um cache, a API não aceita a instrução e as ferramentas repetidas na requisição.
+        llm_request.config.cached_content = nome
+        llm_request.config.system_instruction = None
+        llm_request.config.tools = None
+        llm_request.config.tool_config = None
+    return None
@@ -0,0 +1,410 @@
+# -*- coding: utf-8 -*-
+
+# --- Importações Padrão ---
+# Importa o módulo 'os' para ler as configurações de limite e tamanho de bloco.
+import os
+# Importa 'time' para esperar entre as tentativas de retomada.
+import time
+# Importa 'random' para adicionar variação (jitter) às esperas entre tentativas.
+import random
+# Importa 'hashlib' para calcular o endereço (SHA-256) do conteúdo de cada upload.
+import hashlib
+# Importa 'json' para montar a resposta de recusa dos uploads grandes demais.
+import json
+# Importa 'Optional' e 'BinaryIO' para as anotações de tipo.
+from typing import BinaryIO, Optional
+# Importa 'requests' para reconhecer as falhas de rede do transporte HTTP do cliente do GCS.
+import requests
+# Importa as exceções do GCS (a gravação condicional em 'objetos/' falha se o conteúdo já existir).
+from google.api_core import exceptions as gcs_exceptions
+
+# Importa a instrumentação (duração do upload, bytes enviados e uploads em andamento).
+from .metrics import contar_bytes, em_andamento, medir
+# Importa o tipo do destino dos anexos (bucket e pasta de GCS_ATTACHMENT_PATH).
+from .config import DestinoGCS
+
+# O GCS exige que cada bloco de um upload resumível (exceto o último) seja múltiplo de 256 KiB.
+GRANULARIDADE_CHUNK = 256 * 1024
+
+# Tamanho máximo aceito por upload, em bytes (padrão: 100 MiB). Use 0 para não limitar.
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(100 * 1024 * 1024)))
+# Tamanho de cada bloco enviado ao GCS, em bytes (padrão: 8 MiB).
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(8 * 1024 * 1024)))
+# Quantas vezes seguidas um bloco pode falhar antes de o upload ser abandonado.
+UPLOAD_MAX_TENTATIVAS = int(os.getenv("UPLOAD_MAX_TENTATIVAS", "5"))
+# Guarda cada conteúdo uma única vez, pelo seu SHA-256 (use "0" para gravar os arquivos direto pelo nome).
+UPLOAD_DEDUPLICACAO = os.getenv("UPLOAD_DEDUPLICACAO", "1").strip().lower() not in ("0", "false", "nao", "não")
+# Subpasta (dentro da pasta dos anexos) onde ficam os conteúdos, cada um com o nome igual ao seu SHA-256.
+PASTA_CONTEUDOS = "objetos"
+# Metadado que marca um objeto como apelido (ver 'resolver_apelido').
+METADADO_APELIDO = "apelido"
+# Folga aceita acima de UPLOAD_MAX_BYTES no corpo de um upload, para o envelope multipart (separadores e cabeçalhos).
+FOLGA_MULTIPART = 64 * 1024
+# Endpoints cujo corpo é limitado por 'LimiteDeUploadMiddleware'.
+ROTAS_UPLOAD = ("/upload",)
+
+
+def normalizar_tamanho_chunk(tamanho: int) -> int:
+    """Arredonda o tamanho do bloco para o múltiplo de 256 KiB mais próximo (no mínimo 256 KiB)."""
+    return max(GRANULARIDADE_CHUNK, (tamanho // GRANULARIDADE_CHUNK) * GRANULARIDADE_CHUNK)
+
+
+def tamanho_do_stream(stream: BinaryIO) -> int:
+    """Descobre o tamanho total de um arquivo "seekable" sem lê-lo para a memória."""
+    posicao = stream.tell()
+    stream.seek(0, os.SEEK_END)
+    tamanho = stream.tell()
+    stream.seek(posicao)
+    return tamanho
+
+
+def validar_tamanho_upload(tamanho: int, tamanho_maximo: int = UPLOAD_MAX_BYTES) -> None:
+    """Lança 'ValueError' se o arquivo ultrapassar o limite configurado."""
+    if tamanho_maximo and tamanho > tamanho_maximo:
+        raise ValueError(
+            f"O arquivo tem {tamanho} bytes e ultrapassa o limite de {tamanho_maximo} bytes (UPLOAD_MAX_BYTES)."
+        )
+
+
+def nome_seguro(nome_do_arquivo: str) -> str:
+    """
+    Só o nome do arquivo, sem pastas (quem envia escolhe o nome, mas não onde ele é gravado). Recusa os nomes
+    que citam a pasta dos conteúdos da deduplicação: um apelido gravado ali cobriria um conteúdo compartilhado.
+    """
+    caminho = (nome_do_arquivo or "").replace("\\", "/").strip()
+    nome = os.path.basename(caminho).strip()
+    if not nome or nome in (".", ".."):
+        raise ValueError("Nome de arquivo inválido.")
+    if any(parte.strip() == PASTA_CONTEUDOS for parte in caminho.split("/")):
+        raise ValueError(f"Nome de arquivo inválido: '{PASTA_CONTEUDOS}' é uma pasta reservada.")
+    return nome
+
+
+class _CorpoGrandeDemais(Exception):
+    """O corpo da requisição passou do limite enquanto era lido (sem 'Content-Length' confiável)."""
+
+
+class LimiteDeUploadMiddleware:
+    """
+    Middleware ASGI que recusa com 413 os uploads maiores que UPLOAD_MAX_BYTES antes de o corpo ser lido.
+
+    Pelo 'Content-Length', a recusa é imediata: o Starlette nem começa a gravar o arquivo no disco temporário.
+    Sem ele (ex: 'Transfer-Encoding: chunked'), os bytes são contados à medida que chegam e a leitura é
+    interrompida assim que passam do limite; a resposta do endpoint é então trocada pela recusa.
+    """
+
+    def __init__(self, app, tamanho_maximo: int = UPLOAD_MAX_BYTES, rotas: tuple = ROTAS_UPLOAD):
+        self.app = app
+        self.tamanho_maximo = tamanho_maximo
+        self.rotas = rotas
+
+    async def __call__(self, scope, receive, send):
+        if not self.tamanho_maximo or scope["type"] != "http" or scope.get("method") != "POST" \
+                or (scope.get("path", "").rstrip("/") or "/") not in self.rotas:
+            await self.app(scope, receive, send)
+            return
+        limite = self.tamanho_maximo + FOLGA_MULTIPART
+        for nome, valor in scope.get("headers", []):
+            if nome == b"content-length" and valor.isdigit() and int(valor) > limite:
+                await self._recusar(send)
+                return
+
+        recebidos = 0
+        excedeu = recusado = False
+
+        async def receber():
+            nonlocal recebidos, excedeu
+            mensagem = await receive()
+            if mensagem["type"] == "http.request":
+                recebidos += len(mensagem.get("body", b""))
+                if recebidos > limite:
+                    excedeu = True
+                    raise _CorpoGrandeDemais()
+            return mensagem
+
+        async def enviar(mensagem):
+            nonlocal recusado
+            # Depois de interromper a leitura, a resposta do endpoint (um erro de formulário) vira a recusa.
+            if not excedeu:
+                await send(mensagem)
+            elif mensagem["type"] == "http.response.start":
+                recusado = True
+                await self._recusar(send)
+
+        try:
+            await self.app(scope, receber, enviar)
+        except _CorpoGrandeDemais:
+            if not recusado:
+                await self._recusar(send)
+
+    async def _recusar(self, send) -> None:
+        corpo = json.dumps({
+            "success": False,
+            "error": f"O arquivo ultrapassa o limite de {self.tamanho_maximo} bytes (UPLOAD_MAX_BYTES).",
+        }, ensure_ascii=False).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(corpo)).encode())],
+        })
+        await send({"type": "http.response.body", "body": corpo})
+
+
+def _byte_confirmado(resposta) -> int:
+    """Lê o cabeçalho 'Range' de uma resposta 308 e devolve o próximo byte a ser enviado."""
+    intervalo = resposta.headers.get("Range")
+    if not intervalo:
+        # Nenhum byte foi confirmado ainda.
+        return 0
+    # Formato: "bytes=0-N", onde N é o último byte já gravado pelo GCS.
+    return int(intervalo.split("-", 1)[1]) + 1
+
+
+def _consultar_progresso(transporte, url_sessao: str, tamanho_total: int):
+    """
+    Pergunta ao GCS quantos bytes da sessão já foram gravados. Devolve (offset, resposta_final);
+    se a consulta também falhar de forma transitória (429 ou 5xx), devolve (None, None) para tentar de novo.
+    """
+    resposta = transporte.request(
+        "PUT", url_sessao, data=b"", headers={"Content-Range": f"bytes */{tamanho_total}"}
+    )
+    if resposta.status_code in (200, 201):
+        # O upload já havia sido concluído antes da falha.
+        return tamanho_total, resposta
+    if resposta.status_code == 308:
+        return _byte_confirmado(resposta), None
+    if resposta.status_code == 412:
+        raise gcs_exceptions.PreconditionFailed("O objeto já existe.")
+    if resposta.status_code == 429 or resposta.status_code >= 500:
+        return None, None
+    raise RuntimeError(f"Não foi possível retomar o upload (HTTP {resposta.status_code}): {resposta.text}")
+
+
+def enviar_stream_para_gcs(blob, stream: BinaryIO, content_type: Optional[str] = None,
+                           tamanho_chunk: int = UPLOAD_CHUNK_SIZE,
+                           tamanho_maximo: int = UPLOAD_MAX_BYTES,
+                           max_tentativas: int = UPLOAD_MAX_TENTATIVAS,
+                           if_generation_match: Optional[int] = None) -> dict:
+    """
+    Envia um arquivo para o GCS em blocos de tamanho fixo, usando uma sessão de upload resumível.
+
+    Apenas um bloco fica na memória por vez. Se um bloco falhar (erro de rede, 429 ou 5xx),
+    o GCS é consultado sobre o último byte gravado e o envio é retomado a partir dali,
+    em vez de recomeçar do zero.
+
+    Args:
+        blob: O 'Blob' de destino no GCS.
+        stream: Um arquivo binário "seekable" (ex: 'UploadFile.file').
+        content_type (Optional[str]): O tipo de mídia do arquivo.
+        tamanho_chunk (int): Tamanho de cada bloco, arredondado para múltiplo de 256 KiB.
+        tamanho_maximo (int): Limite de tamanho do arquivo em bytes (0 para não limitar).
+        max_tentativas (int): Falhas consecutivas toleradas antes de abandonar o upload.
+        if_generation_match (Optional[int]): Precondição de geração do objeto (0: só grava se ele não existir;
+                                             caso exista, lança 'PreconditionFailed').
+
+    Returns:
+        dict: O recurso do objeto criado, como devolvido pela API do GCS.
+    """
+    tamanho_total = tamanho_do_stream(stream)
+    validar_tamanho_upload(tamanho_total, tamanho_maximo)
+    with em_andamento("upload"), medir("gcs.upload"):
+        recurso = _enviar_em_blocos(blob, stream, tamanho_total, content_type, tamanho_chunk, max_tentativas,
+                                    if_generation_match)
+    contar_bytes("upload", tamanho_total)
+    return recurso
+
+
+def _enviar_em_blocos(blob, stream: BinaryIO, tamanho_total: int, content_type: Optional[str],
+                      tamanho_chunk: int, max_tentativas: int, if_generation_match: Optional[int] = None) -> dict:
+    """Corpo de 'enviar_stream_para_gcs': abre a sessão resumível e envia os blocos, retomando após falhas."""
+    tamanho_chunk = normalizar_tamanho_chunk(tamanho_chunk)
+
+    # Abre a sessão resumível (uma requisição) e obtém a URL para onde os blocos serão enviados.
+    url_sessao = blob.create_resumable_upload_session(
+        content_type=content_type, size=tamanho_total, if_generation_match=if_generation_match
+    )
+    # Reaproveita a sessão HTTP autenticada do próprio cliente do GCS.
+    transporte = blob.client._http
+
+    offset = 0
+    falhas = 0
+    while True:
+        # Posiciona o arquivo no primeiro byte ainda não gravado e lê apenas um bloco.
+        stream.seek(offset)
+        chunk = stream.read(tamanho_chunk)
+        if chunk:
+            cabecalho_intervalo = f"bytes {offset}-{offset + len(chunk) - 1}/{tamanho_total}"
+        else:
+            # Arquivo vazio: finaliza a sessão sem dados.
+            cabecalho_intervalo = f"bytes */{tamanho_total}"
+
+        try:
+            resposta = transporte.request(
+                "PUT", url_sessao, data=chunk, headers={"Content-Range": cabecalho_intervalo}
+            )
+        except requests.exceptions.RequestException as e:
+            # Erro de rede: o bloco pode ou não ter sido gravado.
+            resposta, erro = None, str(e)
+
+        if resposta is not None:
+            if resposta.status_code in (200, 201):
+                return resposta.json()
+            if resposta.status_code == 308:
+                # Bloco aceito: avança para o próximo byte confirmado pelo GCS.
+                offset = _byte_confirmado(resposta)
+                falhas = 0
+                continue
+            if resposta.status_code == 412:
+                # A precondição de geração falhou na conclusão (ex: o objeto foi criado por outro upload).
+                raise gcs_exceptions.PreconditionFailed(f"O objeto '{blob.name}' já existe.")
+            if resposta.status_code in (404, 410):
+                # A sessão expirou ou foi cancelada; não há o que retomar.
+                raise RuntimeError(f"A sessão de upload não existe mais (HTTP {resposta.status_code}).")
+            if resposta.status_code != 429 and resposta.status_code < 500:
+                raise RuntimeError(f"O GCS recusou o bloco (HTTP {resposta.status_code}): {resposta.text}")
+            erro = f"HTTP {resposta.status_code}"
+
+        # Falha transitória: espera um pouco e retoma a partir do último byte gravado.
+        falhas += 1
+        if falhas > max_tentativas:
+            raise RuntimeError(f"Upload abandonado após {max_tentativas} tentativas. Último erro: {erro}")
+        time.sleep(min(30.0, (2 ** falhas) * 0.5) * random.uniform(0.5, 1.0))
+        try:
+            confirmado, resposta_final = _consultar_progresso(transporte, url_sessao, tamanho_total)
+        except requests.exceptions.RequestException:
+            confirmado, resposta_final = None, None
+        if resposta_final is not None:
+            return resposta_final.json()
+        if confirmado is not None:
+            offset = confirmado
+        # Sem o progresso (erro de rede, 429 ou 5xx na consulta): reenvia a partir do último offset
+        # confirmado (bytes repetidos já gravados são ignorados pelo GCS) e a próxima falha conta na espera.
+
+
+def calcular_sha256(stream: BinaryIO, tamanho_bloco: int = UPLOAD_CHUNK_SIZE) -> str:
+    """SHA-256 de um arquivo "seekable", lido em blocos (sem carregá-lo inteiro); o arquivo volta ao início."""
+    sha256 = hashlib.sha256()
+    stream.seek(0)
+    for bloco in iter(lambda: stream.read(tamanho_bloco), b""):
+        sha256.update(bloco)
+    stream.seek(0)
+    return sha256.hexdigest()
+
+
+def enviar_deduplicado(bucket, destino: DestinoGCS, nome_do_arquivo: str, stream: BinaryIO,
+                       content_type: Optional[str] = None, tamanho_chunk: int = UPLOAD_CHUNK_SIZE,
+                       tamanho_maximo: int = UPLOAD_MAX_BYTES) -> dict:
+    """
+    Guarda um upload pelo endereço do seu conteúdo e cria (ou atualiza) um apelido com o nome do arquivo.
+
+    O SHA-256 é calculado primeiro, no arquivo que o servidor já tem (sem nenhuma ida ao GCS). Se
+    '<pasta>/objetos/<sha256>' já existir, só o apelido é gravado: um conteúdo repetido custa apenas o hash.
+    Caso contrário, os blocos vão direto para esse nome, só se ele ainda não existir ('if_generation_match=0');
+    se outro upload gravar o mesmo conteúdo no meio tempo, a recusa (412) é tratada como conteúdo repetido.
+    O apelido '<pasta>/<nome_do_arquivo>' é um objeto vazio cujos metadados apontam para o conteúdo (ver
+    'resolver_apelido'); reenviar um nome com outro conteúdo muda o apelido, mas o conteúdo anterior continua
+    guardado pelo seu hash. Faz chamadas bloqueantes: deve rodar no pool de E/S do GCS.
+
+    Returns:
+        dict: 'filename' (o nome do apelido), 'sha256', 'objeto' (o nome do conteúdo no bucket), 'tamanho' e
+        'duplicado' (se o conteúdo já existia).
+    """
+    nome = nome_seguro(nome_do_arquivo)
+    tamanho_total = tamanho_do_stream(stream)
+    validar_tamanho_upload(tamanho_total, tamanho_maximo)
+    with medir("upload.hash"):
+        sha256 = calcular_sha256(stream)
+    conteudo = bucket.blob(destino.nome_do_objeto(f"{PASTA_CONTEUDOS}/{sha256}"))
+    with medir("gcs.metadados"):
+        duplicado = conteudo.exists()
+    if not duplicado:
+        try:
+            enviar_stream_para_gcs(conteudo, stream, content_type=content_type, tamanho_chunk=tamanho_chunk,
+                                   tamanho_maximo=tamanho_maximo, if_generation_match=0)
+        except gcs_exceptions.PreconditionFailed:
+            # Outro upload gravou o mesmo conteúdo entre a consulta e o envio.
+            duplicado = True
+    if duplicado:
+        contar_bytes("upload_deduplicado", tamanho_total)
+
+    _gravar_apelido(bucket, destino, nome, sha256, conteudo.name, tamanho_total, content_type)
+    return {"filename": nome, "sha256": sha256, "objeto": conteudo.name, "tamanho": tamanho_total, "duplicado": duplicado}
+
+
+def _gravar_apelido(bucket, destino: DestinoGCS, nome_do_arquivo: str, sha256: str, nome_conteudo: str,
+                    tamanho: int, content_type: Optional[str]) -> None:
+    """Cria (ou atualiza) o apelido vazio '<pasta>/<nome_do_arquivo>', que aponta para o conteúdo pelo seu SHA-256."""
+    apelido = bucket.blob(destino.nome_do_objeto(nome_do_arquivo))
+    apelido.metadata = {
+        METADADO_APELIDO: "1", "sha256": sha256, "objeto": nome_conteudo, "tamanho": str(tamanho),
+    }
+    with medir("gcs.apelido"):
+        apelido.upload_from_string(b"", content_type=content_type or "application/octet-stream")
+
+
+def resolver_apelido(blob):
+    """
+    Se 'blob' for um apelido criado pelo upload deduplicado (marcado pelo metadado METADADO_APELIDO), devolve
+    o blob do conteúdo (com os metadados já lidos); caso contrário, devolve o próprio blob. Devolve None se o
+    conteúdo não existir.
+    """
+    metadados = blob.metadata or {}
+    if metadados.get(METADADO_APELIDO) != "1" or not metadados.get("objeto"):
+        return blob
+    return blob.bucket.get_blob(metadados["objeto"])
+
+
+# --- Upload direto do navegador para o GCS ---
+# O servidor só abre a sessão resumível (uma requisição pequena) e devolve a URL da sessão ao navegador,
+# que envia os blocos direto ao GCS; o arquivo não passa pelo servidor durante o envio. A URL da sessão já é a
+# autorização (vale por uma semana e só grava aquele objeto), então não há chave para assinar.
+# O upload direto não é deduplicado: o endereço de um conteúdo é o seu SHA-256, que o GCS não calcula. Aceitar o
+# hash informado pelo navegador deixaria um cliente gravar bytes quaisquer no endereço de outro conteúdo, e
+# conferi-lo no servidor exigiria baixar o arquivo inteiro, justamente o tráfego que o upload direto evita.
+
+
+def iniciar_upload_direto(bucket, destino: DestinoGCS, nome_do_arquivo: str, tamanho: int,
+                          content_type: Optional[str] = None, origem: Optional[str] = None,
+                          tamanho_maximo: int = UPLOAD_MAX_BYTES) -> dict:
+    """
+    Abre uma sessão de upload resumível para o navegador enviar o arquivo direto ao GCS, com o próprio nome.
+
+    'origem' (o cabeçalho 'Origin' da página) libera o CORS dos blocos enviados à sessão.
+    Faz chamadas bloqueantes: deve rodar no pool de E/S do GCS.
+
+    Returns:
+        dict: 'filename', 'url_sessao' e 'tamanho_bloco' (múltiplo de 256 KiB, como o GCS exige).
+    """
+    nome = nome_seguro(nome_do_arquivo)
+    validar_tamanho_upload(tamanho, tamanho_maximo)
+    with medir("gcs.sessao_direta"):
+        url_sessao = bucket.blob(destino.nome_do_objeto(nome)).create_resumable_upload_session(
+            content_type=content_type or "application/octet-stream", size=tamanho, origin=origem,
+        )
+    return {"filename": nome, "url_sessao": url_sessao, "tamanho_bloco": normalizar_tamanho_chunk(UPLOAD_CHUNK_SIZE)}
+
+
+def concluir_upload_direto(bucket, destino: DestinoGCS, nome_do_arquivo: str,
+                           tamanho_maximo: int = UPLOAD_MAX_BYTES) -> dict:
+    """
+    Confirma um upload direto aberto por 'iniciar_upload_direto', depois que o navegador enviou o último bloco.
+
+    Só lê os metadados do objeto (o conteúdo não passa pelo servidor). Lança ValueError se o objeto ainda não
+    existir (upload incompleto ou cancelado) ou se o que chegou passar do limite (o objeto é então apagado).
+
+    Returns:
+        dict: 'filename' e 'tamanho'.
+    """
+    nome = nome_seguro(nome_do_arquivo)
+    with medir("gcs.metadados"):
+        blob = bucket.get_blob(destino.nome_do_objeto(nome))
+    if blob is None:
+        raise ValueError(f"O upload de '{nome}' ainda não foi concluído no GCS.")
+    try:
+        # A sessão aceita o tamanho que o navegador declarou; o limite vale para o que de fato chegou.
+        validar_tamanho_upload(blob.size or 0, tamanho_maximo)
+    except ValueError:
+        blob.delete()
+        raise
+    contar_bytes("upload_direto", blob.size or 0)
+    return {"filename": nome, "tamanho": blob.size}
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+# --- Importações Padrão ---
+# Importa o módulo 'os' para ler os limites de concorrência das variáveis de ambiente.
+import os
+# Importa 'asyncio' para que os endpoints assíncronos possam aguardar as chamadas bloqueantes.
+import asyncio
+# Importa 'threading' para proteger os contadores de métricas.
+import threading
+# Importa 'contextvars' para que cada tarefa herde o contexto de quem a submeteu (ex: o span do turno do chat).
+import contextvars
+# Importa o pool de threads e o tipo 'Future' da biblioteca padrão.
+from concurrent.futures import Future, ThreadPoolExecutor
+# Importa 'Callable' e 'Optional' para as anotações de tipo.
+from typing import Any, Callable, Optional
+
+# Limite de chamadas simultâneas por serviço externo (cada serviço tem o seu próprio pool de threads).
+LIMITES_IO_PADRAO = {
+    "gcs": int(os.getenv("IO_LIMITE_GCS", "8")),
+    "gmail": int(os.getenv("IO_LIMITE_GMAIL", "4")),
+}
+
+
+class ExecutorIO:
+    """
+    Executa as chamadas bloqueantes (GCS, Gmail) em pools de threads dimensionados por serviço.
+
+    Cada serviço ("backend") tem um limite próprio de chamadas simultâneas; o excedente espera
+    na fila do seu pool, sem ocupar o laço de eventos do uvicorn. Os contadores de fila,
+    execução, concluídas e falhas ficam disponíveis em 'metricas()'.
+
+    Atenção: uma tarefa não deve submeter outra para o MESMO backend e esperar por ela,
+    pois com o pool cheio isso causaria um impasse (deadlock).
+    """
+
+    def __init__(self, limites: Optional[dict] = None):
+        limites = limites or LIMITES_IO_PADRAO
+        self._lock = threading.Lock()
+        self._executores = {}
+        self._metricas = {}
+        for backend, limite in limites.items():
+            limite = max(1, int(limite))
+            self._executores[backend] = ThreadPoolExecutor(max_workers=limite, thread_name_prefix=f"io-{backend}")
+            self._metricas[backend] = {"limite": limite, "em_fila": 0, "em_execucao": 0, "concluidas": 0, "falhas": 0}
+
+    def _contar(self, backend: str, **variacoes: int) -> None:
+        """Atualiza os contadores de um backend de forma segura entre threads."""
+        with self._lock:
+            metricas = self._metricas[backend]
+            for nome, variacao in variacoes.items():
+                metricas[nome] += variacao
+
+    def submeter(self, backend: str, func: Callable, *args, **kwargs) -> Future:
+        """Agenda 'func' no pool do backend e devolve um 'Future' (para uso em código síncrono)."""
+        if backend not in self._executores:
+            raise ValueError(f"Backend de E/S desconhecido: '{backend}'.")
+        self._contar(backend, em_fila=1)
+
+        def tarefa() -> Any:
+            # Saiu da fila e começou a executar.
+            self._contar(backend, em_fila=-1, em_execucao=1)
+            try:
+                resultado = func(*args, **kwargs)
+            except BaseException:
+                self._contar(backend, em_execucao=-1, falhas=1)
+                raise
+            self._contar(backend, em_execucao=-1, concluidas=1)
+            return resultado
+
+        # O pool não repassa o contexto sozinho: sem isto, os spans criados na thread do pool
+        # ficariam soltos, em vez de aninhados no turno do chat que disparou a chamada.
+        return self._executores[backend].submit(contextvars.copy_context().run, tarefa)
+
+    async def executar(self, backend: str, func: Callable, *args, **kwargs) -> Any:
+        """Executa 'func' no pool do backend e aguarda o resultado sem bloquear o laço de eventos."""
+        return await asyncio.wrap_future(self.submeter(backend, func, *args, **kwargs))
+
+    def metricas(self) -> dict:
+        """Devolve uma cópia dos contadores de cada backend (limite, em_fila, em_execucao, concluidas, falhas)."""
+        with self._lock:
+            return {backend: dict(valores) for backend, valores in self._metricas.items()}
+
+    def encerrar(self, esperar: bool = True) -> None:
+        """Desliga todos os pools de threads."""
+        for executor in self._executores.values():
+            executor.shutdown(wait=esperar)
+
+
+# Instância única do processo, criada na primeira utilização.
+_executor: Optional[ExecutorIO] = None
+_lock_executor = threading.Lock()
+
+
+def obter_executor_io() -> ExecutorIO:
+    """Devolve o executor de E/S compartilhado pelo processo."""
+    global _executor
+    if _executor is None:
+        with _lock_executor:
+            if _executor is None:
+                _executor = ExecutorIO()
+    return _executor
+
+
+async def executar_io(backend: str, func: Callable, *args, **kwargs) -> Any:
+    """Atalho para 'obter_executor_io().executar(...)'."""
+    return await obter_executor_io().executar(backend, func, *args, **kwargs)
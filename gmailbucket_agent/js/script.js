@@ -1,37 +1,56 @@
+// O envio dos arquivos ('uploadArquivos') vem de '/templates/js/upload.js', carregado antes deste script.
+
+/**
+ * Acrescenta um trecho de texto a um elemento, opcionalmente dentro de uma tag (ex: 'b' ou 'code').
+ * O texto vai em 'textContent', então nomes de arquivo e mensagens de erro nunca são interpretados como HTML.
+ */
+function acrescentar(elemento, texto, tag) {
+    const filho = tag ? document.createElement(tag) : document.createTextNode(texto);
+    if (tag) filho.textContent = texto;
+    elemento.appendChild(filho);
+    return filho;
+}
+
 document.getElementById('upload-form').addEventListener('submit', async (event) => {
     // Impede o comportamento padrão do formulário (que recarregaria a página).
     event.preventDefault();
-    
+
     const form = event.target;
-    const formData = new FormData(form);
+    const files = Array.from(form.querySelector('input[type="file"]').files);
     const resultDiv = document.getElementById('result');
-    
-    // Mostra uma mensagem de "Enviando..." enquanto a requisição está em andamento.
-    resultDiv.innerHTML = "Enviando...";
-    resultDiv.className = ''; // Limpa classes de erro/sucesso anteriores.
+    if (!files.length) return;
 
-    try {
-        // Envia os dados do formulário para o endpoint '/upload' usando o método POST.
-        const response = await fetch('/upload', {
-            method: 'POST',
-            body: formData,
-        });
+    // Mostra o progresso de cada arquivo enquanto os blocos são enviados direto ao bucket.
+    const progresso = new Map(files.map((file) => [file, 0]));
+    const mostrarProgresso = () => {
+        resultDiv.textContent = 'Enviando...\n' + files
+            .map((file) => `${file.name}: ${Math.round(progresso.get(file) * 100)}%`).join('\n');
+    };
+    resultDiv.className = ''; // Limpa classes de erro/sucesso anteriores.
+    resultDiv.style.whiteSpace = 'pre-line';
+    mostrarProgresso();
 
-        // Converte a resposta do servidor de JSON para um objeto JavaScript.
-        const data = await response.json();
+    const resultados = await uploadArquivos(files, (file, fracao) => {
+        progresso.set(file, fracao);
+        mostrarProgresso();
+    });
+    const enviados = resultados.filter((r) => r.data).map((r) => r.data.filename);
+    const erros = resultados.filter((r) => r.error);
 
-        if (data.success) {
-            // Se o upload foi bem-sucedido, exibe a mensagem de sucesso e o nome do arquivo.
-            resultDiv.innerHTML = `<b>Sucesso!</b><br>Arquivo enviado. Agora, na conversa com o agente, diga que quer anexar o arquivo: <br><b><code>${data.filename}</code></b>`;
-            resultDiv.className = 'success';
-        } else {
-            // Se o servidor retornou um erro, exibe a mensagem de erro.
-            resultDiv.innerHTML = `<b>Erro:</b> ${data.error}`;
-            resultDiv.className = 'error';
+    resultDiv.textContent = '';
+    if (enviados.length) {
+        // Exibe a mensagem de sucesso e os nomes que devem ser citados na conversa com o agente.
+        acrescentar(resultDiv, 'Sucesso!', 'b');
+        acrescentar(resultDiv, '\nArquivo(s) enviado(s). Agora, na conversa com o agente, diga que quer anexar:');
+        for (const nome of enviados) {
+            acrescentar(resultDiv, '\n');
+            acrescentar(acrescentar(resultDiv, '', 'b'), nome, 'code');
         }
-    } catch (error) {
-        // Se ocorreu um erro de rede ou conexão, exibe uma mensagem de erro genérica.
-        resultDiv.innerHTML = `<b>Erro de conexão:</b> ${error}`;
-        resultDiv.className = 'error';
     }
-});
\ No newline at end of file
+    for (const { file, error } of erros) {
+        if (resultDiv.childNodes.length) acrescentar(resultDiv, '\n');
+        acrescentar(resultDiv, `Erro em ${file.name}:`, 'b');
+        acrescentar(resultDiv, ` ${error.message || error}`);
+    }
+    resultDiv.className = erros.length ? 'error' : 'success';
+});
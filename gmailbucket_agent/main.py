@@ -1,33 +1,61 @@
 # Importa o módulo 'os' para interagir com o sistema operacional, como ler variáveis de ambiente.
 import os
+# Importa 'asyncio' para agendar em paralelo os emails de um mesmo pedido em '/send/lote' e limitar as revisões.
+import asyncio
+# Importa 'hmac' para comparar a chave do envio direto em tempo constante.
+import hmac
 # Importa o 'uvicorn', que é o servidor ASGI (Asynchronous Server Gateway Interface) usado para rodar nossa aplicação FastAPI.
 import uvicorn
 # Importa classes essenciais do FastAPI:
 # - FastAPI: A classe principal para criar a aplicação web.
 # - File, UploadFile: Usadas para declarar e manipular o upload de arquivos.
-from fastapi import FastAPI, File, UploadFile
-# Importa 'HTMLResponse' para poder retornar respostas no formato HTML.
-from fastapi.responses import HTMLResponse
+from fastapi import Depends, FastAPI, File, Header, HTTPException, Request, UploadFile
+# Importa 'HTMLResponse' para poder retornar respostas no formato HTML
+# e 'StreamingResponse' para enviar a resposta do agente em pedaços (Server-Sent Events).
+from fastapi.responses import HTMLResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 # Importa 'BaseModel' do Pydantic para criar modelos de dados que garantem a validação dos dados de requisições.
-from pydantic import BaseModel
-# Importa a função 'load_dotenv' para carregar variáveis de ambiente de um arquivo .env.
-from dotenv import load_dotenv
+from pydantic import BaseModel, Field, field_validator
+# Importa 'Optional' para os campos opcionais das requisições.
+from typing import Optional
 
 # --- Importações do nosso agente e ferramentas ---
 
-# Importa a biblioteca cliente do Google Cloud Storage para interagir com os buckets de armazenamento.
-from google.cloud import storage
+# Importa a configuração compartilhada: carrega o .env, valida GCS_ATTACHMENT_PATH uma única vez
+# e mantém um único cliente do Google Cloud Storage (a biblioteca só é carregada na primeira utilização).
+from .config import obter_cliente_storage, obter_destino_gcs
 # Importa a classe 'Runner' do kit de desenvolvimento de agentes (ADK) do Google.
 # O 'Runner' é responsável por executar o agente e gerenciar o ciclo de vida da conversa.
 from google.adk.runners import Runner
-# Importa um serviço de sessão que armazena o histórico da conversa em memória.
-from google.adk.sessions import InMemorySessionService
 # Importa a instância 'root_agent' que foi definida no nosso arquivo 'agent.py'.
 from .agent import root_agent
-
-# Executa a função para carregar as variáveis de ambiente do arquivo .env.
-load_dotenv()
+# Importa o envio em blocos (upload resumível) para o GCS e as suas configurações.
+from .gcs_upload import (
+    UPLOAD_CHUNK_SIZE, UPLOAD_DEDUPLICACAO, UPLOAD_MAX_BYTES, LimiteDeUploadMiddleware, concluir_upload_direto,
+    enviar_deduplicado, enviar_stream_para_gcs, iniciar_upload_direto, nome_seguro, validar_tamanho_upload,
+)
+# Importa a camada de E/S que executa as chamadas bloqueantes do GCS em um pool de threads limitado.
+from .io_executor import executar_io, obter_executor_io
+# Importa o cache de anexos usado pela ferramenta 'enviar_email'.
+from .tools.attachment_cache import obter_cache_de_anexos
+# Importa as funções que executam um turno do agente e repassam os seus eventos.
+from .chat_stream import eventos_sse, garantir_sessao, responder
+# Importa a fábrica do serviço de sessões (SQLite persistente, por padrão).
+from .sqlite_sessions import criar_servico_de_sessoes
+# Importa a fila de envios em segundo plano, os workers que a esvaziam e a espera pelo resultado de um envio.
+from .tools.send_queue import (
+    ENVIADO, FALHOU, INCERTO, aguardar_envio, chave_padrao, obter_fila_de_envios, obter_trabalhadores_de_envio,
+)
+# Importa a retomada das malas diretas interrompidas e a consulta ao progresso de uma campanha.
+from .tools.mail_merge import consultar_mala_direta, parar_campanhas, retomar_campanhas_interrompidas
+# Importa o registro de métricas (formato Prometheus) e a configuração opcional dos traços.
+from .metrics import configurar_tracos, exportar, por_rotulo, registro
+# Importa a validação usada pela ferramenta 'enviar_email', repetida pelo '/send' (sem o agente).
+from .tools.funcs import ErroDeEnvio, validar_destinatarios
+# Importa a revisão opcional do assunto e do corpo em uma única chamada ao modelo.
+from .polish import ErroDePolimento, polir_email
+# Importa o controle de admissão (limites de requisições simultâneas, fila com prazo e recusas 429/503).
+from .admission import ADMISSAO_ATIVA, AdmissaoMiddleware, criar_controles
 
 # --- Inicialização da Aplicação ---
 
@@ -50,12 +78,62 @@ program = Runner(
                 agent=root_agent,
                 # Define um nome para a aplicação, útil para logging e identificação.
                 app_name="agent_gmail",
-                # Define o serviço de sessão. 'InMemorySessionService' mantém o histórico da conversa na memória RAM do servidor.
-                session_service=InMemorySessionService(),
+                # Define o serviço de sessão, escolhido em SESSOES_BACKEND. O padrão ('sqlite') guarda o histórico
+                # em disco, compartilhado entre os workers, e mantém em memória apenas as sessões mais usadas.
+                session_service=criar_servico_de_sessoes(),
                )
 
-# Pega o caminho do bucket e pasta no Google Cloud Storage (GCS) a partir da variável de ambiente.
-GCS_ATTACHMENT_PATH = os.getenv("GCS_ATTACHMENT_PATH")
+# Identificador do usuário usado nas sessões do Runner quando a requisição não informa um.
+USUARIO_PADRAO = "usuario"
+# Liga o envio direto ('/send' e '/send/lote'); desligado por padrão, os dois respondem 404.
+ENVIO_DIRETO_ATIVO = os.getenv("ENVIO_DIRETO_ATIVO", "0").strip().lower() not in ("0", "false", "nao", "não", "")
+# Chave compartilhada exigida no cabeçalho 'X-Api-Key' do envio direto (sem ela, o envio direto fica desligado).
+ENVIO_DIRETO_CHAVE = os.getenv("ENVIO_DIRETO_CHAVE", "")
+# Máximo de emails em uma única requisição a '/send/lote'.
+ENVIO_DIRETO_LOTE_MAX = int(os.getenv("ENVIO_DIRETO_LOTE_MAX", "100"))
+# Quantas revisões pelo modelo ("polir") rodam ao mesmo tempo, somando todas as requisições.
+ENVIO_DIRETO_POLIMENTOS_SIMULTANEOS = max(1, int(os.getenv("ENVIO_DIRETO_POLIMENTOS_SIMULTANEOS", "4")))
+# Por quanto tempo (em segundos) a requisição espera o resultado dos envios; depois disso, eles seguem na fila.
+ENVIO_DIRETO_ESPERA = float(os.getenv("ENVIO_DIRETO_ESPERA_S", "30"))
+# Limita as chamadas simultâneas ao modelo feitas pelo envio direto.
+_polimentos = asyncio.Semaphore(ENVIO_DIRETO_POLIMENTOS_SIMULTANEOS)
+
+# Além das métricas das etapas, o /metrics exporta os contadores já mantidos pelos pools de E/S,
+# pelo cache de anexos e pela fila de envios (lidos no momento da coleta).
+registro.registrar_coletor("gmailbucket_io", lambda: por_rotulo(obter_executor_io().metricas(), "backend"))
+registro.registrar_coletor("gmailbucket_cache_anexos", lambda: obter_cache_de_anexos().estatisticas())
+registro.registrar_coletor("gmailbucket_envios", lambda: {
+    "por_situacao": [({"situacao": situacao}, total) for situacao, total in obter_fila_de_envios().contagem().items()]
+})
+
+# Limita as requisições simultâneas do /chat, do /upload e do /send (no total e por usuário). O excedente espera
+# em uma fila curta; acima dela (ou depois do prazo), a resposta é 429/503 na hora, com 'Retry-After'.
+if ADMISSAO_ATIVA:
+    controles_de_admissao = criar_controles()
+    app.add_middleware(AdmissaoMiddleware, controles=controles_de_admissao)
+    registro.registrar_coletor("gmailbucket_admissao", lambda: por_rotulo(
+        {nome: controle.estado() for nome, controle in controles_de_admissao.items()}, "endpoint"
+    ))
+
+# Recusa com 413 os uploads maiores que UPLOAD_MAX_BYTES pelo 'Content-Length', antes de o corpo ser lido (e antes
+# de ocupar uma vaga da admissão); sem o cabeçalho, a leitura é interrompida assim que o limite é passado.
+app.add_middleware(LimiteDeUploadMiddleware)
+
+# --- Ciclo de vida ---
+
+# Inicia os workers da fila de envios quando o servidor sobe (cada processo tem os seus).
+@app.on_event("startup")
+async def iniciar_envios():
+    configurar_tracos()
+    obter_trabalhadores_de_envio().iniciar()
+    # Continua a leitura das malas diretas que pararam no meio (do último lote agendado).
+    await retomar_campanhas_interrompidas()
+
+# Para os workers quando o servidor desce; os envios pendentes continuam guardados na fila.
+@app.on_event("shutdown")
+async def parar_envios():
+    await parar_campanhas()
+    await obter_trabalhadores_de_envio().parar()
 
 # --- Endpoints (Rotas) da nossa API ---
 
@@ -80,58 +158,252 @@ async def get_chat_page():
 @app.post("/upload")
 async def upload_file(file: UploadFile = File(...)):
     """Este endpoint lida com o upload de um arquivo para o Google Cloud Storage (GCS)."""
-    # Verifica se o caminho do GCS foi configurado no arquivo .env.
-    if not GCS_ATTACHMENT_PATH:
-        return {"success": False, "error": "GCS_ATTACHMENT_PATH não configurado no .env"}
-        
     try:
-        # Inicializa o cliente do Google Cloud Storage.
-        storage_client = storage.Client()
-        # Define o caminho do GCS a ser processado.
-        path_to_process = GCS_ATTACHMENT_PATH
-        # Remove o prefixo "gs://" se ele existir, pois a biblioteca não o utiliza nesta parte.
-        if path_to_process.startswith("gs://"):
-            path_to_process = path_to_process[5:]
-        
-        # Separa o nome do bucket do caminho da pasta dentro dele.
-        bucket_name, folder_path = path_to_process.split('/', 1)
-        # Acessa o bucket específico.
-        bucket = storage_client.bucket(bucket_name)
-        # Cria o nome completo do objeto (blob) no bucket, incluindo a pasta.
-        blob_name = f"{folder_path.strip('/')}/{file.filename}"
-        # Cria uma referência para o blob (o futuro arquivo no bucket).
-        blob = bucket.blob(blob_name)
-        
-        # Lê o conteúdo do arquivo enviado de forma assíncrona.
-        content = await file.read()
-        # Faz o upload do conteúdo para o GCS, especificando o tipo de conteúdo (ex: 'image/jpeg').
-        blob.upload_from_string(content, content_type=file.content_type)
+        # Lê o bucket e a pasta de destino (GCS_ATTACHMENT_PATH, validado uma única vez).
+        destino = obter_destino_gcs()
+        # Obtém o cliente compartilhado do Google Cloud Storage. Na primeira vez, a descoberta de
+        # credenciais é bloqueante, por isso a chamada roda no pool de E/S do GCS.
+        storage_client = await executar_io("gcs", obter_cliente_storage)
+        bucket = storage_client.bucket(destino.bucket)
+        # Só o nome do arquivo, sem pastas: o cliente não escolhe onde o arquivo é gravado.
+        nome = nome_seguro(file.filename)
+
+        # O corpo já foi limitado por 'LimiteDeUploadMiddleware'; aqui vale o tamanho do arquivo em si.
+        if file.size is not None:
+            validar_tamanho_upload(file.size, UPLOAD_MAX_BYTES)
+        if UPLOAD_DEDUPLICACAO:
+            # Guarda o conteúdo pelo seu SHA-256 (uma única cópia por conteúdo) e o nome do arquivo como um apelido.
+            # O envio é bloqueante, por isso roda no pool de E/S do GCS, fora do laço de eventos.
+            resultado = await executar_io(
+                "gcs", enviar_deduplicado, bucket, destino, nome, file.file,
+                content_type=file.content_type, tamanho_chunk=UPLOAD_CHUNK_SIZE, tamanho_maximo=UPLOAD_MAX_BYTES,
+            )
+            return {"success": True, "filename": nome, "sha256": resultado["sha256"], "duplicado": resultado["duplicado"]}
+
+        # Sem deduplicação: envia o arquivo para o GCS com o próprio nome, em blocos de UPLOAD_CHUNK_SIZE bytes.
+        await executar_io(
+            "gcs", enviar_stream_para_gcs, bucket.blob(destino.nome_do_objeto(nome)), file.file,
+            content_type=file.content_type, tamanho_chunk=UPLOAD_CHUNK_SIZE, tamanho_maximo=UPLOAD_MAX_BYTES,
+        )
         
         # Retorna uma resposta de sucesso com o nome do arquivo.
-        return {"success": True, "filename": file.filename}
+        return {"success": True, "filename": nome}
     # Captura qualquer exceção que ocorra durante o processo de upload.
     except Exception as e:
         return {"success": False, "error": str(e)}
 
+# Define a estrutura da requisição de upload direto (do navegador para o GCS): o nome, o tamanho e o tipo do arquivo.
+class UploadDiretoRequest(BaseModel):
+    filename: str
+    size: int = 0
+    content_type: Optional[str] = None
+
+# Define uma rota POST que abre uma sessão de upload resumível para o navegador enviar o arquivo direto ao GCS.
+@app.post("/upload/direto")
+async def upload_direto(pedido: UploadDiretoRequest, request: Request):
+    """
+    Este endpoint devolve a URL da sessão para onde o navegador envia os blocos do arquivo (sem passar por
+    este servidor). O arquivo é gravado com o próprio nome e conferido em "/upload/direto/concluir".
+    """
+    try:
+        destino = obter_destino_gcs()
+        storage_client = await executar_io("gcs", obter_cliente_storage)
+        # A sessão é aberta para a origem da página, que assim pode enviar os blocos ao GCS (CORS).
+        resultado = await executar_io(
+            "gcs", iniciar_upload_direto, storage_client.bucket(destino.bucket), destino, pedido.filename,
+            pedido.size, content_type=pedido.content_type, origem=request.headers.get("origin"),
+        )
+        return {"success": True, **resultado}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+# Define uma rota POST chamada pelo navegador depois de enviar o último bloco de um upload direto.
+@app.post("/upload/direto/concluir")
+async def upload_direto_concluir(pedido: UploadDiretoRequest):
+    """Este endpoint confirma (pelos metadados, sem ler o conteúdo) que o arquivo chegou ao GCS."""
+    try:
+        destino = obter_destino_gcs()
+        storage_client = await executar_io("gcs", obter_cliente_storage)
+        resultado = await executar_io(
+            "gcs", concluir_upload_direto, storage_client.bucket(destino.bucket), destino, pedido.filename,
+        )
+        return {"success": True, **resultado}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+# Define uma rota GET que expõe o estado dos pools de E/S (limite, fila, em execução, concluídas e falhas).
+@app.get("/io/metricas")
+async def io_metricas():
+    """Este endpoint devolve as métricas da camada de E/S (GCS e Gmail)."""
+    return obter_executor_io().metricas()
+
+# Define uma rota GET com todas as métricas no formato de texto do Prometheus.
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Este endpoint devolve a duração das etapas, os bytes transferidos e as operações em andamento."""
+    return PlainTextResponse(exportar(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# Define uma rota GET com os contadores do cache de anexos (acertos, falhas e bytes economizados).
+@app.get("/cache/anexos")
+async def cache_anexos_metricas():
+    """Este endpoint devolve as estatísticas do cache de anexos."""
+    return obter_cache_de_anexos().estatisticas()
+
+# Define uma rota GET com a quantidade de envios agendados em cada situação.
+@app.get("/envios")
+async def envios_resumo():
+    """Este endpoint devolve quantos envios da fila estão pendentes, enviados, com falha etc."""
+    return obter_fila_de_envios().contagem()
+
+# Define uma rota GET com a situação de um envio agendado pela ferramenta 'agendar_email'.
+@app.get("/envios/{id_envio}")
+async def envio_status(id_envio: str):
+    """Este endpoint devolve a situação, as tentativas e o último erro de um envio agendado."""
+    envio = obter_fila_de_envios().consultar(id_envio)
+    if envio is None:
+        raise HTTPException(status_code=404, detail="Envio não encontrado.")
+    return envio
+
+# Define uma rota GET com o progresso de uma mala direta iniciada pela ferramenta 'iniciar_mala_direta'.
+@app.get("/mala-direta/{id_campanha}")
+async def mala_direta_status(id_campanha: str):
+    """Este endpoint devolve a situação da leitura do arquivo, as linhas lidas e a situação dos envios da campanha."""
+    progresso = await consultar_mala_direta(id_campanha)
+    if progresso["status"] == "erro":
+        raise HTTPException(status_code=404, detail="Campanha não encontrada.")
+    return progresso
+
+# Define a estrutura de um envio direto (sem o agente), para sistemas que já têm todos os dados do email.
+# Com "polir": true, o assunto e o corpo passam por uma única revisão do modelo antes do envio.
+class SendRequest(BaseModel):
+    destinatarios: list[str] = Field(min_length=1)
+    assunto: str = Field(min_length=1)
+    corpo: str
+    anexos: list[str] = []
+    polir: bool = False
+    # Identificador do envio: repetir um pedido com a mesma chave não envia outra cópia.
+    # Sem ela, a chave é derivada do conteúdo do pedido.
+    chave_idempotencia: Optional[str] = None
+
+    @field_validator("destinatarios")
+    @classmethod
+    def validar_emails(cls, destinatarios: list[str]) -> list[str]:
+        """Recusa a requisição (422) com a mesma validação usada pela ferramenta 'enviar_email'."""
+        try:
+            validar_destinatarios(destinatarios)
+        except ErroDeEnvio as e:
+            raise ValueError(str(e))
+        return [email.strip() for email in destinatarios]
+
+# Define a estrutura de um envio direto de vários emails diferentes (cada um com os seus dados).
+class SendLoteRequest(BaseModel):
+    emails: list[SendRequest] = Field(min_length=1, max_length=ENVIO_DIRETO_LOTE_MAX)
+
+def exigir_chave_de_envio(x_api_key: str = Header(default="")) -> None:
+    """
+    Só deixa passar o envio direto quando ele está ligado (ENVIO_DIRETO_ATIVO e ENVIO_DIRETO_CHAVE) e a
+    requisição traz a chave certa no cabeçalho 'X-Api-Key'. Desligado, os endpoints respondem como inexistentes.
+    """
+    if not ENVIO_DIRETO_ATIVO or not ENVIO_DIRETO_CHAVE:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(x_api_key.encode(), ENVIO_DIRETO_CHAVE.encode()):
+        raise HTTPException(status_code=401, detail="Chave de envio inválida.")
+
+async def enviar_pedido(pedido: SendRequest, prazo: float) -> dict:
+    """
+    Revisa o email (se pedido) e o coloca na fila de envios, que respeita a cota do Gmail (balde de fichas
+    compartilhado) e não envia duas vezes o mesmo pedido. Espera o resultado por até 'prazo' segundos.
+    """
+    assunto, corpo = pedido.assunto, pedido.corpo
+    # A chave vem do pedido original (antes da revisão, que pode mudar a cada chamada): repetir a requisição
+    # devolve o mesmo envio em vez de mandar outra cópia.
+    chave = pedido.chave_idempotencia or chave_padrao(pedido.destinatarios, assunto, corpo, pedido.anexos, "send")
+    try:
+        if pedido.polir:
+            async with _polimentos:
+                assunto, corpo = await polir_email(root_agent.canonical_model, assunto, corpo)
+        envio, _ = await asyncio.to_thread(
+            obter_fila_de_envios().agendar, pedido.destinatarios, assunto, corpo, pedido.anexos or None, chave
+        )
+        obter_trabalhadores_de_envio().avisar()
+        envio = await aguardar_envio(envio["id"], prazo) or envio
+    # Erros esperados (revisão inválida) são devolvidos como estão.
+    except ErroDePolimento as e:
+        return {"success": False, "error": str(e)}
+    except Exception as e:
+        return {"success": False, "error": f"Ocorreu um erro inesperado: {e}"}
+
+    # Um envio que ainda não saiu no prazo continua na fila ('situacao' pendente): 'id_envio' serve para
+    # consultá-lo em GET /envios/{id_envio}.
+    falhou = envio["status"] in (FALHOU, INCERTO)
+    resultado = {"success": not falhou, "id_envio": envio["id"], "situacao": envio["status"],
+                 "id": envio["gmail_id"], "destinatarios": pedido.destinatarios}
+    if falhou:
+        resultado["error"] = envio["erro"]
+    if pedido.polir:
+        # Devolve o texto realmente enviado.
+        resultado.update({"assunto": envio["assunto"], "corpo": envio["corpo_mensagem"]})
+    return resultado
+
+# Define uma rota POST para enviar um email com os dados já prontos, sem passar pelo agente.
+@app.post("/send", dependencies=[Depends(exigir_chave_de_envio)])
+async def send(pedido: SendRequest):
+    """Este endpoint envia um email pela fila de envios; devolve o id da mensagem no Gmail ou a situação do envio."""
+    return await enviar_pedido(pedido, ENVIO_DIRETO_ESPERA)
+
+# Define uma rota POST para agendar vários emails diferentes de uma vez (a fila os envia no ritmo da cota do Gmail).
+@app.post("/send/lote", dependencies=[Depends(exigir_chave_de_envio)])
+async def send_lote(pedido: SendLoteRequest):
+    """Este endpoint agenda cada email da lista e devolve o resultado (ou a situação) de cada um, na mesma ordem."""
+    # Todos os envios compartilham o mesmo prazo de espera.
+    resultados = await asyncio.gather(*(enviar_pedido(email, ENVIO_DIRETO_ESPERA) for email in pedido.emails))
+    enviados = sum(1 for resultado in resultados if resultado.get("situacao") == ENVIADO)
+    falhas = sum(1 for resultado in resultados if not resultado["success"])
+    return {"success": not falhas, "enviados": enviados, "pendentes": len(resultados) - enviados - falhas,
+            "falhas": falhas, "resultados": resultados}
+
 # Define a estrutura de dados esperada para a requisição do chat usando Pydantic.
-# A requisição deve conter um campo "message" que é uma string.
+# A requisição deve conter um campo "message" que é uma string e, opcionalmente, o "session_id"
+# devolvido na resposta anterior (para continuar a mesma conversa) e o "user_id" de quem conversa.
 class ChatRequest(BaseModel):
     message: str
+    session_id: Optional[str] = None
+    user_id: Optional[str] = None
+
+    def usuario(self) -> str:
+        """Identificador do usuário dono da sessão (cada usuário só enxerga as próprias sessões)."""
+        return (self.user_id or "").strip()[:128] or USUARIO_PADRAO
 
 # Define uma rota para o método POST no endpoint "/chat".
 @app.post("/chat")
 async def handle_chat(chat_request: ChatRequest):
-    """Este endpoint recebe a mensagem do usuário e a envia para o agente."""
+    """Este endpoint recebe a mensagem do usuário, a envia para o agente e devolve a resposta completa."""
     try:
-        # Chama o método 'chat' do nosso 'program' (Runner), passando a mensagem do usuário.
-        # O Runner gerencia a conversa com o agente e retorna a resposta.
-        response = await program.chat(chat_request.message)
+        # Garante que a sessão da conversa exista no serviço de sessões do Runner.
+        session_id = await garantir_sessao(program, chat_request.usuario(), chat_request.session_id)
+        # Executa o turno inteiro do agente (incluindo as chamadas de ferramentas) e junta o texto final.
+        response = await responder(program, chat_request.usuario(), session_id, chat_request.message)
         # Retorna uma resposta de sucesso com a resposta do agente.
-        return {"success": True, "response": response}
+        return {"success": True, "response": response, "session_id": session_id}
     # Captura qualquer exceção que ocorra durante a interação com o agente.
     except Exception as e:
         return {"success": False, "error": str(e)}
 
+# Define uma rota para o método POST no endpoint "/chat/stream".
+@app.post("/chat/stream")
+async def handle_chat_stream(chat_request: ChatRequest):
+    """
+    Este endpoint envia a resposta do agente por Server-Sent Events, à medida que ela é gerada:
+    pedaços de texto, chamadas de ferramentas e o texto final de cada resposta.
+    """
+    session_id = await garantir_sessao(program, chat_request.usuario(), chat_request.session_id)
+    return StreamingResponse(
+        eventos_sse(program, chat_request.usuario(), session_id, chat_request.message),
+        media_type="text/event-stream",
+        # Evita que proxies guardem ou acumulem a resposta antes de repassá-la.
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 # Este bloco de código só será executado se o script for chamado diretamente (ex: python main.py).
 if __name__ == "__main__":
     # Inicia o servidor Uvicorn para rodar a aplicação 'app'.
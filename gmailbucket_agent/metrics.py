@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+
+# --- Importações Padrão ---
+# Importa 'logging' para avisar sobre uma configuração de traços que não pode ser aplicada.
+import logging
+# Importa o módulo 'os' para ler a configuração dos traços.
+import os
+# Importa 'time' para medir a duração de cada etapa.
+import time
+# Importa 'threading' para proteger os valores das métricas, atualizados por várias threads.
+import threading
+# Importa 'contextmanager' para medir uma etapa com a sintaxe 'with'.
+from contextlib import contextmanager
+# Importa os tipos usados nas anotações.
+from typing import Callable, Iterator, Optional
+
+# Limites (em segundos) dos histogramas de duração: de chamadas locais (ms) a envios grandes (minutos).
+LIMITES_PADRAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Para onde os traços (spans) são exportados: "" (nenhum exportador próprio; os spans ainda seguem para
+# um provedor já configurado pela aplicação), "console" ou "gcp" (Cloud Trace).
+TRACOS_EXPORTADOR = os.getenv("TRACOS_EXPORTADOR", "").strip().lower()
+
+logger = logging.getLogger(__name__)
+
+
+def _escapar(valor: str) -> str:
+    """Escapa o valor de um rótulo no formato de texto do Prometheus."""
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _rotulos_texto(rotulos: dict) -> str:
+    """Formata os rótulos como '{a="1",b="2"}' (ou '' se não houver rótulos)."""
+    if not rotulos:
+        return ""
+    return "{" + ",".join(f'{nome}="{_escapar(valor)}"' for nome, valor in rotulos.items()) + "}"
+
+
+def _numero(valor: float) -> str:
+    """Formata um número no formato do Prometheus (inteiros sem casas decimais)."""
+    if valor == float("inf"):
+        return "+Inf"
+    return str(int(valor)) if float(valor).is_integer() else repr(float(valor))
+
+
+class _Metrica:
+    """Base das métricas: nome, texto de ajuda, nomes dos rótulos e os valores por combinação de rótulos."""
+    tipo = ""
+
+    def __init__(self, nome: str, ajuda: str, rotulos: tuple = ()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._lock = threading.Lock()
+        self._valores: dict = {}
+
+    def _chave(self, rotulos: dict) -> tuple:
+        return tuple(str(rotulos.get(nome, "")) for nome in self.rotulos)
+
+    def _amostras(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def exportar(self) -> str:
+        """Linhas '# HELP', '# TYPE' e as amostras da métrica."""
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} {self.tipo}"]
+        linhas.extend(self._amostras())
+        return "\n".join(linhas)
+
+
+class Contador(_Metrica):
+    """Valor que só cresce (ex: bytes enviados)."""
+    tipo = "counter"
+
+    def incrementar(self, valor: float = 1, **rotulos) -> None:
+        chave = self._chave(rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def _amostras(self) -> Iterator[str]:
+        with self._lock:
+            valores = list(self._valores.items())
+        for chave, valor in valores:
+            yield f"{self.nome}{_rotulos_texto(dict(zip(self.rotulos, chave)))} {_numero(valor)}"
+
+
+class Medidor(Contador):
+    """Valor que sobe e desce (ex: operações em andamento)."""
+    tipo = "gauge"
+
+    def decrementar(self, valor: float = 1, **rotulos) -> None:
+        self.incrementar(-valor, **rotulos)
+
+
+class Histograma(_Metrica):
+    """Distribuição de valores (ex: durações) em faixas cumulativas, com soma e contagem."""
+    tipo = "histogram"
+
+    def __init__(self, nome: str, ajuda: str, rotulos: tuple = (), limites: tuple = LIMITES_PADRAO):
+        super().__init__(nome, ajuda, rotulos)
+        self.limites = tuple(sorted(limites))
+
+    def observar(self, valor: float, **rotulos) -> None:
+        chave = self._chave(rotulos)
+        with self._lock:
+            estado = self._valores.get(chave)
+            if estado is None:
+                # Contagem por faixa (não cumulativa; a última é a faixa '+Inf'), soma e total.
+                estado = self._valores[chave] = [[0] * (len(self.limites) + 1), 0.0, 0]
+            faixa = next((i for i, limite in enumerate(self.limites) if valor <= limite), len(self.limites))
+            estado[0][faixa] += 1
+            estado[1] += valor
+            estado[2] += 1
+
+    def _amostras(self) -> Iterator[str]:
+        with self._lock:
+            valores = [(chave, (list(estado[0]), estado[1], estado[2])) for chave, estado in self._valores.items()]
+        for chave, (faixas, soma, total) in valores:
+            rotulos = dict(zip(self.rotulos, chave))
+            acumulado = 0
+            for limite, quantidade in zip(self.limites + (float("inf"),), faixas):
+                acumulado += quantidade
+                yield f"{self.nome}_bucket{_rotulos_texto(dict(rotulos, le=_numero(limite)))} {acumulado}"
+            yield f"{self.nome}_sum{_rotulos_texto(rotulos)} {_numero(soma)}"
+            yield f"{self.nome}_count{_rotulos_texto(rotulos)} {total}"
+
+
+class RegistroDeMetricas:
+    """
+    Guarda as métricas do processo e as exporta no formato de texto do Prometheus.
+
+    Além das métricas próprias, aceita "coletores": funções chamadas a cada exportação que
+    devolvem valores já mantidos por outros componentes (pools de E/S, cache, fila de envios),
+    exportados como medidores.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metricas: dict = {}
+        self._coletores: dict = {}
+
+    def _obter(self, classe, nome: str, *args, **kwargs):
+        """Devolve a métrica com este nome, criando-a na primeira vez."""
+        with self._lock:
+            metrica = self._metricas.get(nome)
+            if metrica is None:
+                metrica = self._metricas[nome] = classe(nome, *args, **kwargs)
+            return metrica
+
+    def contador(self, nome: str, ajuda: str, rotulos: tuple = ()) -> Contador:
+        return self._obter(Contador, nome, ajuda, rotulos)
+
+    def medidor(self, nome: str, ajuda: str, rotulos: tuple = ()) -> Medidor:
+        return self._obter(Medidor, nome, ajuda, rotulos)
+
+    def histograma(self, nome: str, ajuda: str, rotulos: tuple = (), limites: tuple = LIMITES_PADRAO) -> Histograma:
+        return self._obter(Histograma, nome, ajuda, rotulos, limites)
+
+    def registrar_coletor(self, prefixo: str, coletor: Callable[[], dict]) -> None:
+        """
+        Registra (ou substitui) um coletor. 'coletor()' devolve {nome: valor} ou
+        {nome: [(rotulos, valor), ...]}; cada nome é exportado como '<prefixo>_<nome>'.
+        """
+        with self._lock:
+            self._coletores[prefixo] = coletor
+
+    def exportar(self) -> str:
+        """Todas as métricas e coletores, no formato de texto do Prometheus."""
+        with self._lock:
+            metricas = list(self._metricas.values())
+            coletores = list(self._coletores.items())
+        blocos = [metrica.exportar() for metrica in metricas]
+        for prefixo, coletor in coletores:
+            try:
+                dados = coletor()
+            except Exception as e:
+                # Um coletor com problema não deve derrubar o endpoint inteiro.
+                blocos.append(f"# Coletor '{prefixo}' falhou: {_escapar(e)}")
+                continue
+            for nome, valor in dados.items():
+                nome_completo = f"{prefixo}_{nome}"
+                amostras = valor if isinstance(valor, list) else [({}, valor)]
+                linhas = [f"# TYPE {nome_completo} gauge"]
+                linhas.extend(f"{nome_completo}{_rotulos_texto(rotulos)} {_numero(v)}" for rotulos, v in amostras)
+                blocos.append("\n".join(linhas))
+        return "\n".join(blocos) + "\n"
+
+
+def por_rotulo(dados: dict, rotulo: str) -> dict:
+    """Converte {'gcs': {'em_fila': 1}, ...} em {'em_fila': [({rotulo: 'gcs'}, 1)], ...} (para coletores)."""
+    convertidos: dict = {}
+    for valor_rotulo, valores in dados.items():
+        for nome, valor in valores.items():
+            if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+                convertidos.setdefault(nome, []).append(({rotulo: valor_rotulo}, valor))
+    return convertidos
+
+
+# Registro único do processo e as métricas do caminho crítico.
+registro = RegistroDeMetricas()
+DURACAO_ETAPAS = registro.histograma(
+    "gmailbucket_etapa_duracao_segundos", "Duração de cada etapa (token, build, GCS, MIME, Gmail, LLM...).", ("etapa",)
+)
+ERROS_ETAPAS = registro.contador("gmailbucket_etapa_erros_total", "Etapas que terminaram com exceção.", ("etapa",))
+BYTES = registro.contador(
+    "gmailbucket_bytes_total", "Bytes de uploads e de anexos (baixados do GCS ou lidos do cache).", ("tipo",)
+)
+EM_ANDAMENTO = registro.medidor("gmailbucket_em_andamento", "Operações em andamento (chat, upload, envio).", ("operacao",))
+
+
+# --- Traços (OpenTelemetry, opcional) ---
+
+_tracer = None
+_tracer_carregado = False
+_lock_tracos = threading.Lock()
+
+
+def _obter_tracer():
+    """Devolve o tracer do OpenTelemetry (ou None, se a biblioteca não estiver instalada)."""
+    global _tracer, _tracer_carregado
+    if not _tracer_carregado:
+        try:
+            from opentelemetry import trace
+            _tracer = trace.get_tracer("gmailbucket_agent")
+        except ImportError:
+            _tracer = None
+        _tracer_carregado = True
+    return _tracer
+
+
+def configurar_tracos() -> None:
+    """
+    Instala um provedor de traços com o exportador de TRACOS_EXPORTADOR ("console" ou "gcp").
+    Os spans das etapas ficam aninhados no span do turno do chat (e nos spans das ferramentas do ADK),
+    o que liga cada turno às ferramentas e às chamadas externas que ele disparou.
+    """
+    if not TRACOS_EXPORTADOR:
+        return
+    with _lock_tracos:
+        try:
+            from opentelemetry import trace
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+            if TRACOS_EXPORTADOR == "gcp":
+                from opentelemetry.exporter.cloud_trace import CloudTraceSpanExporter
+                exportador = CloudTraceSpanExporter()
+            elif TRACOS_EXPORTADOR == "console":
+                from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+                exportador = ConsoleSpanExporter()
+            else:
+                logger.warning("TRACOS_EXPORTADOR desconhecido: '%s'. Os traços não serão exportados.", TRACOS_EXPORTADOR)
+                return
+        except ImportError as e:
+            logger.warning("Traços desativados: o OpenTelemetry não está instalado (%s).", e)
+            return
+        provedor = TracerProvider()
+        provedor.add_span_processor(BatchSpanProcessor(exportador))
+        trace.set_tracer_provider(provedor)
+
+
+@contextmanager
+def medir(etapa: str, **atributos):
+    """
+    Mede a duração de uma etapa no histograma 'gmailbucket_etapa_duracao_segundos' e, se o
+    OpenTelemetry estiver disponível, abre um span com o mesmo nome (filho do span atual).
+
+    Exemplo:
+        with medir("gmail.envio"):
+            service.users().messages().send(...).execute()
+    """
+    tracer = _obter_tracer()
+    inicio = time.perf_counter()
+    try:
+        if tracer is None:
+            yield
+        else:
+            with tracer.start_as_current_span(etapa, attributes=atributos or None):
+                yield
+    except BaseException:
+        ERROS_ETAPAS.incrementar(etapa=etapa)
+        raise
+    finally:
+        DURACAO_ETAPAS.observar(time.perf_counter() - inicio, etapa=etapa)
+
+
+def observar_etapa(etapa: str, duracao: float) -> None:
+    """Registra uma duração já medida (para etapas que não cabem em um bloco 'with')."""
+    DURACAO_ETAPAS.observar(duracao, etapa=etapa)
+
+
+@contextmanager
+def em_andamento(operacao: str):
+    """Conta a operação no medidor 'gmailbucket_em_andamento' enquanto o bloco 'with' roda."""
+    EM_ANDAMENTO.incrementar(operacao=operacao)
+    try:
+        yield
+    finally:
+        EM_ANDAMENTO.decrementar(operacao=operacao)
+
+
+def contar_bytes(tipo: str, quantidade: Optional[int]) -> None:
+    """Soma bytes ao contador 'gmailbucket_bytes_total' (ex: tipo="upload", "anexo_gcs", "anexo_cache")."""
+    if quantidade:
+        BYTES.incrementar(quantidade, tipo=tipo)
+
+
+def exportar() -> str:
+    """Atalho para 'registro.exportar()'."""
+    return registro.exportar()
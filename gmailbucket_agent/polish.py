@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+# --- Importações Padrão ---
+# Importa 'json' para ler o assunto e o corpo revisados devolvidos pelo modelo.
+import json
+
+# --- Importações do ADK ---
+# 'types' define o formato das mensagens (Content/Part) e da configuração enviadas ao modelo.
+from google.genai import types
+# 'LlmRequest' é a requisição aceita pelos modelos do ADK (o mesmo modelo usado pelo agente).
+from google.adk.models.llm_request import LlmRequest
+
+# Importa a instrução da revisão (mesmo critério do passo "revisar e melhorar" do agente).
+from .prompt import POLIMENTO_INSTRUCTION
+# Importa a medição da duração da chamada ao modelo.
+from .metrics import medir
+
+
+class ErroDePolimento(Exception):
+    """O modelo não devolveu um assunto e um corpo revisados; a mensagem é devolvida ao cliente como está."""
+
+
+def _esquema_resposta() -> types.Schema:
+    """Esquema JSON da resposta: o assunto e o corpo revisados."""
+    return types.Schema(
+        type=types.Type.OBJECT,
+        properties={"assunto": types.Schema(type=types.Type.STRING), "corpo": types.Schema(type=types.Type.STRING)},
+        required=["assunto", "corpo"],
+    )
+
+
+async def polir_email(modelo, assunto: str, corpo_mensagem: str) -> tuple[str, str]:
+    """
+    Faz uma única chamada ao modelo para revisar o assunto e o corpo de um email, sem conversa nem ferramentas.
+
+    Args:
+        modelo: O modelo do ADK ('BaseLlm'), normalmente 'root_agent.canonical_model'.
+        assunto (str): O assunto original.
+        corpo_mensagem (str): O corpo original.
+
+    Returns:
+        tuple[str, str]: O assunto e o corpo revisados. Lança 'ErroDePolimento' se a resposta não puder ser lida.
+    """
+    requisicao = LlmRequest(
+        model=modelo.model,
+        contents=[types.Content(role="user", parts=[types.Part(
+            text=json.dumps({"assunto": assunto, "corpo": corpo_mensagem}, ensure_ascii=False)
+        )])],
+        config=types.GenerateContentConfig(
+            system_instruction=POLIMENTO_INSTRUCTION,
+            response_mime_type="application/json",
+            response_schema=_esquema_resposta(),
+            temperature=0.2,
+        ),
+    )
+    texto = ""
+    with medir("llm.polimento"):
+        async for resposta in modelo.generate_content_async(requisicao, stream=False):
+            if resposta.content and resposta.content.parts:
+                texto += "".join(parte.text for parte in resposta.content.parts if parte.text)
+    try:
+        revisado = json.loads(texto)
+        novo_assunto, novo_corpo = revisado["assunto"].strip(), revisado["corpo"].strip()
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise ErroDePolimento("O modelo não devolveu o email revisado em um formato válido.")
+    if not novo_assunto or not novo_corpo:
+        raise ErroDePolimento("O modelo devolveu um assunto ou um corpo vazio.")
+    return novo_assunto, novo_corpo
@@ -0,0 +1,432 @@
+# -*- coding: utf-8 -*-
+
+# --- Importações Padrão ---
+# Importa o módulo 'os' para ler as configurações e criar a pasta do banco de dados.
+import os
+# Importa 'json' para guardar o estado das sessões como texto.
+import json
+# Importa 'time' para os horários de atualização e a expiração (TTL) do cache.
+import time
+# Importa 'uuid' para gerar ids de sessão quando o cliente não informa um.
+import uuid
+# Importa 'atexit' para gravar os eventos pendentes quando o processo termina.
+import atexit
+# Importa 'asyncio' para rodar as operações no banco fora do laço de eventos ('asyncio.to_thread').
+import asyncio
+# Importa 'logging' para registrar as falhas da thread de gravação.
+import logging
+# Importa 'sqlite3', o banco de dados embutido usado para persistir as sessões.
+import sqlite3
+# Importa 'threading' para a thread de gravação em lote e para proteger o estado compartilhado.
+import threading
+# Importa 'OrderedDict' para implementar o LRU (menos usado recentemente) das sessões em memória.
+from collections import OrderedDict
+# Importa os tipos usados nas anotações.
+from typing import Any, Optional
+
+# --- Importações do ADK ---
+from google.adk.events.event import Event
+from google.adk.sessions import Session
+from google.adk.sessions.base_session_service import BaseSessionService, GetSessionConfig, ListSessionsResponse
+from google.adk.sessions.state import State
+
+# Importa o registro de métricas (eventos que não puderam ser gravados).
+from .metrics import registro
+
+# Caminho do banco SQLite compartilhado por todos os workers (padrão: pasta '.dados' ao lado deste arquivo).
+SESSOES_DB_PATH = os.getenv(
+    "SESSOES_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".dados", "sessoes.db")
+)
+# Quantas sessões cada processo mantém em memória e por quanto tempo (em segundos) sem uso.
+SESSOES_CACHE_MAX = int(os.getenv("SESSOES_CACHE_MAX", "500"))
+SESSOES_CACHE_TTL = float(os.getenv("SESSOES_CACHE_TTL", "1800"))
+# Intervalo máximo (em milissegundos) e tamanho máximo de cada lote de eventos gravados no banco.
+SESSOES_FLUSH_MS = int(os.getenv("SESSOES_FLUSH_MS", "50"))
+SESSOES_LOTE_MAX = int(os.getenv("SESSOES_LOTE_MAX", "200"))
+# Quantas vezes a gravação de um lote é tentada (ex: com o banco travado por outro worker) antes de descartá-lo.
+SESSOES_GRAVACAO_TENTATIVAS = int(os.getenv("SESSOES_GRAVACAO_TENTATIVAS", "5"))
+
+logger = logging.getLogger(__name__)
+
+EVENTOS_PERDIDOS = registro.contador(
+    "gmailbucket_sessoes_eventos_perdidos_total", "Eventos de sessão descartados após falharem todas as tentativas de gravação."
+)
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS sessoes (
+    app_name TEXT NOT NULL, user_id TEXT NOT NULL, id TEXT NOT NULL,
+    estado TEXT NOT NULL, atualizado_em REAL NOT NULL,
+    PRIMARY KEY (app_name, user_id, id)
+);
+CREATE TABLE IF NOT EXISTS eventos (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    app_name TEXT NOT NULL, user_id TEXT NOT NULL, session_id TEXT NOT NULL,
+    evento TEXT NOT NULL, timestamp REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS eventos_por_sessao ON eventos (app_name, user_id, session_id, seq);
+CREATE TABLE IF NOT EXISTS estado_app (
+    app_name TEXT NOT NULL, chave TEXT NOT NULL, valor TEXT NOT NULL,
+    PRIMARY KEY (app_name, chave)
+);
+CREATE TABLE IF NOT EXISTS estado_usuario (
+    app_name TEXT NOT NULL, user_id TEXT NOT NULL, chave TEXT NOT NULL, valor TEXT NOT NULL,
+    PRIMARY KEY (app_name, user_id, chave)
+);
+"""
+
+
+def _separar_estado(estado: dict) -> tuple:
+    """Separa um estado em (app, usuário, sessão), conforme os prefixos do ADK; 'temp:' é descartado."""
+    app, usuario, sessao = {}, {}, {}
+    for chave, valor in estado.items():
+        if chave.startswith(State.APP_PREFIX):
+            app[chave[len(State.APP_PREFIX):]] = valor
+        elif chave.startswith(State.USER_PREFIX):
+            usuario[chave[len(State.USER_PREFIX):]] = valor
+        elif not chave.startswith(State.TEMP_PREFIX):
+            sessao[chave] = valor
+    return app, usuario, sessao
+
+
+class SqliteSessionService(BaseSessionService):
+    """
+    Serviço de sessões do ADK persistido em SQLite (modo WAL), compartilhável entre workers.
+
+    - Os eventos são gravados em lote por uma thread própria (a cada SESSOES_FLUSH_MS ou
+      SESSOES_LOTE_MAX eventos), em uma única transação, sem atrasar o turno do agente.
+    - Cada processo mantém as sessões mais usadas em um LRU limitado (SESSOES_CACHE_MAX),
+      com expiração por tempo sem uso (SESSOES_CACHE_TTL). Antes de usar uma sessão do cache,
+      o horário de atualização no banco é conferido, para enxergar o que outro worker gravou.
+    """
+
+    def __init__(self, caminho: str = SESSOES_DB_PATH, cache_max: int = SESSOES_CACHE_MAX,
+                 cache_ttl: float = SESSOES_CACHE_TTL, flush_ms: int = SESSOES_FLUSH_MS,
+                 lote_max: int = SESSOES_LOTE_MAX):
+        self.caminho = caminho
+        self.cache_max = cache_max
+        self.cache_ttl = cache_ttl
+        self.flush_ms = flush_ms
+        self.lote_max = lote_max
+        if os.path.dirname(caminho):
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+
+        # Conexão de leitura e escrita direta (criação/remoção de sessões), protegida por um lock.
+        self._lock_db = threading.Lock()
+        self._db = self._conectar()
+        with self._lock_db:
+            self._db.executescript(_ESQUEMA)
+
+        # Cache em memória: (app, usuário, sessão) -> [Session, último_acesso].
+        self._lock_cache = threading.Lock()
+        self._cache: "OrderedDict[tuple, list]" = OrderedDict()
+
+        # Eventos aguardando gravação, quantos estão sendo gravados agora e a thread que os grava em lote.
+        self._pendentes: list = []
+        self._em_gravacao = 0
+        self._cond = threading.Condition()
+        self._parar = False
+        self._gravador = threading.Thread(target=self._laco_gravacao, name="sqlite-sessions-writer", daemon=True)
+        self._gravador.start()
+        atexit.register(self.fechar)
+
+    # --- Banco de dados ---
+
+    def _conectar(self) -> sqlite3.Connection:
+        """Abre uma conexão em modo WAL (leitores não bloqueiam o escritor, inclusive entre processos)."""
+        conexao = sqlite3.connect(self.caminho, timeout=30, check_same_thread=False, isolation_level=None)
+        conexao.execute("PRAGMA journal_mode=WAL")
+        conexao.execute("PRAGMA synchronous=NORMAL")
+        return conexao
+
+    def _ler_estado_compartilhado(self, app_name: str, user_id: str) -> dict:
+        """Lê os estados 'app:' e 'user:' e os devolve já com os prefixos (com o lock do banco)."""
+        estado = {}
+        for chave, valor in self._db.execute("SELECT chave, valor FROM estado_app WHERE app_name = ?", (app_name,)):
+            estado[State.APP_PREFIX + chave] = json.loads(valor)
+        for chave, valor in self._db.execute(
+            "SELECT chave, valor FROM estado_usuario WHERE app_name = ? AND user_id = ?", (app_name, user_id)
+        ):
+            estado[State.USER_PREFIX + chave] = json.loads(valor)
+        return estado
+
+    def _gravar_estado(self, conexao, app_name: str, user_id: str, session_id: str,
+                       estado: dict, atualizado_em: float) -> None:
+        """Grava um estado (ou uma alteração de estado) nas três tabelas, conforme os prefixos."""
+        app, usuario, sessao = _separar_estado(estado)
+        conexao.executemany(
+            "INSERT OR REPLACE INTO estado_app (app_name, chave, valor) VALUES (?, ?, ?)",
+            [(app_name, chave, json.dumps(valor)) for chave, valor in app.items()],
+        )
+        conexao.executemany(
+            "INSERT OR REPLACE INTO estado_usuario (app_name, user_id, chave, valor) VALUES (?, ?, ?, ?)",
+            [(app_name, user_id, chave, json.dumps(valor)) for chave, valor in usuario.items()],
+        )
+        linha = conexao.execute(
+            "SELECT estado FROM sessoes WHERE app_name = ? AND user_id = ? AND id = ?", (app_name, user_id, session_id)
+        ).fetchone()
+        if linha is None:
+            return
+        estado_sessao = json.loads(linha[0])
+        estado_sessao.update(sessao)
+        conexao.execute(
+            "UPDATE sessoes SET estado = ?, atualizado_em = MAX(atualizado_em, ?) WHERE app_name = ? AND user_id = ? AND id = ?",
+            (json.dumps(estado_sessao), atualizado_em, app_name, user_id, session_id),
+        )
+
+    def _carregar(self, app_name: str, user_id: str, session_id: str) -> Optional[Session]:
+        """Lê uma sessão completa (estado + eventos) do banco."""
+        with self._lock_db:
+            linha = self._db.execute(
+                "SELECT estado, atualizado_em FROM sessoes WHERE app_name = ? AND user_id = ? AND id = ?",
+                (app_name, user_id, session_id),
+            ).fetchone()
+            if linha is None:
+                return None
+            estado = json.loads(linha[0])
+            estado.update(self._ler_estado_compartilhado(app_name, user_id))
+            eventos = [
+                Event.model_validate_json(evento)
+                for (evento,) in self._db.execute(
+                    "SELECT evento FROM eventos WHERE app_name = ? AND user_id = ? AND session_id = ? ORDER BY seq",
+                    (app_name, user_id, session_id),
+                )
+            ]
+        return Session(
+            id=session_id, app_name=app_name, user_id=user_id,
+            state=estado, events=eventos, last_update_time=linha[1],
+        )
+
+    # --- Gravação em lote ---
+
+    def _laco_gravacao(self) -> None:
+        """Thread que grava os eventos pendentes em lotes, em uma única transação por lote."""
+        conexao = self._conectar()
+        while True:
+            with self._cond:
+                if not self._pendentes and not self._parar:
+                    self._cond.wait()
+                if not self._parar and len(self._pendentes) < self.lote_max:
+                    # Espera um pouco para juntar mais eventos no mesmo lote.
+                    self._cond.wait(self.flush_ms / 1000)
+                lote, self._pendentes = self._pendentes, []
+                self._em_gravacao = len(lote)
+                parar = self._parar
+            if lote:
+                self._gravar_lote(conexao, lote)
+            with self._cond:
+                # Avisa quem está esperando em 'descarregar()'.
+                self._em_gravacao = 0
+                self._cond.notify_all()
+            if parar and not self._pendentes:
+                conexao.close()
+                return
+
+    def _gravar_lote(self, conexao, lote: list) -> None:
+        """
+        Grava um lote de eventos (e as suas alterações de estado) em uma transação. Uma falha (ex: o banco
+        travado por outro worker além do 'timeout') é registrada e o lote é tentado de novo, com espera
+        crescente; só depois de SESSOES_GRAVACAO_TENTATIVAS ele é descartado (e contado nas métricas).
+        """
+        for tentativa in range(1, SESSOES_GRAVACAO_TENTATIVAS + 1):
+            try:
+                conexao.execute("BEGIN IMMEDIATE")
+                conexao.executemany(
+                    "INSERT INTO eventos (app_name, user_id, session_id, evento, timestamp) VALUES (?, ?, ?, ?, ?)",
+                    [(app, usuario, sessao, evento.model_dump_json(exclude_none=True), evento.timestamp)
+                     for app, usuario, sessao, evento in lote],
+                )
+                for app, usuario, sessao, evento in lote:
+                    delta = evento.actions.state_delta if evento.actions and evento.actions.state_delta else {}
+                    self._gravar_estado(conexao, app, usuario, sessao, delta, evento.timestamp)
+                conexao.execute("COMMIT")
+                return
+            except Exception:
+                if conexao.in_transaction:
+                    conexao.execute("ROLLBACK")
+                if tentativa == SESSOES_GRAVACAO_TENTATIVAS:
+                    logger.exception("Descartando %d evento(s) de sessão após %d tentativas de gravação no SQLite.",
+                                     len(lote), tentativa)
+                    EVENTOS_PERDIDOS.incrementar(len(lote))
+                    return
+                logger.warning("Falha ao gravar %d evento(s) de sessão no SQLite (tentativa %d de %d).",
+                               len(lote), tentativa, SESSOES_GRAVACAO_TENTATIVAS, exc_info=True)
+                time.sleep(min(5.0, 0.1 * 2 ** tentativa))
+
+    def descarregar(self) -> None:
+        """Espera até que todos os eventos pendentes tenham sido gravados (bloqueante: fora do laço de eventos)."""
+        with self._cond:
+            self._cond.notify_all()
+            while self._pendentes or self._em_gravacao:
+                self._cond.wait(1.0)
+
+    def fechar(self) -> None:
+        """Grava os eventos pendentes e encerra a thread de gravação."""
+        with self._cond:
+            if self._parar:
+                return
+            self._parar = True
+            self._cond.notify_all()
+        self._gravador.join(timeout=10)
+
+    # --- Cache em memória ---
+
+    def _do_cache(self, chave: tuple) -> Optional[Session]:
+        """Devolve a sessão do cache, se existir e não tiver expirado (com o lock do cache)."""
+        entrada = self._cache.get(chave)
+        if entrada is None:
+            return None
+        if time.time() - entrada[1] > self.cache_ttl:
+            del self._cache[chave]
+            return None
+        entrada[1] = time.time()
+        self._cache.move_to_end(chave)
+        return entrada[0]
+
+    def _guardar_no_cache(self, chave: tuple, sessao: Session) -> None:
+        """Guarda a sessão no cache, expulsando as expiradas e as menos usadas (com o lock do cache)."""
+        agora = time.time()
+        self._cache[chave] = [sessao, agora]
+        self._cache.move_to_end(chave)
+        while self._cache:
+            chave_antiga, (_, ultimo_acesso) = next(iter(self._cache.items()))
+            if len(self._cache) <= self.cache_max and agora - ultimo_acesso <= self.cache_ttl:
+                break
+            del self._cache[chave_antiga]
+
+    # --- Operações no banco (bloqueantes; a interface assíncrona as roda em 'asyncio.to_thread') ---
+
+    def _criar_sessao(self, app_name: str, user_id: str, state: Optional[dict[str, Any]],
+                      session_id: Optional[str]) -> Session:
+        session_id = session_id.strip() if session_id and session_id.strip() else uuid.uuid4().hex
+        agora = time.time()
+        estado = state or {}
+        with self._lock_db:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "INSERT INTO sessoes (app_name, user_id, id, estado, atualizado_em) VALUES (?, ?, ?, '{}', ?)",
+                    (app_name, user_id, session_id, agora),
+                )
+                self._gravar_estado(self._db, app_name, user_id, session_id, estado, agora)
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            estado_completo = dict(_separar_estado(estado)[2])
+            estado_completo.update(self._ler_estado_compartilhado(app_name, user_id))
+        sessao = Session(id=session_id, app_name=app_name, user_id=user_id, state=estado_completo, last_update_time=agora)
+        with self._lock_cache:
+            self._guardar_no_cache((app_name, user_id, session_id), sessao)
+        return sessao.model_copy(deep=True)
+
+    def _obter_sessao(self, app_name: str, user_id: str, session_id: str,
+                      config: Optional[GetSessionConfig]) -> Optional[Session]:
+        chave = (app_name, user_id, session_id)
+        with self._lock_cache:
+            sessao = self._do_cache(chave)
+        if sessao is not None:
+            # Confere se outro worker atualizou a sessão depois que ela entrou no cache.
+            with self._lock_db:
+                linha = self._db.execute(
+                    "SELECT atualizado_em FROM sessoes WHERE app_name = ? AND user_id = ? AND id = ?", chave
+                ).fetchone()
+            if linha is None:
+                with self._lock_cache:
+                    self._cache.pop(chave, None)
+                return None
+            if linha[0] > sessao.last_update_time:
+                sessao = None
+        if sessao is None:
+            sessao = self._carregar(app_name, user_id, session_id)
+            if sessao is None:
+                return None
+            with self._lock_cache:
+                self._guardar_no_cache(chave, sessao)
+
+        copia = sessao.model_copy(deep=True)
+        if config:
+            if config.num_recent_events:
+                copia.events = copia.events[-config.num_recent_events:]
+            if config.after_timestamp:
+                copia.events = [evento for evento in copia.events if evento.timestamp >= config.after_timestamp]
+        return copia
+
+    def _listar_sessoes(self, app_name: str, user_id: str) -> ListSessionsResponse:
+        with self._lock_db:
+            linhas = self._db.execute(
+                "SELECT id, atualizado_em FROM sessoes WHERE app_name = ? AND user_id = ? ORDER BY atualizado_em DESC",
+                (app_name, user_id),
+            ).fetchall()
+        return ListSessionsResponse(sessions=[
+            Session(id=session_id, app_name=app_name, user_id=user_id, last_update_time=atualizado_em)
+            for session_id, atualizado_em in linhas
+        ])
+
+    def _apagar_sessao(self, app_name: str, user_id: str, session_id: str) -> None:
+        # Grava antes os eventos pendentes, para que nenhum deles "ressuscite" a sessão apagada.
+        self.descarregar()
+        with self._lock_cache:
+            self._cache.pop((app_name, user_id, session_id), None)
+        with self._lock_db:
+            self._db.execute("BEGIN IMMEDIATE")
+            self._db.execute(
+                "DELETE FROM eventos WHERE app_name = ? AND user_id = ? AND session_id = ?", (app_name, user_id, session_id)
+            )
+            self._db.execute(
+                "DELETE FROM sessoes WHERE app_name = ? AND user_id = ? AND id = ?", (app_name, user_id, session_id)
+            )
+            self._db.execute("COMMIT")
+
+    # --- Interface do BaseSessionService ---
+    # O SQLite bloqueia (inclusive esperando a trava de outro worker) e 'delete_session' espera a thread de
+    # gravação: nada disso roda no laço de eventos, que continua atendendo as outras requisições.
+
+    async def create_session(self, *, app_name: str, user_id: str, state: Optional[dict[str, Any]] = None,
+                             session_id: Optional[str] = None) -> Session:
+        return await asyncio.to_thread(self._criar_sessao, app_name, user_id, state, session_id)
+
+    async def get_session(self, *, app_name: str, user_id: str, session_id: str,
+                          config: Optional[GetSessionConfig] = None) -> Optional[Session]:
+        return await asyncio.to_thread(self._obter_sessao, app_name, user_id, session_id, config)
+
+    async def list_sessions(self, *, app_name: str, user_id: str) -> ListSessionsResponse:
+        return await asyncio.to_thread(self._listar_sessoes, app_name, user_id)
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        await asyncio.to_thread(self._apagar_sessao, app_name, user_id, session_id)
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        if event.partial:
+            return event
+        # Atualiza o objeto recebido (estado + lista de eventos), como o serviço base faz.
+        await super().append_event(session, event)
+        session.last_update_time = event.timestamp
+
+        # Atualiza a cópia do cache sem esperar o banco.
+        chave = (session.app_name, session.user_id, session.id)
+        with self._lock_cache:
+            em_cache = self._do_cache(chave)
+        if em_cache is not None and em_cache is not session:
+            await super().append_event(em_cache, event)
+            em_cache.last_update_time = event.timestamp
+
+        # Entrega o evento à thread de gravação em lote.
+        with self._cond:
+            self._pendentes.append((session.app_name, session.user_id, session.id, event))
+            if len(self._pendentes) == 1 or len(self._pendentes) >= self.lote_max:
+                self._cond.notify_all()
+        return event
+
+
+def criar_servico_de_sessoes(backend: Optional[str] = None) -> BaseSessionService:
+    """
+    Cria o serviço de sessões escolhido em SESSOES_BACKEND: 'sqlite' (padrão, persistente e
+    compartilhado entre workers) ou 'memoria' (o InMemorySessionService do ADK, sem limite).
+    """
+    backend = (backend or os.getenv("SESSOES_BACKEND", "sqlite")).strip().lower()
+    if backend == "memoria":
+        from google.adk.sessions import InMemorySessionService
+        return InMemorySessionService()
+    if backend == "sqlite":
+        return SqliteSessionService()
+    raise ValueError(f"SESSOES_BACKEND inválido: '{backend}'. Use 'sqlite' ou 'memoria'.")
@@ -1,3 +1,12 @@
+// O envio dos arquivos e o 'fetchComEspera' vêm de 'upload.js', carregado antes deste script.
+
+// Identificador do usuário deste navegador, criado na primeira visita; as sessões no servidor são separadas por usuário.
+let userId = localStorage.getItem('chat-user-id');
+if (!userId) {
+    userId = (crypto.randomUUID ? crypto.randomUUID() : `${Date.now()}-${Math.random().toString(16).slice(2)}`);
+    localStorage.setItem('chat-user-id', userId);
+}
+
 // Seleciona os elementos principais da página para manipulação.
 const chatWindow = document.getElementById('chat-window');
 const chatInput = document.getElementById('chat-input');
@@ -19,29 +28,70 @@ function addMessage(text, sender) {
     chatWindow.scrollTop = chatWindow.scrollHeight;
 }
 
-// Adiciona um evento para o envio do formulário de upload.
+// Adiciona um evento para o envio do formulário de upload: os arquivos vão direto para o bucket, com o progresso de cada um.
 uploadForm.addEventListener('submit', async (event) => {
     event.preventDefault(); // Impede que a página seja recarregada.
-    const formData = new FormData(uploadForm);
-    uploadResult.innerText = "Enviando para o bucket...";
+    const files = Array.from(document.getElementById('file-input').files);
+    if (!files.length) return;
+    const progresso = new Map(files.map((file) => [file, 0]));
+    const mostrarProgresso = () => {
+        uploadResult.innerText = 'Enviando para o bucket...\n' + files
+            .map((file) => `${file.name}: ${Math.round(progresso.get(file) * 100)}%`).join('\n');
+    };
+    mostrarProgresso();
 
-    try {
-        const response = await fetch('/upload', { method: 'POST', body: formData });
-        const data = await response.json();
-        if (data.success) {
-            uploadResult.innerText = `Sucesso! Arquivo '${data.filename}' pronto para ser usado.`;
-            // Preenche automaticamente o campo de chat com uma sugestão de comando.
-            chatInput.value = `Quero enviar um email com o anexo ${data.filename}`;
-        } else {
-            uploadResult.innerText = `Erro no upload: ${data.error}`;
-        }
-    } catch (error) {
-        uploadResult.innerText = `Erro de conexão no upload.`;
+    const resultados = await uploadArquivos(files, (file, fracao) => {
+        progresso.set(file, fracao);
+        mostrarProgresso();
+    });
+    const enviados = resultados.filter((r) => r.data).map((r) => r.data.filename);
+    const erros = resultados.filter((r) => r.error).map((r) => `Erro no upload de '${r.file.name}': ${r.error.message || 'erro de conexão'}`);
+    const linhas = enviados.map((nome) => `Sucesso! Arquivo '${nome}' pronto para ser usado.`).concat(erros);
+    uploadResult.innerText = linhas.join('\n');
+    if (enviados.length) {
+        // Preenche automaticamente o campo de chat com uma sugestão de comando.
+        chatInput.value = enviados.length === 1
+            ? `Quero enviar um email com o anexo ${enviados[0]}`
+            : `Quero enviar um email com os anexos ${enviados.join(', ')}`;
     }
 });
 
+// Identificador da conversa devolvido pelo servidor; enviado de volta a cada mensagem para manter o histórico.
+let sessionId = sessionStorage.getItem('chat-session-id');
+
+/**
+ * Lê uma resposta no formato Server-Sent Events e chama 'onEvent(nome, dados)' para cada evento,
+ * à medida que os bytes chegam.
+ * @param {Response} response - A resposta do fetch para '/chat/stream'.
+ * @param {function(string, object)} onEvent - Função chamada para cada evento recebido.
+ */
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        // Cada evento termina com uma linha em branco.
+        let separator;
+        while ((separator = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, separator);
+            buffer = buffer.slice(separator + 2);
+            let name = 'message';
+            let data = '';
+            for (const line of rawEvent.split('\n')) {
+                if (line.startsWith('event:')) name = line.slice(6).trim();
+                else if (line.startsWith('data:')) data += line.slice(5).trim();
+            }
+            onEvent(name, data ? JSON.parse(data) : {});
+        }
+    }
+}
+
 /**
  * Função assíncrona para lidar com o envio de uma mensagem de chat.
+ * A resposta do agente chega aos poucos (pedaços de texto e progresso das ferramentas) por '/chat/stream'.
  */
 async function handleSend() {
     const messageText = chatInput.value.trim();
@@ -50,27 +100,71 @@ async function handleSend() {
     addMessage(messageText, 'user');
     chatInput.value = ''; // Limpa o campo de entrada.
     addMessage("...", 'agent'); // Adiciona uma mensagem de "pensando...".
+    // Balão de "pensando..." (removido no primeiro evento) e balão da resposta em andamento.
+    let thinking = chatWindow.lastChild;
+    let current = null;
+
+    function removeThinking() {
+        if (thinking) {
+            chatWindow.removeChild(thinking);
+            thinking = null;
+        }
+    }
+
+    function appendToCurrent(text, replace) {
+        removeThinking();
+        if (!current) {
+            addMessage('', 'agent');
+            current = chatWindow.lastChild;
+        }
+        current.innerText = replace ? text : current.innerText + text;
+        chatWindow.scrollTop = chatWindow.scrollHeight;
+    }
 
     try {
-        const response = await fetch('/chat', {
+        const response = await fetchComEspera('/chat/stream', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ message: messageText }),
+            body: JSON.stringify({ message: messageText, session_id: sessionId, user_id: userId }),
+        }, (espera) => {
+            // Mostra no balão de "pensando..." que o servidor está ocupado.
+            if (thinking) thinking.innerText = `Servidor ocupado, tentando de novo em ${Math.ceil(espera / 1000)}s...`;
         });
-        const data = await response.json();
-        
-        // Remove a mensagem de "pensando..." antes de adicionar a resposta final.
-        chatWindow.removeChild(chatWindow.lastChild);
-
-        if(data.success) {
-            addMessage(data.response, 'agent');
-        } else {
-            addMessage(`Erro do agente: ${data.error}`, 'agent');
+        if (!response.ok) {
+            // Continua recusada depois das novas tentativas (ou outro erro HTTP).
+            const data = await response.json().catch(() => ({}));
+            removeThinking();
+            addMessage(`Erro do agente: ${data.error || `HTTP ${response.status}`}`, 'agent');
+            return;
         }
 
+        await readEventStream(response, (name, data) => {
+            if (name === 'inicio' || name === 'fim') {
+                sessionId = data.session_id;
+                sessionStorage.setItem('chat-session-id', sessionId);
+            } else if (name === 'parcial') {
+                // Acrescenta o pedaço de texto à resposta em andamento.
+                appendToCurrent(data.texto, false);
+            } else if (name === 'mensagem') {
+                // O texto completo substitui os pedaços; a próxima resposta começa em um novo balão.
+                appendToCurrent(data.texto, true);
+                current = null;
+            } else if (name === 'ferramenta') {
+                removeThinking();
+                current = null;
+                addMessage(`⏳ Executando ${data.nome}...`, 'agent');
+            } else if (name === 'resultado_ferramenta') {
+                addMessage(`✔️ ${data.nome} concluído.`, 'agent');
+            } else if (name === 'erro') {
+                removeThinking();
+                addMessage(`Erro do agente: ${data.erro}`, 'agent');
+            }
+        });
+        removeThinking();
+
     } catch (error) {
         // Remove a mensagem de "pensando..." mesmo se houver um erro de conexão.
-        chatWindow.removeChild(chatWindow.lastChild);
+        removeThinking();
         addMessage(`Erro de conexão com o agente.`, 'agent');
     }
 }
@@ -0,0 +1,149 @@
+// Envio de arquivos compartilhado pelas páginas do chat (templates/chat.html) e de upload (upload.html):
+// upload direto para o GCS, com retomada dos blocos, e as novas tentativas quando o servidor está sobrecarregado.
+
+// Tentativas de um mesmo bloco antes de desistir do upload direto, e quantos arquivos sobem ao mesmo tempo.
+const MAX_TENTATIVAS_BLOCO = 5;
+const UPLOADS_SIMULTANEOS = 3;
+
+// Quantas vezes uma requisição recusada por sobrecarga (429/503) é tentada de novo, e a espera máxima entre tentativas.
+const MAX_TENTATIVAS_SOBRECARGA = 4;
+const ESPERA_MAXIMA_MS = 30000;
+
+/**
+ * 'fetch' que, se a requisição for recusada por sobrecarga (429 ou 503), espera o 'Retry-After' (ou uma
+ * espera exponencial, com variação aleatória para os navegadores não voltarem todos juntos) e tenta de novo.
+ * @param {string} url - O endereço da requisição.
+ * @param {object} options - As opções do fetch.
+ * @param {function(number)} onEspera - (Opcional) Chamada com os milissegundos de cada espera.
+ */
+async function fetchComEspera(url, options, onEspera) {
+    for (let tentativa = 0; ; tentativa++) {
+        const response = await fetch(url, options);
+        if ((response.status !== 429 && response.status !== 503) || tentativa >= MAX_TENTATIVAS_SOBRECARGA) {
+            return response;
+        }
+        const retryAfter = parseInt(response.headers.get('Retry-After'), 10) || 0;
+        const espera = Math.min(ESPERA_MAXIMA_MS, Math.max(retryAfter * 1000, 1000 * 2 ** tentativa) * (1 + Math.random() * 0.5));
+        if (onEspera) onEspera(espera);
+        await new Promise((resolve) => setTimeout(resolve, espera));
+    }
+}
+
+/**
+ * Envia um JSON ao servidor (com as novas tentativas de 'fetchComEspera') e devolve a resposta decodificada.
+ * @param {string} url - O endereço do endpoint.
+ * @param {object} corpo - O objeto enviado como JSON.
+ */
+async function postarJson(url, corpo) {
+    const response = await fetchComEspera(url, {
+        method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify(corpo),
+    });
+    return response.json().catch(() => ({ success: false, error: `HTTP ${response.status}` }));
+}
+
+/**
+ * Próximo byte a enviar, lido do cabeçalho 'Range' de uma resposta 308 do GCS ("bytes=0-N").
+ * Se o cabeçalho não estiver exposto pelo CORS do bucket, assume 'padrao'.
+ */
+function proximoByte(response, padrao) {
+    const range = response.headers.get('Range');
+    return range ? parseInt(range.split('-')[1], 10) + 1 : padrao;
+}
+
+/**
+ * Envia um arquivo direto para o GCS: o servidor só abre a sessão resumível ('/upload/direto') e, no fim,
+ * confere que o arquivo chegou ('/upload/direto/concluir'); os blocos vão do navegador para o GCS, em ordem (o GCS exige
+ * que os blocos de uma sessão sejam sequenciais), e um bloco que falhar é retomado do último byte gravado.
+ * O arquivo nunca é lido inteiro para a memória: cada bloco é uma fatia ('slice') do arquivo.
+ * @param {File} file - O arquivo escolhido.
+ * @param {function(number)} onProgress - Recebe a fração já enviada (0 a 1).
+ */
+async function uploadDireto(file, onProgress) {
+    const pedido = { filename: file.name, size: file.size, content_type: file.type || null };
+    const sessao = await postarJson('/upload/direto', pedido);
+    if (!sessao.success) throw new Error(sessao.error);
+
+    let offset = 0;
+    let falhas = 0;
+    while (true) {
+        const fim = Math.min(offset + sessao.tamanho_bloco, file.size);
+        const contentRange = file.size ? `bytes ${offset}-${fim - 1}/${file.size}` : 'bytes */0';
+        let response = null;
+        try {
+            // Os blocos vão para o GCS com 'fetch' simples: cabeçalhos extras exigiriam mais regras de CORS no bucket.
+            response = await fetch(sessao.url_sessao, {
+                method: 'PUT', headers: { 'Content-Range': contentRange }, body: file.slice(offset, fim),
+            });
+        } catch (error) {
+            // Sem nenhuma resposta do GCS no primeiro bloco (ex: CORS do bucket não configurado): desiste logo.
+            if (offset === 0 && falhas === 0) throw Object.assign(error, { semAcessoAoGcs: true });
+        }
+        if (response && response.ok) break;
+        if (response && response.status === 308) {
+            offset = proximoByte(response, fim);
+            falhas = 0;
+            onProgress(offset / file.size);
+            continue;
+        }
+        if (response && response.status !== 429 && response.status < 500) {
+            throw new Error(`O GCS recusou o bloco (HTTP ${response.status}).`);
+        }
+        // Falha transitória: espera e pergunta ao GCS quantos bytes já foram gravados.
+        if (++falhas > MAX_TENTATIVAS_BLOCO) throw new Error('Upload abandonado após várias falhas seguidas.');
+        await new Promise((resolve) => setTimeout(resolve, Math.min(30000, 500 * 2 ** falhas)));
+        try {
+            const status = await fetch(sessao.url_sessao, { method: 'PUT', headers: { 'Content-Range': `bytes */${file.size}` } });
+            if (status.ok) break;
+            if (status.status === 308) offset = proximoByte(status, offset);
+        } catch (error) { /* reenvia a partir do último offset confirmado */ }
+    }
+
+    const conclusao = await postarJson('/upload/direto/concluir', pedido);
+    if (!conclusao.success) throw new Error(conclusao.error);
+    onProgress(1);
+    return conclusao;
+}
+
+/**
+ * Envia o arquivo pelo servidor ('/upload'), como antes; usado quando o navegador não alcança o GCS.
+ * @param {File} file - O arquivo escolhido.
+ */
+async function uploadPeloServidor(file) {
+    const formData = new FormData();
+    formData.append('file', file);
+    const data = await (await fetchComEspera('/upload', { method: 'POST', body: formData })).json();
+    if (!data.success) throw new Error(data.error);
+    return data;
+}
+
+/**
+ * Envia vários arquivos, até UPLOADS_SIMULTANEOS ao mesmo tempo, e devolve o resultado de cada um
+ * ({ file, data } ou { file, error }), na ordem original.
+ * @param {File[]} files - Os arquivos escolhidos.
+ * @param {function(File, number)} onProgress - Recebe o arquivo e a fração já enviada.
+ */
+async function uploadArquivos(files, onProgress) {
+    const resultados = new Array(files.length);
+    let proximo = 0;
+    async function trabalhador() {
+        while (proximo < files.length) {
+            const indice = proximo++;
+            const file = files[indice];
+            try {
+                let data;
+                try {
+                    data = await uploadDireto(file, (fracao) => onProgress(file, fracao));
+                } catch (error) {
+                    if (!error.semAcessoAoGcs) throw error;
+                    data = await uploadPeloServidor(file);
+                    onProgress(file, 1);
+                }
+                resultados[indice] = { file, data };
+            } catch (error) {
+                resultados[indice] = { file, error };
+            }
+        }
+    }
+    await Promise.all(Array.from({ length: Math.min(UPLOADS_SIMULTANEOS, files.length) }, trabalhador));
+    return resultados;
+}
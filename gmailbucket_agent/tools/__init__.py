@@ -1,3 +1,9 @@
 from .funcs import enviar_email
+from .batch import enviar_emails_em_lote
+from .send_queue import agendar_email, consultar_envio
+from .mail_merge import consultar_mala_direta, iniciar_mala_direta, retomar_mala_direta
 
-__all__ = ["enviar_email"]
\ No newline at end of file
+__all__ = [
+    "enviar_email", "enviar_emails_em_lote", "agendar_email", "consultar_envio",
+    "iniciar_mala_direta", "consultar_mala_direta", "retomar_mala_direta",
+]
\ No newline at end of file
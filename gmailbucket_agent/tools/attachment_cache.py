@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+
+# --- Importações Padrão ---
+# Importa o módulo 'os' para ler as configurações e manipular os arquivos do cache em disco.
+import os
+# Importa 'hashlib' para transformar o caminho do blob em um nome de arquivo seguro.
+import hashlib
+# Importa 'tempfile' para achar a pasta temporária do sistema e gravar arquivos de forma atômica.
+import tempfile
+# Importa 'shutil' para copiar arquivos grandes para o cache em blocos.
+import shutil
+# Importa 'threading' para proteger o cache, que é compartilhado entre as threads de envio.
+import threading
+# Importa 'OrderedDict' para implementar o LRU (menos usado recentemente) da memória.
+from collections import OrderedDict
+# Importa 'Optional' e 'BinaryIO' para as anotações de tipo.
+from typing import BinaryIO, Optional
+
+# Tamanho total do cache em memória, em bytes (padrão: 64 MiB). Use 0 para desativar.
+ANEXOS_CACHE_MEMORIA_BYTES = int(os.getenv("ANEXOS_CACHE_MEMORIA_BYTES", str(64 * 1024 * 1024)))
+# Apenas objetos até este tamanho ficam na memória (padrão: 4 MiB); os maiores vão só para o disco.
+ANEXOS_CACHE_OBJETO_MAX_MEMORIA = int(os.getenv("ANEXOS_CACHE_OBJETO_MAX_MEMORIA", str(4 * 1024 * 1024)))
+# Pasta e tamanho total do cache em disco (padrão: 1 GiB). Use 0 para desativar.
+ANEXOS_CACHE_DIR = os.getenv("ANEXOS_CACHE_DIR", os.path.join(tempfile.gettempdir(), "gmailbucket_agent_anexos"))
+ANEXOS_CACHE_DISCO_BYTES = int(os.getenv("ANEXOS_CACHE_DISCO_BYTES", str(1024 * 1024 * 1024)))
+
+
+def tamanho_do_arquivo(f: BinaryIO) -> int:
+    """Tamanho total de um arquivo aberto, sem mudar a sua posição."""
+    return os.fstat(f.fileno()).st_size
+
+
+class CacheDeAnexos:
+    """
+    Cache de anexos em dois níveis: um LRU em memória para objetos pequenos e um nível em disco
+    com tamanho máximo. Cada entrada é validada pela geração do blob no GCS: se o arquivo
+    for substituído no bucket, a geração muda e a entrada antiga deixa de valer.
+    """
+
+    def __init__(self, limite_memoria: int = ANEXOS_CACHE_MEMORIA_BYTES,
+                 objeto_max_memoria: int = ANEXOS_CACHE_OBJETO_MAX_MEMORIA,
+                 diretorio: str = ANEXOS_CACHE_DIR, limite_disco: int = ANEXOS_CACHE_DISCO_BYTES):
+        self.limite_memoria = limite_memoria
+        self.objeto_max_memoria = objeto_max_memoria
+        self.diretorio = diretorio
+        self.limite_disco = limite_disco
+        self._lock = threading.Lock()
+        # chave -> (geracao, conteudo), do menos para o mais usado recentemente.
+        self._memoria: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes_memoria = 0
+        self._contadores = {"acertos_memoria": 0, "acertos_disco": 0, "falhas": 0, "bytes_economizados": 0}
+        if self.limite_disco:
+            os.makedirs(self.diretorio, exist_ok=True)
+
+    # --- Utilidades ---
+
+    def _arquivo(self, chave: str) -> str:
+        """Caminho do arquivo em disco de uma chave (um arquivo por blob, qualquer que seja a geração)."""
+        return os.path.join(self.diretorio, hashlib.sha256(chave.encode("utf-8")).hexdigest())
+
+    def _guardar_em_memoria(self, chave: str, geracao, conteudo: bytes) -> None:
+        """Coloca o conteúdo no LRU em memória, expulsando os menos usados se necessário (com o lock)."""
+        if not self.limite_memoria or len(conteudo) > min(self.objeto_max_memoria, self.limite_memoria):
+            return
+        antigo = self._memoria.pop(chave, None)
+        if antigo is not None:
+            self._bytes_memoria -= len(antigo[1])
+        self._memoria[chave] = (geracao, conteudo)
+        self._bytes_memoria += len(conteudo)
+        while self._bytes_memoria > self.limite_memoria:
+            _, (_, expulso) = self._memoria.popitem(last=False)
+            self._bytes_memoria -= len(expulso)
+
+    def _limpar_disco(self) -> None:
+        """Apaga os arquivos menos usados até o cache em disco caber no limite."""
+        arquivos = []
+        total = 0
+        for entrada in os.scandir(self.diretorio):
+            if entrada.is_file() and not entrada.name.endswith(".tmp"):
+                info = entrada.stat()
+                arquivos.append((info.st_mtime, info.st_size, entrada.path))
+                total += info.st_size
+        # O horário de modificação é atualizado a cada acerto, então o mais antigo é o menos usado.
+        for _, tamanho, caminho in sorted(arquivos):
+            if total <= self.limite_disco:
+                break
+            try:
+                os.remove(caminho)
+                total -= tamanho
+            except FileNotFoundError:
+                pass
+
+    # --- API pública ---
+
+    def obter(self, bucket_name: str, blob_name: str, geracao) -> Optional[bytes]:
+        """Devolve o conteúdo guardado para esta geração do blob, ou None se não estiver no cache."""
+        chave = f"{bucket_name}/{blob_name}"
+        with self._lock:
+            entrada = self._memoria.get(chave)
+            if entrada is not None and entrada[0] == geracao:
+                self._memoria.move_to_end(chave)
+                self._contadores["acertos_memoria"] += 1
+                self._contadores["bytes_economizados"] += len(entrada[1])
+                return entrada[1]
+
+        if self.limite_disco:
+            caminho = self._arquivo(chave)
+            try:
+                with open(caminho, "rb") as f:
+                    # A primeira linha do arquivo guarda a geração; o resto é o conteúdo.
+                    geracao_em_disco = f.readline().decode("ascii").strip()
+                    if geracao_em_disco == str(geracao):
+                        conteudo = f.read()
+                        # Marca o arquivo como usado agora (para a ordem do LRU em disco).
+                        os.utime(caminho)
+                        with self._lock:
+                            self._guardar_em_memoria(chave, geracao, conteudo)
+                            self._contadores["acertos_disco"] += 1
+                            self._contadores["bytes_economizados"] += len(conteudo)
+                        return conteudo
+            except FileNotFoundError:
+                pass
+
+        with self._lock:
+            self._contadores["falhas"] += 1
+        return None
+
+    def guardar(self, bucket_name: str, blob_name: str, geracao, conteudo: bytes) -> None:
+        """Guarda o conteúdo de uma geração do blob nos dois níveis do cache."""
+        chave = f"{bucket_name}/{blob_name}"
+        with self._lock:
+            self._guardar_em_memoria(chave, geracao, conteudo)
+        if not self.limite_disco or len(conteudo) > self.limite_disco:
+            return
+        # Grava em um arquivo temporário e renomeia, para que um leitor nunca veja um arquivo pela metade.
+        descritor, temporario = tempfile.mkstemp(dir=self.diretorio, suffix=".tmp")
+        try:
+            with os.fdopen(descritor, "wb") as f:
+                f.write(f"{geracao}\n".encode("ascii"))
+                f.write(conteudo)
+            os.replace(temporario, self._arquivo(chave))
+        except Exception:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+        self._limpar_disco()
+
+    def abrir_arquivo(self, bucket_name: str, blob_name: str, geracao) -> Optional[BinaryIO]:
+        """
+        Abre o arquivo em disco desta geração do blob, já posicionado no início do conteúdo,
+        sem carregá-lo na memória. Devolve None se ele não estiver no cache em disco.
+        """
+        if not self.limite_disco:
+            return None
+        caminho = self._arquivo(f"{bucket_name}/{blob_name}")
+        try:
+            f = open(caminho, "rb")
+        except FileNotFoundError:
+            with self._lock:
+                self._contadores["falhas"] += 1
+            return None
+        if f.readline().decode("ascii").strip() != str(geracao):
+            f.close()
+            with self._lock:
+                self._contadores["falhas"] += 1
+            return None
+        os.utime(caminho)
+        with self._lock:
+            self._contadores["acertos_disco"] += 1
+            self._contadores["bytes_economizados"] += tamanho_do_arquivo(f) - f.tell()
+        return f
+
+    def guardar_arquivo(self, bucket_name: str, blob_name: str, geracao, origem: BinaryIO) -> None:
+        """Copia um arquivo (do início) para o cache em disco, em blocos, sem passar pelo cache em memória."""
+        if not self.limite_disco or tamanho_do_arquivo(origem) > self.limite_disco:
+            return
+        origem.seek(0)
+        descritor, temporario = tempfile.mkstemp(dir=self.diretorio, suffix=".tmp")
+        try:
+            with os.fdopen(descritor, "wb") as f:
+                f.write(f"{geracao}\n".encode("ascii"))
+                shutil.copyfileobj(origem, f)
+            os.replace(temporario, self._arquivo(f"{bucket_name}/{blob_name}"))
+        except Exception:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+        finally:
+            origem.seek(0)
+        self._limpar_disco()
+
+    def estatisticas(self) -> dict:
+        """Devolve os contadores de acertos e falhas e a ocupação atual da memória."""
+        with self._lock:
+            return dict(self._contadores, bytes_em_memoria=self._bytes_memoria, objetos_em_memoria=len(self._memoria))
+
+
+# Instância única do processo, criada na primeira utilização.
+_cache: Optional[CacheDeAnexos] = None
+_lock_cache = threading.Lock()
+
+
+def obter_cache_de_anexos() -> CacheDeAnexos:
+    """Devolve o cache de anexos compartilhado pelo processo."""
+    global _cache
+    if _cache is None:
+        with _lock_cache:
+            if _cache is None:
+                _cache = CacheDeAnexos()
+    return _cache
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+# --- Importações Padrão ---
+# Importa o módulo 'os' para ler as configurações e os nomes dos arquivos.
+import os
+# Importa 'datetime' para calcular a validade dos links assinados.
+import datetime
+# Importa 'lru_cache' para carregar a chave da conta de serviço uma única vez.
+from functools import lru_cache
+# Importa os tipos usados nas anotações.
+from typing import Optional
+
+# Importa a medição de duração das etapas (a assinatura dos links).
+from ..metrics import medir
+
+# Arquivo JSON da chave de uma conta de serviço, usada para assinar os links localmente (sem chamadas de rede).
+# Sem ele, todos os anexos continuam indo dentro do email.
+GCS_CHAVE_ASSINATURA = os.getenv("GCS_CHAVE_ASSINATURA", "")
+# Anexos maiores que isto (em bytes) vão como link de download em vez de dentro do email (padrão: 10 MiB).
+ANEXOS_LIMIAR_LINK = int(os.getenv("ANEXOS_LIMIAR_LINK", str(10 * 1024 * 1024)))
+# Total máximo dos anexos dentro do email (padrão: 18 MiB, que em Base64 ficam abaixo dos 25 MB do Gmail).
+# Se os anexos pequenos somados passarem disso, os maiores também viram links.
+ANEXOS_LIMITE_INLINE = int(os.getenv("ANEXOS_LIMITE_INLINE", str(18 * 1024 * 1024)))
+# Validade dos links, em horas (o máximo de uma URL assinada V4 é de 7 dias).
+ANEXOS_LINK_VALIDADE_HORAS = min(168, max(1, int(os.getenv("ANEXOS_LINK_VALIDADE_HORAS", "168"))))
+
+
+@lru_cache(maxsize=None)
+def obter_credenciais_assinatura():
+    """Credenciais da conta de serviço de GCS_CHAVE_ASSINATURA (ou None se a variável não estiver definida)."""
+    if not GCS_CHAVE_ASSINATURA:
+        return None
+    from google.oauth2 import service_account
+    return service_account.Credentials.from_service_account_file(GCS_CHAVE_ASSINATURA)
+
+
+def separar_anexos(anexos: list[tuple], limiar: int = ANEXOS_LIMIAR_LINK,
+                   limite_inline: int = ANEXOS_LIMITE_INLINE) -> tuple:
+    """
+    Decide, só pelos metadados (o tamanho de cada blob), quais anexos vão dentro do email e quais vão
+    como link. Devolve (inline, por_link), ambos listas de pares (nome, blob) na ordem original.
+    Sem chave de assinatura configurada, todos os anexos vão dentro do email.
+    """
+    if not anexos or not GCS_CHAVE_ASSINATURA:
+        return anexos, []
+    por_link = {i for i, (_, blob) in enumerate(anexos) if (blob.size or 0) > limiar}
+    # Se os anexos que sobraram ainda passam do limite do email, os maiores também viram links.
+    restantes = sorted((i for i in range(len(anexos)) if i not in por_link), key=lambda i: anexos[i][1].size or 0)
+    total = sum(anexos[i][1].size or 0 for i in restantes)
+    while restantes and total > limite_inline:
+        maior = restantes.pop()
+        por_link.add(maior)
+        total -= anexos[maior][1].size or 0
+    inline = [anexo for i, anexo in enumerate(anexos) if i not in por_link]
+    return inline, [anexo for i, anexo in enumerate(anexos) if i in por_link]
+
+
+def gerar_link(nome_do_arquivo: str, blob, expira_em: datetime.datetime) -> str:
+    """
+    Gera uma URL assinada (V4, GET) para a geração atual do blob, assinada localmente com a chave da conta
+    de serviço. O download chega ao destinatário com o nome original do arquivo.
+    """
+    nome = os.path.basename(nome_do_arquivo).replace('"', "")
+    with medir("gcs.assinatura"):
+        return blob.generate_signed_url(
+            version="v4",
+            expiration=expira_em,
+            method="GET",
+            generation=blob.generation,
+            credentials=obter_credenciais_assinatura(),
+            response_disposition=f'attachment; filename="{nome}"',
+        )
+
+
+def _tamanho_legivel(tamanho: int) -> str:
+    """Tamanho em MB, com uma casa decimal (ex: '12,3 MB')."""
+    return f"{tamanho / (1024 * 1024):.1f} MB".replace(".", ",")
+
+
+def acrescentar_links(corpo_mensagem: str, por_link: list[tuple],
+                      validade_horas: int = ANEXOS_LINK_VALIDADE_HORAS,
+                      agora: Optional[datetime.datetime] = None) -> str:
+    """Acrescenta ao corpo do email a lista de arquivos grandes, com o link assinado de cada um."""
+    if not por_link:
+        return corpo_mensagem
+    expira_em = (agora or datetime.datetime.now(datetime.timezone.utc)) + datetime.timedelta(hours=validade_horas)
+    linhas = [
+        f"- {os.path.basename(nome)} ({_tamanho_legivel(blob.size or 0)}): {gerar_link(nome, blob, expira_em)}"
+        for nome, blob in por_link
+    ]
+    return (
+        f"{corpo_mensagem}\n\n"
+        f"Arquivos disponíveis para download (links válidos até {expira_em:%d/%m/%Y %H:%M} UTC):\n"
+        + "\n".join(linhas)
+    )
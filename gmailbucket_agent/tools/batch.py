@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+# --- Importações Padrão ---
+# Importa o módulo 'os' para ler o tamanho máximo de cada lote e manipular nomes de arquivos.
+import os
+# Importa 'Optional' para indicar argumentos opcionais.
+from typing import Optional
+
+# Importa o gerenciador compartilhado de credenciais e serviços do Gmail.
+from .gmail_client import novo_lote, obter_gerenciador_gmail
+# Importa as etapas de montagem de mensagem compartilhadas com 'enviar_email'.
+from .funcs import (
+    ErroDeEnvio, baixar_anexos, codificar_mensagem, definir_cabecalhos, mapear_em_paralelo, montar_mensagem,
+    obter_metadados_anexos, validar_destinatarios,
+)
+# Importa o envio por upload de mídia, usado quando os anexos passam do limiar das mensagens grandes.
+from .large_message import LIMIAR_MENSAGEM_GRANDE, enviar_mensagem_grande
+# Importa a camada de E/S que executa as chamadas bloqueantes em pools de threads limitados.
+from ..io_executor import executar_io
+# Importa a medição de duração das etapas (cada requisição em lote e cada envio grande).
+from ..metrics import medir
+# Importa o envio por referência: anexos grandes viram links assinados no corpo do email.
+from .attachment_links import acrescentar_links, separar_anexos
+
+# Quantos envios vão em cada requisição em lote. A API do Gmail aceita até 100,
+# mas recomenda no máximo 50 para não disparar o limite de taxa.
+GMAIL_BATCH_SIZE = min(100, max(1, int(os.getenv("GMAIL_BATCH_SIZE", "50"))))
+# Tamanho máximo (em bytes, somando o 'raw' de cada mensagem) de uma requisição em lote. O Gmail recusa
+# requisições em lote grandes demais; o lote é fechado antes de passar disto, e uma mensagem que sozinha
+# já passa do limite é enviada fora do lote (padrão: 8 MiB).
+GMAIL_BATCH_MAX_BYTES = max(1, int(os.getenv("GMAIL_BATCH_MAX_BYTES", str(8 * 1024 * 1024))))
+
+
+async def enviar_emails_em_lote(destinatarios: list[str], assunto: str, corpo_mensagem: str, nomes_dos_arquivos_anexos: Optional[list[str]] = None) -> dict:
+    """
+    Envia uma cópia individual do mesmo email para cada destinatário, usando requisições em lote do Gmail.
+    Use esta ferramenta quando o usuário quiser que cada pessoa receba a sua própria cópia
+    (sem ver os outros destinatários), especialmente para muitos destinatários.
+
+    Args:
+        destinatarios (list[str]): Uma lista de e-mails; cada um recebe uma cópia separada.
+        assunto (str): O assunto do email.
+        corpo_mensagem (str): O conteúdo de texto do email.
+        nomes_dos_arquivos_anexos (Optional[list[str]]): Os nomes dos arquivos (ex: ["relatorio.pdf"]) ou os caminhos
+                                             completos no GCS (ex: "meu-bucket/pasta/arquivo.pdf"). Padrão é None.
+
+    Returns:
+        dict: Um resumo ('status', 'enviados', 'falhas') e, em 'resultados', o sucesso ou erro de cada destinatário.
+    """
+    # Os envios são bloqueantes; rodam no pool de E/S do Gmail para não travar o laço de eventos.
+    return await executar_io("gmail", enviar_emails_em_lote_sync, destinatarios, assunto, corpo_mensagem, nomes_dos_arquivos_anexos)
+
+
+def enviar_emails_em_lote_sync(destinatarios: list[str], assunto: str, corpo_mensagem: str,
+                               nomes_dos_arquivos_anexos: Optional[list[str]] = None,
+                               tamanho_lote: int = GMAIL_BATCH_SIZE, bytes_lote: int = GMAIL_BATCH_MAX_BYTES) -> dict:
+    """
+    Versão síncrona (bloqueante) de 'enviar_emails_em_lote'. Deve ser chamada fora do laço de eventos.
+
+    Os anexos são baixados e codificados uma única vez e reaproveitados em todas as cópias. Cada requisição
+    em lote leva até 'tamanho_lote' envios e até 'bytes_lote' bytes de mensagens. Se os anexos passarem de
+    LIMIAR_MENSAGEM_GRANDE, não há lote: cada cópia é enviada por upload de mídia (como em 'enviar_email'),
+    com os anexos lidos do cache em disco a partir da segunda cópia.
+    """
+    try:
+        validar_destinatarios(destinatarios)
+        nomes_dos_arquivos_anexos = nomes_dos_arquivos_anexos or []
+        # Os anexos grandes não são baixados: vão como links assinados, os mesmos para todas as cópias.
+        anexos, por_link = separar_anexos(obter_metadados_anexos(nomes_dos_arquivos_anexos))
+        corpo_mensagem = acrescentar_links(corpo_mensagem, por_link)
+        grande = sum(blob.size or 0 for _, blob in anexos) > LIMIAR_MENSAGEM_GRANDE
+        # Mensagem pequena: baixa e codifica os anexos (se houver) apenas uma vez para todas as cópias.
+        message = None if grande else montar_mensagem(corpo_mensagem, baixar_anexos(anexos))
+        gerenciador = obter_gerenciador_gmail()
+    except ErroDeEnvio as e:
+        return {"status": "erro", "erro": str(e)}
+    except Exception as e:
+        return {"status": "erro", "erro": f"Ocorreu um erro inesperado: {e}"}
+
+    # Um resultado por destinatário, na mesma ordem da lista recebida.
+    resultados = [{"destinatario": email, "sucesso": False} for email in destinatarios]
+
+    def registrar_resultado(request_id, response, exception):
+        """Callback chamado pela biblioteca do Google para cada envio do lote (e para os enviados fora dele)."""
+        resultado = resultados[int(request_id)]
+        if exception is not None:
+            resultado["erro"] = str(exception)
+        else:
+            resultado["sucesso"] = True
+            resultado["id"] = response.get("id")
+
+    def enviar_sozinho(indice: int, enviar) -> None:
+        """Envia uma cópia fora do lote, registrando o resultado como o callback do lote faria."""
+        try:
+            resposta = enviar()
+        except Exception as e:
+            registrar_resultado(indice, None, e)
+        else:
+            registrar_resultado(indice, resposta, None)
+
+    tamanho_lote = min(100, max(1, tamanho_lote))
+    with gerenciador.servico() as service:
+        if grande:
+            for indice, email in enumerate(destinatarios):
+                with medir("gmail.envio_grande"):
+                    enviar_sozinho(indice, lambda: enviar_mensagem_grande(
+                        service, [email], assunto, corpo_mensagem, anexos, mapear=mapear_em_paralelo
+                    ))
+        else:
+            lote, indices, bytes_acumulados = None, [], 0
+            for indice, email in enumerate(destinatarios):
+                # Apenas o cabeçalho 'To' muda entre as cópias; os anexos já codificados são reaproveitados.
+                definir_cabecalhos(message, [email], assunto)
+                corpo = codificar_mensagem(message)
+                tamanho = len(corpo["raw"])
+                if tamanho > bytes_lote:
+                    # Sozinha, a mensagem já não cabe em um lote: vai em uma requisição própria.
+                    with medir("gmail.envio"):
+                        enviar_sozinho(indice, service.users().messages().send(userId="me", body=corpo).execute)
+                    continue
+                if indices and (len(indices) >= tamanho_lote or bytes_acumulados + tamanho > bytes_lote):
+                    _executar_lote(lote, indices, resultados)
+                    lote, indices, bytes_acumulados = None, [], 0
+                if lote is None:
+                    lote = novo_lote(service, registrar_resultado)
+                lote.add(service.users().messages().send(userId="me", body=corpo), request_id=str(indice))
+                indices.append(indice)
+                bytes_acumulados += tamanho
+            if indices:
+                _executar_lote(lote, indices, resultados)
+
+    enviados = sum(1 for resultado in resultados if resultado["sucesso"])
+    falhas = len(resultados) - enviados
+    if falhas == 0:
+        status = "sucesso"
+    elif enviados == 0:
+        status = "erro"
+    else:
+        status = "parcial"
+    resumo = {"status": status, "enviados": enviados, "falhas": falhas, "resultados": resultados}
+    if nomes_dos_arquivos_anexos:
+        resumo["anexos"] = [os.path.basename(nome) for nome in nomes_dos_arquivos_anexos]
+        if por_link:
+            resumo["anexos_por_link"] = [os.path.basename(nome) for nome, _ in por_link]
+    return resumo
+
+
+def _executar_lote(lote, indices: list[int], resultados: list[dict]) -> None:
+    """Executa uma requisição em lote; se ela falhar inteira, marca os envios dela que ainda não têm resultado."""
+    try:
+        with medir("gmail.envio_lote"):
+            lote.execute()
+    except Exception as e:
+        for indice in indices:
+            if not resultados[indice]["sucesso"] and "erro" not in resultados[indice]:
+                resultados[indice]["erro"] = str(e)
@@ -10,27 +10,34 @@ import re
 # Importa 'mimetypes' para adivinhar o tipo de mídia (MIME type) de um arquivo de anexo (ex: 'application/pdf').
 import mimetypes
 # Importa 'Optional' do módulo 'typing' para indicar que um argumento de função pode ser opcional.
-from typing import Optional
-# Importa 'load_dotenv' para carregar variáveis de ambiente de um arquivo .env.
-from dotenv import load_dotenv
+from typing import Callable, Optional
+# Importa 'wait' para acompanhar os downloads paralelos dos anexos à medida que terminam.
+from concurrent.futures import FIRST_COMPLETED, wait
 # Importa 'requests' para fazer requisições HTTP, usado para baixar arquivos do Google Drive.
 import requests
 # Importa funções para analisar URLs, usado para extrair o ID de um link do Google Drive.
 from urllib.parse import urlparse, parse_qs
 
-# Executa a função para carregar as variáveis do arquivo .env no ambiente do sistema.
-load_dotenv()
-
 # --- Importações do Google ---
-# Importa a biblioteca cliente do Google Cloud Storage para interagir com buckets.
-from google.cloud import storage
-# Importa classes para lidar com a autenticação e autorização do Google.
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-# Importa o construtor de serviços da API do Google e o manipulador de erros HTTP.
-from googleapiclient.discovery import build
+# Importa a configuração compartilhada: o destino dos anexos (GCS_ATTACHMENT_PATH, já validado)
+# e o cliente único do Google Cloud Storage (o arquivo .env é carregado por ela).
+from ..config import obter_cliente_storage, obter_destino_gcs
+# Importa o manipulador de erros HTTP da API do Google.
 from googleapiclient.errors import HttpError
+# Importa o gerenciador compartilhado de credenciais e serviços do Gmail.
+from .gmail_client import SCOPES, obter_gerenciador_gmail
+# Importa a camada de E/S que executa as chamadas bloqueantes em pools de threads limitados.
+from ..io_executor import executar_io, obter_executor_io
+# Importa o cache de anexos (memória + disco), validado pela geração do blob no GCS.
+from .attachment_cache import obter_cache_de_anexos
+# Importa o envio de mensagens grandes por upload de mídia, montadas em arquivo temporário.
+from .large_message import LIMIAR_MENSAGEM_GRANDE, enviar_mensagem_grande
+# Importa o envio por referência: anexos grandes viram links assinados no corpo do email, sem download.
+from .attachment_links import ANEXOS_LINK_VALIDADE_HORAS, acrescentar_links, separar_anexos
+# Importa a instrumentação: duração de cada etapa do envio, bytes dos anexos e envios em andamento.
+from ..metrics import contar_bytes, em_andamento, medir
+# Importa a resolução dos apelidos criados pelo upload deduplicado (nome do arquivo -> conteúdo pelo hash).
+from ..gcs_upload import resolver_apelido
 
 # --- Importações de Email ---
 # Importa classes do módulo 'email' para construir a estrutura da mensagem de email.
@@ -40,144 +47,306 @@ from email.mime.base import MIMEBase           # A classe base para criar partes
 from email import encoders                     # Para codificar os anexos em Base64.
 
 
-# Carrega o caminho padrão para anexos no GCS a partir das variáveis de ambiente.
-GCS_ATTACHMENT_PATH = os.getenv("GCS_ATTACHMENT_PATH")
+# Quantos anexos de um mesmo email são baixados ao mesmo tempo.
+ANEXOS_DOWNLOADS_PARALELOS = int(os.getenv("ANEXOS_DOWNLOADS_PARALELOS", "4"))
+
+
+class ErroDeEnvio(Exception):
+    """Erro esperado durante a preparação de um email; a mensagem é devolvida ao usuário como está."""
+
+
+def validar_destinatarios(destinatarios: list[str]) -> None:
+    """Lança 'ErroDeEnvio' se a lista estiver vazia ou tiver algum endereço inválido."""
+    if not destinatarios:
+        raise ErroDeEnvio("Erro: A lista de destinatários não pode ser vazia.")
+    # Expressão regular para validar o formato de um endereço de e-mail.
+    email_regex = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
+    for email in destinatarios:
+        # Verifica se cada e-mail na lista corresponde ao formato esperado.
+        if not re.fullmatch(email_regex, email.strip()):
+            raise ErroDeEnvio(f"Erro: O endereço '{email}' na lista de destinatários não é um formato de e-mail válido.")
+
+
+def resolver_caminho_anexo(nome_do_arquivo_anexo: str) -> str:
+    """
+    Devolve o caminho completo "bucket/objeto" de um anexo.
+    Aceita um nome de arquivo simples (relativo a GCS_ATTACHMENT_PATH) ou um caminho completo do GCS.
+    """
+    # Lê o bucket e a pasta de GCS_ATTACHMENT_PATH (interpretados e validados uma única vez).
+    try:
+        destino = obter_destino_gcs()
+    except ValueError as e:
+        raise ErroDeEnvio(str(e))
+
+    # Verifica se o parâmetro recebido já é um caminho completo de GCS (contém bucket e objeto).
+    if "/" in nome_do_arquivo_anexo and nome_do_arquivo_anexo.startswith(destino.bucket):
+        return nome_do_arquivo_anexo
+    # Se for apenas o nome do arquivo, monta o caminho completo dentro da pasta de anexos.
+    return destino.caminho(nome_do_arquivo_anexo)
+
+
+def mapear_em_paralelo(func: Callable, itens: list, ao_concluir: Optional[Callable] = None) -> list:
+    """
+    Executa 'func(item)' para cada item no pool de E/S do GCS, com no máximo
+    ANEXOS_DOWNLOADS_PARALELOS chamadas em andamento, e devolve os resultados na ordem dos itens.
+    Se 'ao_concluir(indice, resultado)' for informado, ele roda na thread que chamou, assim que
+    cada item termina (enquanto os outros continuam), e o seu retorno substitui o resultado.
+    Se um item falhar, os que ainda não começaram são cancelados e o erro é propagado.
+    """
+    executor = obter_executor_io()
+    resultados: list = [None] * len(itens)
+    proximos = iter(enumerate(itens))
+    pendentes = {}
+
+    def submeter_proximo() -> None:
+        """Inicia o próximo item da lista, se ainda houver algum."""
+        proximo = next(proximos, None)
+        if proximo is not None:
+            indice, item = proximo
+            pendentes[executor.submeter("gcs", func, item)] = indice
+
+    for _ in range(max(1, ANEXOS_DOWNLOADS_PARALELOS)):
+        submeter_proximo()
+    try:
+        while pendentes:
+            concluidos, _ = wait(pendentes, return_when=FIRST_COMPLETED)
+            for futuro in concluidos:
+                indice = pendentes.pop(futuro)
+                resultado = futuro.result()
+                if ao_concluir is not None:
+                    resultado = ao_concluir(indice, resultado)
+                resultados[indice] = resultado
+                submeter_proximo()
+    except BaseException:
+        # Se um item falhar, não adianta continuar com os outros.
+        for futuro in pendentes:
+            futuro.cancel()
+        raise
+    return resultados
+
+
+def obter_metadados_anexos(nomes_dos_arquivos_anexos: list[str]) -> list[tuple]:
+    """
+    Lê, em paralelo, os metadados de cada anexo no GCS (uma única chamada por arquivo, que também
+    verifica se ele existe) e devolve uma lista de pares (nome, blob).
+    Lança 'ErroDeEnvio' se algum arquivo não existir.
+    """
+    if not nomes_dos_arquivos_anexos:
+        return []
+    # Usa o cliente do Google Cloud Storage compartilhado pelo processo (e o seu pool de conexões).
+    storage_client = obter_cliente_storage()
+
+    def obter_blob(nome_do_arquivo_anexo: str):
+        caminho_completo_do_blob = resolver_caminho_anexo(nome_do_arquivo_anexo)
+        # Separa o nome do bucket e o caminho do objeto (blob).
+        bucket_name, blob_name = caminho_completo_do_blob.split('/', 1)
+        with medir("gcs.metadados"):
+            blob = storage_client.bucket(bucket_name).get_blob(blob_name)
+            # Um arquivo enviado pelo /upload é um apelido: o conteúdo está guardado pelo seu SHA-256.
+            if blob is not None:
+                blob = resolver_apelido(blob)
+        if blob is None:
+            raise ErroDeEnvio(f"Erro: O arquivo no caminho '{caminho_completo_do_blob}' não foi encontrado no Google Cloud Storage.")
+        return (nome_do_arquivo_anexo, blob)
+
+    return mapear_em_paralelo(obter_blob, nomes_dos_arquivos_anexos)
+
+
+def ler_anexo(blob) -> bytes:
+    """
+    Obtém o conteúdo de um blob, consultando antes o cache de anexos.
+    Faz chamadas bloqueantes diretamente: deve rodar no pool de E/S do GCS.
+    """
+    # Se esta geração do arquivo já estiver no cache, o download é dispensado.
+    cache = obter_cache_de_anexos()
+    file_content = cache.obter(blob.bucket.name, blob.name, blob.generation)
+    if file_content is None:
+        # Baixa o conteúdo como bytes; o blob carrega a geração lida nos metadados, então o download
+        # traz exatamente a versão que será guardada no cache.
+        with medir("gcs.download"):
+            file_content = blob.download_as_bytes()
+        contar_bytes("anexo_gcs", len(file_content))
+        cache.guardar(blob.bucket.name, blob.name, blob.generation, file_content)
+    else:
+        contar_bytes("anexo_cache", len(file_content))
+    return file_content
+
+
+def baixar_anexos(anexos: list[tuple]) -> list[MIMEBase]:
+    """
+    Baixa em paralelo os anexos (pares (nome, blob) de 'obter_metadados_anexos') e devolve as suas
+    partes MIME, na mesma ordem. Cada parte é codificada assim que o seu download termina,
+    de modo que o tempo total fica próximo ao do download mais lento, e não à soma de todos.
+    """
+    return mapear_em_paralelo(
+        lambda anexo: ler_anexo(anexo[1]), anexos,
+        ao_concluir=lambda indice, conteudo: montar_parte_anexo(anexos[indice][0], conteudo),
+    )
+
+
+def montar_parte_anexo(nome_do_arquivo_anexo: str, file_content: bytes) -> MIMEBase:
+    """Cria a parte MIME (codificada em Base64) de um anexo."""
+    # Tenta adivinhar o tipo de mídia do arquivo (ex: 'image/jpeg').
+    content_type, encoding = mimetypes.guess_type(nome_do_arquivo_anexo)
+    if content_type is None or encoding is not None:
+        # Se não conseguir adivinhar, usa um tipo genérico.
+        content_type = "application/octet-stream"
+    main_type, sub_type = content_type.split("/", 1)
+
+    # Cria a parte do anexo (MIMEBase).
+    part = MIMEBase(main_type, sub_type)
+    # Define o conteúdo do anexo.
+    part.set_payload(file_content)
+    # Codifica o anexo em Base64, um formato padrão para anexos de email.
+    encoders.encode_base64(part)
+    # Adiciona o cabeçalho 'Content-Disposition' para que o cliente de email saiba que é um anexo.
+    part.add_header("Content-Disposition", f"attachment; filename= {os.path.basename(nome_do_arquivo_anexo)}")
+    return part
+
+
+def montar_mensagem(corpo_mensagem: str, partes_anexos: Optional[list[MIMEBase]] = None):
+    """Cria a mensagem MIME (ainda sem os cabeçalhos To/From/Subject)."""
+    # Se houver anexos, a mensagem precisa ser do tipo "multipart" para conter texto e anexos.
+    if partes_anexos:
+        message = MIMEMultipart()
+        # Anexa o corpo do email como a primeira parte (texto).
+        message.attach(MIMEText(corpo_mensagem, "plain"))
+        # Anexa as partes dos arquivos à mensagem principal.
+        for parte in partes_anexos:
+            message.attach(parte)
+        return message
+    # Se não houver anexo, cria uma mensagem de texto simples.
+    return MIMEText(corpo_mensagem)
+
+
+def definir_cabecalhos(message, destinatarios: list[str], assunto: str) -> None:
+    """Define (ou substitui) os cabeçalhos To, From e Subject da mensagem."""
+    for cabecalho in ("To", "From", "Subject"):
+        del message[cabecalho]
+    message["To"] = ", ".join(destinatarios) # Concatena a lista de destinatários em uma string.
+    message["From"] = "me"                   # "me" é um alias para o usuário autenticado na API do Gmail.
+    message["Subject"] = assunto
+
 
-# Define os escopos de permissão. Aqui, estamos pedindo permissão apenas para ENVIAR emails em nome do usuário.
-SCOPES = ["https://www.googleapis.com/auth/gmail.send"]
+def codificar_mensagem(message) -> dict:
+    """Monta o corpo da requisição 'messages.send' da API do Gmail."""
+    # Codifica a mensagem inteira em bytes e depois em Base64 segura para URLs.
+    encoded_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
+    return {"raw": encoded_message}
 
 
-def enviar_email(destinatarios: list[str], assunto: str, corpo_mensagem: str, nome_do_arquivo_anexo: Optional[str] = None) -> str:
+async def enviar_email(destinatarios: list[str], assunto: str, corpo_mensagem: str, nomes_dos_arquivos_anexos: Optional[list[str]] = None) -> str:
     """
-    Envia um email, com suporte opcional a um anexo do Google Cloud Storage.
-    A função é inteligente e aceita um nome de arquivo simples ou um caminho completo do GCS.
+    Envia um email, com suporte opcional a um ou mais anexos do Google Cloud Storage.
+    A função é inteligente e aceita nomes de arquivo simples ou caminhos completos do GCS.
 
     Args:
         destinatarios (list[str]): Uma lista de e-mails dos destinatários.
         assunto (str): O assunto do email.
         corpo_mensagem (str): O conteúdo de texto do email.
-        nome_do_arquivo_anexo (Optional[str]): O nome do arquivo (ex: "relatorio.pdf") ou o caminho completo
-                                             no GCS (ex: "meu-bucket/pasta/arquivo.pdf"). Padrão é None.
+        nomes_dos_arquivos_anexos (Optional[list[str]]): Os nomes dos arquivos (ex: ["relatorio.pdf", "foto.png"])
+                                             ou os caminhos completos no GCS (ex: "meu-bucket/pasta/arquivo.pdf").
+                                             Padrão é None (sem anexos).
 
     Returns:
         str: Uma mensagem de sucesso ou de erro.
     """
+    # O envio faz chamadas bloqueantes ao Gmail e ao GCS; elas rodam no pool de E/S do Gmail
+    # para não travar o laço de eventos (e as outras conversas) enquanto o email é enviado.
+    return await executar_io("gmail", enviar_email_sync, destinatarios, assunto, corpo_mensagem, nomes_dos_arquivos_anexos)
+
+
+def enviar_mensagem_sync(destinatarios: list[str], assunto: str, corpo_mensagem: str, nomes_dos_arquivos_anexos: Optional[list[str]] = None) -> dict:
+    """
+    Monta e envia um email, lançando as exceções em vez de convertê-las em mensagens
+    (para que quem chama possa decidir se tenta de novo). Devolve a resposta da API do Gmail.
+    Deve ser chamada fora do laço de eventos, por exemplo através de 'executar_io("gmail", ...)'.
+    """
+    with em_andamento("envio"), medir("email.envio"):
+        return _enviar_mensagem(destinatarios, assunto, corpo_mensagem, nomes_dos_arquivos_anexos)
+
+
+def _enviar_mensagem(destinatarios: list[str], assunto: str, corpo_mensagem: str, nomes_dos_arquivos_anexos: Optional[list[str]]) -> dict:
+    """Corpo de 'enviar_mensagem_sync' (cada etapa é medida separadamente em 'gmailbucket_etapa_duracao_segundos')."""
     # 1. Validação dos emails dos destinatários
-    if not destinatarios:
-        return "Erro: A lista de destinatários não pode ser vazia."
-    # Expressão regular para validar o formato de um endereço de e-mail.
-    email_regex = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-    for email in destinatarios:
-        # Verifica se cada e-mail na lista corresponde ao formato esperado.
-        if not re.fullmatch(email_regex, email.strip()):
-            return f"Erro: O endereço '{email}' na lista de destinatários não é um formato de e-mail válido."
-
-    # 2. Lógica de autenticação do Google (com cache de token)
-    creds = None
-    # Constrói os caminhos para os arquivos de credenciais e token.
-    script_dir = os.path.dirname(__file__)
-    project_root = os.path.join(script_dir, '..') # Navega para o diretório pai (raiz do projeto)
-    CREDENTIALS_PATH = os.path.join(project_root, 'credentials.json')
-    TOKEN_PATH = os.path.join(project_root, 'token.json')
-    
-    # Se o arquivo token.json existe, carrega as credenciais salvas dele.
-    if os.path.exists(TOKEN_PATH):
-        creds = Credentials.from_authorized_user_file(TOKEN_PATH, SCOPES)
-    
-    # Se não há credenciais ou elas são inválidas (expiradas).
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            # Se as credenciais expiraram mas podem ser atualizadas, atualiza-as.
-            creds.refresh(Request())
-        else:
-            # Caso contrário, inicia o fluxo de autorização do zero.
-            # O usuário precisará autorizar o acesso no navegador.
-            flow = InstalledAppFlow.from_client_secrets_file(CREDENTIALS_PATH, SCOPES)
-            creds = flow.run_local_server(port=0)
-        # Salva as novas credenciais (ou as atualizadas) no arquivo token.json para usos futuros.
-        with open(TOKEN_PATH, "w") as token:
-            token.write(creds.to_json())
+    validar_destinatarios(destinatarios)
 
-    try:
-        # 3. Construção da mensagem de email
-        # Cria o objeto de serviço para interagir com a API do Gmail.
-        service = build("gmail", "v1", credentials=creds)
-        message = None
-
-        # Se um nome de arquivo de anexo foi fornecido...
-        if nome_do_arquivo_anexo:
-            # ... a mensagem precisa ser do tipo "multipart" para conter texto e anexo.
-            message = MIMEMultipart()
-            # Anexa o corpo do email como a primeira parte (texto).
-            message.attach(MIMEText(corpo_mensagem, "plain"))
-
-            # Lógica robusta para encontrar o arquivo no GCS
-            caminho_base_gcs = os.getenv("GCS_ATTACHMENT_PATH", "").strip('/')
-            
-            # Verifica se o parâmetro recebido já é um caminho completo de GCS (contém bucket e objeto).
-            if "/" in nome_do_arquivo_anexo and caminho_base_gcs and nome_do_arquivo_anexo.startswith(caminho_base_gcs.split('/')[0]):
-                caminho_completo_do_blob = nome_do_arquivo_anexo
-            else:
-                # Se for apenas o nome do arquivo, monta o caminho completo usando a variável de ambiente.
-                if not caminho_base_gcs:
-                    return "Erro de configuração: A variável 'GCS_ATTACHMENT_PATH' não foi encontrada no arquivo .env."
-                caminho_completo_do_blob = f"{caminho_base_gcs}/{nome_do_arquivo_anexo}"
-            
-            # Separa o nome do bucket e o caminho do objeto (blob).
-            bucket_name, blob_name = caminho_completo_do_blob.split('/', 1)
-            
-            # Conecta-se ao Google Cloud Storage.
-            storage_client = storage.Client()
-            bucket = storage_client.bucket(bucket_name)
-            blob = bucket.blob(blob_name)
-            
-            # Verifica se o arquivo realmente existe no GCS antes de prosseguir.
-            if not blob.exists():
-                return f"Erro: O arquivo no caminho '{caminho_completo_do_blob}' não foi encontrado no Google Cloud Storage."
-            
-            # Baixa o conteúdo do arquivo como bytes.
-            file_content = blob.download_as_bytes()
-            # Tenta adivinhar o tipo de mídia do arquivo (ex: 'image/jpeg').
-            content_type, encoding = mimetypes.guess_type(nome_do_arquivo_anexo)
-            if content_type is None or encoding is not None:
-                # Se não conseguir adivinhar, usa um tipo genérico.
-                content_type = "application/octet-stream"
-            main_type, sub_type = content_type.split("/", 1)
-
-            # Cria a parte do anexo (MIMEBase).
-            part = MIMEBase(main_type, sub_type)
-            # Define o conteúdo do anexo.
-            part.set_payload(file_content)
-            # Codifica o anexo em Base64, um formato padrão para anexos de email.
-            encoders.encode_base64(part)
-            # Adiciona o cabeçalho 'Content-Disposition' para que o cliente de email saiba que é um anexo.
-            part.add_header("Content-Disposition", f"attachment; filename= {os.path.basename(nome_do_arquivo_anexo)}")
-            # Anexa a parte do arquivo à mensagem principal.
-            message.attach(part)
-        else:
-            # Se não houver anexo, cria uma mensagem de texto simples.
-            message = MIMEText(corpo_mensagem)
-
-        # 4. Definição dos cabeçalhos e envio
-        message["To"] = ", ".join(destinatarios) # Concatena a lista de destinatários em uma string.
-        message["From"] = "me"                   # "me" é um alias para o usuário autenticado na API do Gmail.
-        message["Subject"] = assunto
-        
-        # Codifica a mensagem inteira em bytes e depois em Base64 segura para URLs.
-        encoded_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
+    # 2. Autenticação do Google
+    # As credenciais e os objetos de serviço são mantidos pelo gerenciador do processo,
+    # que carrega o token uma única vez e o renova em segundo plano antes de expirar.
+    gerenciador = obter_gerenciador_gmail()
+
+    # 3. Construção da mensagem de email
+    # Os metadados dos anexos (se houver) são lidos em paralelo; eles informam o tamanho de cada arquivo.
+    anexos = obter_metadados_anexos(nomes_dos_arquivos_anexos or [])
+    # Só pelo tamanho (sem baixar nada), os anexos grandes saem da mensagem e viram links assinados no corpo.
+    anexos, por_link = separar_anexos(anexos)
+    corpo_mensagem = acrescentar_links(corpo_mensagem, por_link)
+    resposta = _enviar_montando(gerenciador, destinatarios, assunto, corpo_mensagem, anexos)
+    if por_link:
+        resposta["anexos_por_link"] = [nome for nome, _ in por_link]
+    return resposta
+
+
+def _enviar_montando(gerenciador, destinatarios: list[str], assunto: str, corpo_mensagem: str, anexos: list[tuple]) -> dict:
+    """Baixa os anexos que vão dentro do email, monta a mensagem e a envia (pelo campo 'raw' ou por upload de mídia)."""
+    if sum(blob.size or 0 for _, blob in anexos) > LIMIAR_MENSAGEM_GRANDE:
+        # Mensagem grande: os anexos vão para arquivos temporários e a mensagem é montada e enviada
+        # em blocos (upload de mídia 'message/rfc822'), sem nunca ficar inteira na memória.
+        with gerenciador.servico() as service, medir("gmail.envio_grande"):
+            return enviar_mensagem_grande(
+                service, destinatarios, assunto, corpo_mensagem, anexos, mapear=mapear_em_paralelo
+            )
+
+    # Mensagem pequena: os anexos são baixados em paralelo e a mensagem vai no campo 'raw'.
+    partes_anexos = baixar_anexos(anexos)
+
+    # 4. Definição dos cabeçalhos e envio
+    with medir("mime.codificacao"):
+        message = montar_mensagem(corpo_mensagem, partes_anexos)
+        definir_cabecalhos(message, destinatarios, assunto)
         # Cria o corpo da requisição para a API do Gmail.
-        create_message = {"raw": encoded_message}
-        
-        # Chama a API para enviar a mensagem.
-        send_message = service.users().messages().send(userId="me", body=create_message).execute()
-        
+        create_message = codificar_mensagem(message)
+
+    # Empresta um serviço pronto do pool e chama a API para enviar a mensagem.
+    with gerenciador.servico() as service, medir("gmail.envio"):
+        return service.users().messages().send(userId="me", body=create_message).execute()
+
+
+def mensagem_de_sucesso(destinatarios: list[str], nomes_dos_arquivos_anexos: Optional[list[str]] = None,
+                        nomes_por_link: Optional[list[str]] = None) -> str:
+    """Constrói a mensagem de sucesso mostrada ao usuário, com os nomes dos anexos (se houver)."""
+    nomes_por_link = nomes_por_link or []
+    if nomes_por_link:
+        # Os arquivos enviados como link são citados à parte.
+        nomes_dos_arquivos_anexos = [nome for nome in nomes_dos_arquivos_anexos or [] if nome not in nomes_por_link]
+    nomes_dos_arquivos_anexos = nomes_dos_arquivos_anexos or []
+    msg_sucesso = f"Email enviado com sucesso para {len(destinatarios)} destinatário(s)."
+    if len(nomes_dos_arquivos_anexos) == 1:
+        msg_sucesso += f" Com o anexo '{os.path.basename(nomes_dos_arquivos_anexos[0])}'."
+    elif nomes_dos_arquivos_anexos:
+        nomes = ", ".join(f"'{os.path.basename(nome)}'" for nome in nomes_dos_arquivos_anexos)
+        msg_sucesso += f" Com os anexos {nomes}."
+    if nomes_por_link:
+        nomes = ", ".join(f"'{os.path.basename(nome)}'" for nome in nomes_por_link)
+        msg_sucesso += (f" Por serem grandes, {nomes} foram enviados como link de download no corpo do email"
+                        f" (válido por {ANEXOS_LINK_VALIDADE_HORAS // 24 or 1} dia(s)).")
+    return msg_sucesso
+
+
+def enviar_email_sync(destinatarios: list[str], assunto: str, corpo_mensagem: str, nomes_dos_arquivos_anexos: Optional[list[str]] = None) -> str:
+    """
+    Versão síncrona (bloqueante) de 'enviar_email'. Deve ser chamada fora do laço de eventos,
+    por exemplo através de 'executar_io("gmail", ...)'. Os argumentos e o retorno são os mesmos.
+    """
+    try:
+        resposta = enviar_mensagem_sync(destinatarios, assunto, corpo_mensagem, nomes_dos_arquivos_anexos)
         # Constrói uma mensagem de sucesso para o usuário.
-        msg_sucesso = f"Email enviado com sucesso para {len(destinatarios)} destinatário(s)."
-        if nome_do_arquivo_anexo:
-            msg_sucesso += f" Com o anexo '{os.path.basename(nome_do_arquivo_anexo)}'."
-            
-        return msg_sucesso
+        return mensagem_de_sucesso(destinatarios, nomes_dos_arquivos_anexos, (resposta or {}).get("anexos_por_link"))
 
+    # Erros esperados (validação, configuração, arquivo inexistente) são devolvidos como estão.
+    except ErroDeEnvio as e:
+        return str(e)
     # Captura qualquer erro inesperado durante o processo de envio.
     except Exception as e:
-        return f"Ocorreu um erro inesperado: {e}"
\ No newline at end of file
+        return f"Ocorreu um erro inesperado: {e}"
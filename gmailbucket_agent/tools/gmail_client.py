@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+
+# --- Importações Padrão ---
+# Importa 'logging' para registrar as falhas da renovação em segundo plano.
+import logging
+# Importa o módulo 'os' para montar os caminhos dos arquivos de credenciais e token.
+import os
+# Importa 'queue' para manter o pool de objetos de serviço prontos para uso.
+import queue
+# Importa 'threading' para proteger o estado compartilhado e rodar a renovação do token em segundo plano.
+import threading
+# Importa 'contextmanager' para oferecer o empréstimo de um serviço com a sintaxe 'with'.
+from contextlib import contextmanager
+# Importa 'Optional' para indicar argumentos opcionais.
+from typing import Optional
+
+# --- Importações do Google ---
+# Classe das credenciais OAuth do Google (usada nas anotações e nas credenciais injetadas).
+from google.oauth2.credentials import Credentials
+# O construtor de serviços ('build') é pesado e só é importado quando usado, para não atrasar a partida do servidor.
+# 'AuthorizedHttp' liga as credenciais a um objeto httplib2 exclusivo de cada serviço.
+from google_auth_httplib2 import AuthorizedHttp
+# O httplib2 não é seguro entre threads, por isso cada serviço do pool tem o seu próprio 'Http'.
+import httplib2
+
+# Importa a medição de duração das etapas (carga do token, criação do serviço).
+from ..metrics import medir
+# Importa o corretor que carrega, renova e grava o token, uma renovação por vez entre threads e processos.
+from .token_broker import CorretorDeToken, CredenciaisCompartilhadas, segundos_ate_expirar
+
+
+# Define os escopos de permissão. Aqui, estamos pedindo permissão apenas para ENVIAR emails em nome do usuário.
+SCOPES = ["https://www.googleapis.com/auth/gmail.send"]
+
+# Caminhos padrão para os arquivos de credenciais e token (na pasta do pacote, como antes).
+_DIRETORIO_PROJETO = os.path.join(os.path.dirname(__file__), "..")
+CREDENTIALS_PATH = os.path.join(_DIRETORIO_PROJETO, "credentials.json")
+TOKEN_PATH = os.path.join(_DIRETORIO_PROJETO, "token.json")
+
+# Quantos objetos 'service' ficam prontos no pool (um por envio simultâneo).
+TAMANHO_POOL_GMAIL = int(os.getenv("GMAIL_POOL_SIZE", "4"))
+# Com quantos segundos de antecedência o token é renovado antes de expirar.
+ANTECEDENCIA_RENOVACAO = int(os.getenv("GMAIL_TOKEN_REFRESH_MARGIN", "300"))
+# Endereço alternativo da API do Gmail (ex: o servidor falso dos benchmarks). Vazio usa o endereço oficial.
+GMAIL_API_ENDPOINT = os.getenv("GMAIL_API_ENDPOINT", "")
+
+logger = logging.getLogger(__name__)
+
+
+class GmailClientManager:
+    """
+    Gerencia, para o processo inteiro, as credenciais do Gmail e um pool de objetos 'service'.
+
+    As credenciais são carregadas uma única vez e renovadas em segundo plano antes de expirar; a carga e
+    todas as renovações (inclusive as pedidas pelo google-auth) passam pelo 'CorretorDeToken'.
+    Os objetos 'service' são criados sob demanda (até 'tamanho_pool') e reaproveitados entre
+    envios, de modo que cada envio paga apenas pela requisição HTTP.
+    """
+
+    def __init__(self, token_path: str = TOKEN_PATH, credentials_path: str = CREDENTIALS_PATH,
+                 tamanho_pool: int = TAMANHO_POOL_GMAIL, antecedencia_renovacao: int = ANTECEDENCIA_RENOVACAO,
+                 credenciais: Optional[Credentials] = None):
+        self.token_path = token_path
+        self.credentials_path = credentials_path
+        self.tamanho_pool = max(1, tamanho_pool)
+        self.antecedencia_renovacao = antecedencia_renovacao
+        # Credenciais podem ser injetadas (ex: em benchmarks); caso contrário são lidas do disco na primeira vez.
+        self._creds = credenciais
+        # Carrega, renova e grava o token (uma renovação por vez, mesmo com vários workers).
+        self._corretor = CorretorDeToken(token_path, credentials_path, SCOPES)
+        # Protege a carga das credenciais.
+        self._lock_creds = threading.Lock()
+        # Pool de serviços livres e contador de quantos já foram criados.
+        self._pool: "queue.LifoQueue" = queue.LifoQueue()
+        self._criados = 0
+        self._lock_pool = threading.Lock()
+        # Thread de renovação em segundo plano (iniciada junto com a primeira carga de credenciais).
+        self._thread_renovacao: Optional[threading.Thread] = None
+        self._parar = threading.Event()
+
+    # --- Credenciais ---
+
+    def _carregar_credenciais(self) -> Credentials:
+        """Lê o token do disco e o renova se necessário (sem token, lança 'ErroDeToken')."""
+        with medir("gmail.token_carga"):
+            return self._corretor.credenciais()
+
+    def credenciais(self) -> Credentials:
+        """Devolve as credenciais do processo, carregando-as na primeira chamada."""
+        if self._creds is None:
+            with self._lock_creds:
+                if self._creds is None:
+                    self._creds = self._carregar_credenciais()
+        self._iniciar_renovacao()
+        return self._creds
+
+    def _segundos_ate_expirar(self) -> Optional[float]:
+        """Quantos segundos faltam para o token atual expirar (None se não houver expiração conhecida)."""
+        return segundos_ate_expirar(self._creds)
+
+    def renovar_se_necessario(self) -> None:
+        """Renova o token se ele estiver dentro da margem de antecedência."""
+        creds = self._creds
+        # Credenciais injetadas não passam pelo corretor (o próprio google-auth as renova, se puder).
+        if not isinstance(creds, CredenciaisCompartilhadas) or not creds.refresh_token:
+            return
+        self._corretor.renovar(antecedencia=self.antecedencia_renovacao)
+
+    def _iniciar_renovacao(self) -> None:
+        """Inicia (uma única vez) a thread que renova o token antes de ele expirar."""
+        if self._thread_renovacao is not None:
+            return
+        with self._lock_pool:
+            if self._thread_renovacao is not None:
+                return
+            self._thread_renovacao = threading.Thread(
+                target=self._laco_renovacao, name="gmail-token-refresh", daemon=True
+            )
+            self._thread_renovacao.start()
+
+    def _laco_renovacao(self) -> None:
+        """Laço da thread de renovação: dorme até a margem de expiração e renova."""
+        while not self._parar.is_set():
+            restante = self._segundos_ate_expirar()
+            if restante is None:
+                espera = 60.0
+            else:
+                espera = max(1.0, restante - self.antecedencia_renovacao)
+            if self._parar.wait(min(espera, 600.0)):
+                return
+            try:
+                self.renovar_se_necessario()
+            except Exception as e:
+                # Uma falha de rede não deve derrubar a thread; tenta de novo em breve.
+                logger.warning("Falha ao renovar o token do Gmail em segundo plano: %s", e)
+                self._parar.wait(30.0)
+
+    # --- Pool de serviços ---
+
+    def _criar_servico(self):
+        """Cria um novo objeto 'service' do Gmail com um 'Http' exclusivo."""
+        with medir("gmail.build"):
+            return self._construir_servico()
+
+    def _construir_servico(self):
+        """Monta o 'Http' autenticado e o objeto 'service' a partir do documento de descoberta."""
+        from googleapiclient.discovery import build
+        http = httplib2.Http()
+        # No upload resumível, a API responde 308 ("continue enviando") sem cabeçalho 'Location';
+        # o httplib2 trataria isso como redirecionamento e falharia a partir do segundo bloco.
+        http.redirect_codes = http.redirect_codes - {308}
+        http = AuthorizedHttp(self.credenciais(), http=http)
+        # 'static_discovery' usa o documento de descoberta que acompanha a biblioteca,
+        # sem ida à rede; 'cache_discovery' é desnecessário nesse modo.
+        opcoes = {"api_endpoint": GMAIL_API_ENDPOINT} if GMAIL_API_ENDPOINT else None
+        return build("gmail", "v1", http=http, static_discovery=True, cache_discovery=False, client_options=opcoes)
+
+    def _emprestar(self):
+        """Retira um serviço do pool, criando um novo se o pool ainda não estiver cheio."""
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock_pool:
+            criar = self._criados < self.tamanho_pool
+            if criar:
+                self._criados += 1
+        if criar:
+            try:
+                return self._criar_servico()
+            except Exception:
+                with self._lock_pool:
+                    self._criados -= 1
+                raise
+        # Pool cheio: espera algum envio devolver o seu serviço.
+        return self._pool.get()
+
+    @contextmanager
+    def servico(self):
+        """
+        Empresta um objeto 'service' do Gmail pelo tempo do bloco 'with'.
+
+        Exemplo:
+            with obter_gerenciador_gmail().servico() as service:
+                service.users().messages().send(userId="me", body=...).execute()
+        """
+        service = self._emprestar()
+        try:
+            yield service
+        finally:
+            self._pool.put(service)
+
+    def encerrar(self) -> None:
+        """Interrompe a thread de renovação (usado em testes e no desligamento do servidor)."""
+        self._parar.set()
+
+
+def novo_lote(service, callback):
+    """
+    Cria uma requisição em lote do Gmail. O 'new_batch_http_request' do serviço usa sempre o 'rootUrl' do
+    documento de descoberta; com GMAIL_API_ENDPOINT, o lote vai para o mesmo endereço dos envios.
+    """
+    if not GMAIL_API_ENDPOINT:
+        return service.new_batch_http_request(callback=callback)
+    from googleapiclient.http import BatchHttpRequest
+    return BatchHttpRequest(callback=callback, batch_uri=GMAIL_API_ENDPOINT.rstrip("/") + "/batch/gmail/v1")
+
+
+# Instância única do processo, criada na primeira utilização.
+_gerenciador: Optional[GmailClientManager] = None
+_lock_gerenciador = threading.Lock()
+
+
+def obter_gerenciador_gmail() -> GmailClientManager:
+    """Devolve o gerenciador de clientes do Gmail compartilhado pelo processo."""
+    global _gerenciador
+    if _gerenciador is None:
+        with _lock_gerenciador:
+            if _gerenciador is None:
+                _gerenciador = GmailClientManager()
+    return _gerenciador
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+
+# --- Importações Padrão ---
+# Importa o módulo 'os' para ler as configurações e manipular nomes de arquivos.
+import os
+# Importa 'base64' para codificar os anexos em blocos, sem carregá-los inteiros na memória.
+import base64
+# Importa 'mimetypes' para adivinhar o tipo de mídia de cada anexo.
+import mimetypes
+# Importa 'tempfile' para montar a mensagem e guardar os anexos baixados em arquivos temporários.
+import tempfile
+# Importa 'uuid' para gerar o separador (boundary) das partes da mensagem.
+import uuid
+# Importa 'Callable', 'BinaryIO' e 'Optional' para as anotações de tipo.
+from typing import BinaryIO, Callable, Optional
+
+# --- Importações de Email ---
+# Usadas apenas para gerar os cabeçalhos (com a codificação correta de acentos); os conteúdos são escritos à parte.
+from email.message import Message
+from email.mime.base import MIMEBase
+from email.mime.text import MIMEText
+from email import policy
+
+# Importa o cache de anexos, cujo nível em disco também serve aos anexos grandes.
+from .attachment_cache import obter_cache_de_anexos
+# Importa a instrumentação (duração das etapas e bytes dos anexos).
+from ..metrics import contar_bytes, medir
+
+# Acima deste total de anexos (em bytes), a mensagem é enviada por upload de mídia (padrão: 5 MiB).
+LIMIAR_MENSAGEM_GRANDE = int(os.getenv("GMAIL_LIMIAR_MENSAGEM_GRANDE", str(5 * 1024 * 1024)))
+# Tamanho de cada bloco do upload para o Gmail (múltiplo de 256 KiB; padrão: 1 MiB).
+GMAIL_UPLOAD_CHUNK_SIZE = max(256 * 1024, int(os.getenv("GMAIL_UPLOAD_CHUNK_SIZE", str(1024 * 1024))) // (256 * 1024) * (256 * 1024))
+
+# Cabeçalhos com CRLF, como exige o formato RFC 822; 'compat32' é a mesma política usada em 'funcs.py'.
+_POLITICA = policy.compat32.clone(linesep="\r\n")
+# O Base64 gera linhas de 76 caracteres a partir de 57 bytes; ler múltiplos de 57 mantém as linhas inteiras.
+_BLOCO_BASE64 = 57 * 1024
+
+
+def _cabecalhos(message: Message) -> bytes:
+    """Serializa apenas os cabeçalhos de uma mensagem (seguidos da linha em branco)."""
+    return b"".join(_POLITICA.fold_binary(nome, valor) for nome, valor in message.items()) + b"\r\n"
+
+
+def escrever_mensagem_rfc822(destino: BinaryIO, destinatarios: list[str], assunto: str, corpo_mensagem: str,
+                             anexos: list[tuple]) -> None:
+    """
+    Escreve uma mensagem multipart completa (RFC 822) em 'destino', lendo cada anexo em blocos.
+
+    Args:
+        destino (BinaryIO): Arquivo onde a mensagem será escrita.
+        destinatarios (list[str]): Os e-mails dos destinatários.
+        assunto (str): O assunto do email.
+        corpo_mensagem (str): O conteúdo de texto do email.
+        anexos (list[tuple]): Pares (nome_do_arquivo, arquivo_aberto), lidos a partir da posição atual.
+    """
+    separador = f"=_{uuid.uuid4().hex}"
+
+    # Cabeçalhos principais, com o mesmo conteúdo dos usados no envio normal.
+    raiz = Message()
+    raiz["Content-Type"] = f'multipart/mixed; boundary="{separador}"'
+    raiz["MIME-Version"] = "1.0"
+    raiz["To"] = ", ".join(destinatarios)
+    raiz["From"] = "me"
+    raiz["Subject"] = assunto
+    destino.write(_cabecalhos(raiz))
+
+    # Primeira parte: o corpo do email (pequeno, montado pela biblioteca padrão).
+    destino.write(f"--{separador}\r\n".encode("ascii"))
+    destino.write(MIMEText(corpo_mensagem, "plain").as_bytes(policy=_POLITICA))
+    destino.write(b"\r\n")
+
+    for nome_do_arquivo, arquivo in anexos:
+        # Tenta adivinhar o tipo de mídia do arquivo; se não conseguir, usa um tipo genérico.
+        content_type, encoding = mimetypes.guess_type(nome_do_arquivo)
+        if content_type is None or encoding is not None:
+            content_type = "application/octet-stream"
+        parte = MIMEBase(*content_type.split("/", 1))
+        parte["Content-Transfer-Encoding"] = "base64"
+        parte.add_header("Content-Disposition", "attachment", filename=os.path.basename(nome_do_arquivo))
+        destino.write(f"--{separador}\r\n".encode("ascii"))
+        destino.write(_cabecalhos(parte))
+        # Codifica o anexo bloco a bloco: só um bloco fica na memória por vez.
+        while True:
+            bloco = arquivo.read(_BLOCO_BASE64)
+            if not bloco:
+                break
+            destino.write(base64.encodebytes(bloco).replace(b"\n", b"\r\n"))
+        destino.write(b"\r\n")
+
+    destino.write(f"--{separador}--\r\n".encode("ascii"))
+
+
+def abrir_anexo_em_arquivo(blob) -> BinaryIO:
+    """
+    Devolve um arquivo aberto com o conteúdo do blob: do cache em disco, se esta geração já estiver lá,
+    ou de um arquivo temporário preenchido por download em streaming (e então copiado para o cache).
+    Faz chamadas bloqueantes diretamente: deve rodar no pool de E/S do GCS.
+    """
+    cache = obter_cache_de_anexos()
+    arquivo = cache.abrir_arquivo(blob.bucket.name, blob.name, blob.generation)
+    if arquivo is not None:
+        contar_bytes("anexo_cache", blob.size)
+        return arquivo
+    arquivo = tempfile.TemporaryFile()
+    try:
+        # O download grava no arquivo em blocos, sem montar o conteúdo inteiro na memória.
+        with medir("gcs.download"):
+            blob.download_to_file(arquivo)
+        contar_bytes("anexo_gcs", blob.size)
+        cache.guardar_arquivo(blob.bucket.name, blob.name, blob.generation, arquivo)
+    except BaseException:
+        arquivo.close()
+        raise
+    arquivo.seek(0)
+    return arquivo
+
+
+def enviar_mensagem_grande(service, destinatarios: list[str], assunto: str, corpo_mensagem: str,
+                           anexos: list[tuple], mapear: Optional[Callable] = None,
+                           tamanho_chunk: int = GMAIL_UPLOAD_CHUNK_SIZE) -> dict:
+    """
+    Envia uma mensagem com anexos grandes sem mantê-la inteira na memória.
+
+    Os anexos são baixados para arquivos (em paralelo, se 'mapear' for informado), a mensagem é
+    escrita em um arquivo temporário e enviada ao Gmail por upload resumível ('message/rfc822'),
+    em blocos de 'tamanho_chunk' bytes, em vez do campo JSON 'raw'.
+
+    Args:
+        service: Um serviço do Gmail emprestado do pool.
+        destinatarios (list[str]): Os e-mails dos destinatários.
+        assunto (str): O assunto do email.
+        corpo_mensagem (str): O conteúdo de texto do email.
+        anexos (list[tuple]): Pares (nome_do_arquivo, blob), como devolvidos por 'obter_metadados_anexos'.
+        mapear (Optional[Callable]): Função 'mapear(func, itens)' para baixar os anexos em paralelo.
+        tamanho_chunk (int): Tamanho de cada bloco do upload.
+
+    Returns:
+        dict: A resposta da API do Gmail (com o 'id' da mensagem enviada).
+    """
+    # 'MediaIoBaseUpload' envia um arquivo para a API em blocos, por upload resumível
+    # (importado aqui porque só as mensagens grandes precisam dele).
+    from googleapiclient.http import MediaIoBaseUpload
+    mapear = mapear or (lambda func, itens: [func(item) for item in itens])
+    arquivos = mapear(lambda anexo: abrir_anexo_em_arquivo(anexo[1]), anexos)
+    try:
+        with tempfile.TemporaryFile() as mensagem:
+            with medir("mime.codificacao"):
+                escrever_mensagem_rfc822(
+                    mensagem, destinatarios, assunto, corpo_mensagem,
+                    [(nome, arquivo) for (nome, _), arquivo in zip(anexos, arquivos)],
+                )
+            mensagem.seek(0)
+            media = MediaIoBaseUpload(mensagem, mimetype="message/rfc822", chunksize=tamanho_chunk, resumable=True)
+            request = service.users().messages().send(userId="me", media_body=media)
+            # Envia um bloco por vez até a API devolver a mensagem criada.
+            resposta = None
+            with medir("gmail.envio"):
+                while resposta is None:
+                    _, resposta = request.next_chunk()
+            return resposta
+    finally:
+        for arquivo in arquivos:
+            arquivo.close()
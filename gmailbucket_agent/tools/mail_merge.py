@@ -0,0 +1,553 @@
+# -*- coding: utf-8 -*-
+
+# --- Importações Padrão ---
+# Importa o módulo 'os' para ler as configurações e reconhecer a extensão do arquivo de contatos.
+import os
+# Importa 're' para encontrar os campos ({nome}) dos modelos de assunto e corpo.
+import re
+# Importa 'csv' e 'json' para interpretar as linhas do arquivo de contatos.
+import csv
+import json
+# Importa 'time' para os horários de reserva e de atualização das campanhas.
+import time
+# Importa 'uuid' para gerar o identificador de cada campanha.
+import uuid
+# Importa 'hashlib' para gerar a chave de idempotência padrão de uma campanha.
+import hashlib
+# Importa 'sqlite3' para guardar as campanhas no mesmo banco da fila de envios.
+import sqlite3
+# Importa 'asyncio' para ler o arquivo e agendar os envios em segundo plano.
+import asyncio
+# Importa 'threading' para proteger a conexão com o banco, usada por várias threads.
+import threading
+# Importa os tipos usados nas anotações.
+from typing import Iterator, Optional
+
+# --- Importações do Google ---
+from google.adk.tools.tool_context import ToolContext
+
+# Importa o cliente único do GCS (o arquivo de contatos fica no bucket dos anexos).
+from ..config import obter_cliente_storage
+# Importa a camada de E/S que executa as chamadas bloqueantes em pools de threads limitados.
+from ..io_executor import executar_io
+# Importa as validações compartilhadas com 'enviar_email'.
+from .funcs import ErroDeEnvio, obter_metadados_anexos, resolver_caminho_anexo, validar_destinatarios
+# Importa a resolução dos apelidos criados pelo upload deduplicado.
+from ..gcs_upload import resolver_apelido
+# Importa a fila de envios: cada linha do arquivo vira um envio dela (com taxa limitada e novas tentativas).
+from .send_queue import (
+    ENVIADO, ENVIANDO, ENVIOS_DB_PATH, PENDENTE, escopo_da_conversa, obter_fila_de_envios, obter_trabalhadores_de_envio,
+)
+
+# Quantas linhas são lidas e agendadas de cada vez (cada lote grava um ponto de retomada).
+MALA_DIRETA_LOTE = max(1, int(os.getenv("MALA_DIRETA_LOTE", "100")))
+# Máximo de envios de uma campanha esperando na fila; acima disso, a leitura do arquivo pausa.
+MALA_DIRETA_JANELA = max(1, int(os.getenv("MALA_DIRETA_JANELA", "500")))
+# Tamanho de cada leitura do arquivo de contatos no GCS, em bytes (padrão: 1 MiB).
+MALA_DIRETA_CHUNK_BYTES = max(256 * 1024, int(os.getenv("MALA_DIRETA_CHUNK_BYTES", str(1024 * 1024))))
+# Por quanto tempo (em segundos) uma campanha fica reservada para o processo que a está lendo.
+MALA_DIRETA_RESERVA = float(os.getenv("MALA_DIRETA_RESERVA", "120"))
+# Quantos exemplos de linhas inválidas são guardados por campanha.
+MALA_DIRETA_ERROS_GUARDADOS = 20
+
+# Formatos aceitos, pela extensão do arquivo.
+FORMATOS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+
+# Situações da leitura de uma campanha (a situação de cada email fica na fila de envios).
+LENDO, AGENDADA, ERRO = "lendo", "agendada", "erro"
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS campanhas (
+    id TEXT PRIMARY KEY,
+    chave_idempotencia TEXT NOT NULL UNIQUE,
+    arquivo TEXT NOT NULL,
+    geracao INTEGER NOT NULL,
+    formato TEXT NOT NULL,
+    colunas TEXT,
+    coluna_email TEXT NOT NULL,
+    assunto TEXT NOT NULL,
+    corpo_mensagem TEXT NOT NULL,
+    anexos TEXT NOT NULL,
+    status TEXT NOT NULL,
+    proxima_linha INTEGER NOT NULL DEFAULT 0,
+    posicao INTEGER NOT NULL DEFAULT 0,
+    agendadas INTEGER NOT NULL DEFAULT 0,
+    invalidas INTEGER NOT NULL DEFAULT 0,
+    erros TEXT NOT NULL DEFAULT '[]',
+    reservado_ate REAL,
+    criado_em REAL NOT NULL,
+    atualizado_em REAL NOT NULL,
+    erro TEXT
+);
+"""
+
+# Um campo do modelo é '{nome_da_coluna}'; '{{' e '}}' produzem chaves literais.
+_CAMPO = re.compile(r"\{\{|\}\}|\{(\w+)\}")
+
+
+def campos_do_modelo(modelo: str) -> set:
+    """Nomes das colunas usadas em um modelo (ex: 'Olá, {nome}' -> {'nome'})."""
+    return {m.group(1) for m in _CAMPO.finditer(modelo) if m.group(1)}
+
+
+def preencher_modelo(modelo: str, valores: dict) -> str:
+    """Substitui cada '{coluna}' pelo valor da linha. Lança KeyError se a coluna não existir."""
+    def trocar(m):
+        if m.group(1) is None:
+            return m.group(0)[0]
+        return valores[m.group(1)]
+    return _CAMPO.sub(trocar, modelo)
+
+
+class LeitorDeContatos:
+    """
+    Lê um arquivo de contatos (CSV com cabeçalho ou JSON Lines) do GCS, registro a registro, em
+    blocos de 'tamanho_bloco' bytes: o arquivo nunca fica inteiro na memória. 'posicao' é o byte
+    logo após o último registro devolvido, e permite retomar a leitura dali sem baixar o começo de novo.
+    Faz chamadas bloqueantes: deve rodar no pool de E/S do GCS.
+    """
+
+    def __init__(self, blob, formato: str, posicao: int = 0, colunas: Optional[list] = None,
+                 tamanho_bloco: int = MALA_DIRETA_CHUNK_BYTES):
+        self.formato = formato
+        self.posicao = posicao
+        self.colunas = colunas
+        self._tamanho_bloco = tamanho_bloco
+        self._arquivo = blob.open("rb", chunk_size=tamanho_bloco)
+        self._arquivo.seek(posicao)
+        self._linhas = self._ler_linhas()
+        self._registros = csv.reader(self._linhas) if formato == "csv" else None
+
+    def _ler_linhas(self) -> Iterator[str]:
+        """Devolve as linhas do arquivo, somando à 'posicao' os bytes de cada linha entregue."""
+        resto = b""
+        while True:
+            bloco = self._arquivo.read(self._tamanho_bloco)
+            if not bloco:
+                break
+            partes = (resto + bloco).split(b"\n")
+            resto = partes.pop()
+            for parte in partes:
+                self.posicao += len(parte) + 1
+                yield self._decodificar(parte) + "\n"
+        if resto:
+            self.posicao += len(resto)
+            yield self._decodificar(resto)
+
+    @staticmethod
+    def _decodificar(linha: bytes) -> str:
+        try:
+            # 'utf-8-sig' descarta o BOM que o Excel coloca no início dos arquivos CSV.
+            return linha.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            raise ErroDeEnvio("Erro: O arquivo de contatos deve estar codificado em UTF-8.")
+
+    def ler_cabecalho(self) -> list:
+        """Lê a primeira linha de um CSV e guarda os nomes das colunas."""
+        self.colunas = [coluna.strip() for coluna in next(self._registros, [])]
+        if not any(self.colunas):
+            raise ErroDeEnvio("Erro: O arquivo CSV está vazio ou não tem uma linha de cabeçalho.")
+        return self.colunas
+
+    def _proximo(self) -> Optional[tuple]:
+        """Próximo registro como (valores, erro); None no fim do arquivo. Linhas em branco são puladas."""
+        if self.formato == "csv":
+            for valores in self._registros:
+                if valores:
+                    return {coluna: valores[i] if i < len(valores) else "" for i, coluna in enumerate(self.colunas)}, None
+            return None
+        for linha in self._linhas:
+            if not linha.strip():
+                continue
+            try:
+                objeto = json.loads(linha)
+            except ValueError as e:
+                return None, f"JSON inválido: {e}"
+            if not isinstance(objeto, dict):
+                return None, "Cada linha do JSON Lines deve ser um objeto."
+            return {chave: "" if valor is None else str(valor) for chave, valor in objeto.items()}, None
+        return None
+
+    def ler(self, quantidade: int) -> list:
+        """Lê até 'quantidade' registros; cada um é (valores, erro). Lista vazia no fim do arquivo."""
+        registros = []
+        while len(registros) < quantidade:
+            registro = self._proximo()
+            if registro is None:
+                break
+            registros.append(registro)
+        return registros
+
+    def fechar(self) -> None:
+        self._arquivo.close()
+
+
+class CampanhasDeMalaDireta:
+    """
+    Guarda as campanhas de mala direta no banco da fila de envios (SQLite, modo WAL).
+
+    Cada campanha tem um ponto de retomada (o número do próximo registro e a sua posição em bytes
+    no arquivo) e uma reserva com prazo: só o processo que a reservou lê o arquivo, e se ele parar,
+    a reserva expira e outro processo (ou o próximo início do servidor) continua de onde ela parou.
+    """
+
+    def __init__(self, caminho: str = ENVIOS_DB_PATH, reserva: float = MALA_DIRETA_RESERVA):
+        self.reserva = reserva
+        if os.path.dirname(caminho):
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(caminho, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        with self._lock:
+            self._db.executescript(_ESQUEMA)
+
+    def _executar(self, funcao):
+        """Executa 'funcao(conexao)' em uma transação exclusiva (com o lock da conexão)."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                resultado = funcao(self._db)
+                self._db.execute("COMMIT")
+                return resultado
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def _como_dict(linha: sqlite3.Row) -> dict:
+        campanha = dict(linha)
+        for campo in ("colunas", "anexos", "erros"):
+            campanha[campo] = json.loads(campanha[campo]) if campanha[campo] else None
+        return campanha
+
+    def criar(self, chave: str, dados: dict) -> tuple:
+        """Cria uma campanha. Devolve (campanha, nova): se a chave já existir, devolve a campanha existente."""
+        agora = time.time()
+
+        def inserir(db):
+            cursor = db.execute(
+                "INSERT OR IGNORE INTO campanhas (id, chave_idempotencia, arquivo, geracao, formato, colunas, coluna_email,"
+                " assunto, corpo_mensagem, anexos, status, posicao, criado_em, atualizado_em)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (uuid.uuid4().hex, chave, dados["arquivo"], dados["geracao"], dados["formato"],
+                 json.dumps(dados["colunas"], ensure_ascii=False) if dados["colunas"] else None,
+                 dados["coluna_email"], dados["assunto"], dados["corpo_mensagem"],
+                 json.dumps(dados["anexos"], ensure_ascii=False), LENDO, dados["posicao"], agora, agora),
+            )
+            linha = db.execute("SELECT * FROM campanhas WHERE chave_idempotencia = ?", (chave,)).fetchone()
+            return self._como_dict(linha), cursor.rowcount == 1
+
+        return self._executar(inserir)
+
+    def consultar(self, id_campanha: str) -> Optional[dict]:
+        with self._lock:
+            linha = self._db.execute("SELECT * FROM campanhas WHERE id = ?", (id_campanha,)).fetchone()
+        return self._como_dict(linha) if linha else None
+
+    def reservar(self, id_campanha: str, reabrir: bool = False) -> Optional[dict]:
+        """
+        Reserva a leitura de uma campanha para este processo. Devolve a campanha, ou None se ela
+        já estiver reservada por outro processo ou não estiver sendo lida ('reabrir' retoma uma com ERRO).
+        """
+        agora = time.time()
+
+        def reservar(db):
+            situacoes = (LENDO, ERRO) if reabrir else (LENDO, LENDO)
+            cursor = db.execute(
+                "UPDATE campanhas SET status = ?, erro = NULL, reservado_ate = ?, atualizado_em = ?"
+                " WHERE id = ? AND status IN (?, ?) AND (reservado_ate IS NULL OR reservado_ate < ?)",
+                (LENDO, agora + self.reserva, agora, id_campanha, *situacoes, agora),
+            )
+            if cursor.rowcount != 1:
+                return None
+            return self._como_dict(db.execute("SELECT * FROM campanhas WHERE id = ?", (id_campanha,)).fetchone())
+
+        return self._executar(reservar)
+
+    def interrompidas(self) -> list:
+        """Ids das campanhas que estavam sendo lidas e cujo processo parou (reserva expirada)."""
+        with self._lock:
+            linhas = self._db.execute(
+                "SELECT id FROM campanhas WHERE status = ? AND (reservado_ate IS NULL OR reservado_ate < ?)",
+                (LENDO, time.time()),
+            ).fetchall()
+        return [linha["id"] for linha in linhas]
+
+    def renovar(self, id_campanha: str) -> None:
+        """Estende a reserva enquanto a leitura espera a fila andar."""
+        agora = time.time()
+        self._executar(lambda db: db.execute(
+            "UPDATE campanhas SET reservado_ate = ? WHERE id = ?", (agora + self.reserva, id_campanha)
+        ))
+
+    def registrar_progresso(self, id_campanha: str, proxima_linha: int, posicao: int,
+                            agendadas: int, erros: list) -> None:
+        """Grava o ponto de retomada depois de um lote agendado (e renova a reserva)."""
+        agora = time.time()
+
+        def atualizar(db):
+            guardados = json.loads(db.execute("SELECT erros FROM campanhas WHERE id = ?", (id_campanha,)).fetchone()[0])
+            guardados = (guardados + erros)[:MALA_DIRETA_ERROS_GUARDADOS]
+            db.execute(
+                "UPDATE campanhas SET proxima_linha = ?, posicao = ?, agendadas = agendadas + ?, invalidas = invalidas + ?,"
+                " erros = ?, reservado_ate = ?, atualizado_em = ? WHERE id = ?",
+                (proxima_linha, posicao, agendadas, len(erros), json.dumps(guardados, ensure_ascii=False),
+                 agora + self.reserva, agora, id_campanha),
+            )
+
+        self._executar(atualizar)
+
+    def finalizar(self, id_campanha: str, situacao: str, erro: Optional[str] = None) -> None:
+        """Encerra a leitura (AGENDADA: o arquivo inteiro está na fila; ERRO: a leitura falhou)."""
+        self._executar(lambda db: db.execute(
+            "UPDATE campanhas SET status = ?, erro = ?, reservado_ate = NULL, atualizado_em = ? WHERE id = ?",
+            (situacao, erro, time.time(), id_campanha),
+        ))
+
+
+def montar_envios(campanha: str, dados: dict, primeira_linha: int, registros: list) -> tuple:
+    """
+    Preenche os modelos com cada registro lido. Devolve (envios, erros): os envios no formato de
+    'FilaDeEnvios.agendar_lote' (a chave é o id da campanha mais o número da linha, então agendar
+    a mesma linha de novo após uma retomada não gera uma segunda cópia) e as linhas inválidas.
+    """
+    envios, erros = [], []
+    for numero, (valores, erro) in enumerate(registros, start=primeira_linha):
+        try:
+            if erro:
+                raise ErroDeEnvio(erro)
+            destinatario = valores.get(dados["coluna_email"], "").strip()
+            validar_destinatarios([destinatario])
+            envios.append({
+                "chave_idempotencia": f"{campanha}:{numero}",
+                "destinatarios": [destinatario],
+                "assunto": preencher_modelo(dados["assunto"], valores),
+                "corpo_mensagem": preencher_modelo(dados["corpo_mensagem"], valores),
+                "nomes_dos_arquivos_anexos": dados["anexos"],
+            })
+        except ErroDeEnvio as e:
+            erros.append({"linha": numero, "erro": str(e)})
+        except KeyError as e:
+            erros.append({"linha": numero, "erro": f"A linha não tem a coluna {e}."})
+    return envios, erros
+
+
+def _abrir_leitor(campanha: dict) -> LeitorDeContatos:
+    """Abre o arquivo da campanha (na geração lida no início) a partir do ponto de retomada."""
+    bucket_name, blob_name = campanha["arquivo"].split("/", 1)
+    blob = obter_cliente_storage().bucket(bucket_name).blob(blob_name, generation=campanha["geracao"])
+    return LeitorDeContatos(blob, campanha["formato"], campanha["posicao"], campanha["colunas"])
+
+
+def _pendentes(id_campanha: str) -> int:
+    """Quantos envios da campanha ainda estão esperando (ou em andamento) na fila."""
+    contagem = obter_fila_de_envios().contagem(id_campanha)
+    return contagem.get(PENDENTE, 0) + contagem.get(ENVIANDO, 0)
+
+
+async def executar_campanha(id_campanha: str, reabrir: bool = False) -> None:
+    """
+    Lê o arquivo da campanha em lotes, a partir do ponto de retomada, e coloca cada linha na fila de envios.
+    A leitura pausa enquanto a campanha tiver MALA_DIRETA_JANELA envios esperando, então o arquivo
+    avança no ritmo em que os emails saem (que é limitado pela taxa e pelos workers da fila).
+    """
+    campanhas = obter_campanhas()
+    campanha = await asyncio.to_thread(campanhas.reservar, id_campanha, reabrir)
+    if campanha is None:
+        return
+    leitor = None
+    try:
+        leitor = await executar_io("gcs", _abrir_leitor, campanha)
+        proxima_linha = campanha["proxima_linha"]
+        while True:
+            while await asyncio.to_thread(_pendentes, id_campanha) >= MALA_DIRETA_JANELA:
+                await asyncio.to_thread(campanhas.renovar, id_campanha)
+                await asyncio.sleep(1)
+            registros = await executar_io("gcs", leitor.ler, MALA_DIRETA_LOTE)
+            if not registros:
+                break
+            envios, erros = montar_envios(id_campanha, campanha, proxima_linha, registros)
+            await asyncio.to_thread(obter_fila_de_envios().agendar_lote, envios, id_campanha)
+            obter_trabalhadores_de_envio().avisar()
+            proxima_linha += len(registros)
+            await asyncio.to_thread(
+                campanhas.registrar_progresso, id_campanha, proxima_linha, leitor.posicao, len(envios), erros
+            )
+        await asyncio.to_thread(campanhas.finalizar, id_campanha, AGENDADA)
+    except asyncio.CancelledError:
+        # O servidor está desligando: a reserva expira e a leitura continua do último lote gravado.
+        raise
+    except Exception as e:
+        await asyncio.to_thread(campanhas.finalizar, id_campanha, ERRO, str(e))
+    finally:
+        if leitor is not None:
+            leitor.fechar()
+
+
+# Instância única do processo e as tarefas de leitura em andamento.
+_campanhas: Optional[CampanhasDeMalaDireta] = None
+_lock_campanhas = threading.Lock()
+_tarefas: set = set()
+
+
+def obter_campanhas() -> CampanhasDeMalaDireta:
+    """Devolve o registro de campanhas compartilhado pelo processo."""
+    global _campanhas
+    if _campanhas is None:
+        with _lock_campanhas:
+            if _campanhas is None:
+                _campanhas = CampanhasDeMalaDireta()
+    return _campanhas
+
+
+def iniciar_leitura(id_campanha: str, reabrir: bool = False) -> None:
+    """Inicia a leitura de uma campanha em segundo plano (deve ser chamado dentro do laço de eventos)."""
+    tarefa = asyncio.create_task(executar_campanha(id_campanha, reabrir), name=f"mala-direta-{id_campanha}")
+    _tarefas.add(tarefa)
+    tarefa.add_done_callback(_tarefas.discard)
+
+
+async def retomar_campanhas_interrompidas() -> None:
+    """Retoma as campanhas cuja leitura parou no meio (usado no 'startup' do servidor)."""
+    for id_campanha in await asyncio.to_thread(obter_campanhas().interrompidas):
+        iniciar_leitura(id_campanha)
+
+
+async def parar_campanhas() -> None:
+    """Interrompe as leituras deste processo; elas continuam do último lote gravado no próximo início."""
+    for tarefa in list(_tarefas):
+        tarefa.cancel()
+    await asyncio.gather(*_tarefas, return_exceptions=True)
+
+
+def _preparar_campanha(arquivo_contatos: str, assunto: str, corpo_mensagem: str, coluna_email: str,
+                       nomes_dos_arquivos_anexos: list) -> dict:
+    """
+    Valida o arquivo e os modelos antes de criar a campanha: lê os metadados do arquivo (e a sua
+    geração, para que uma retomada leia exatamente o mesmo conteúdo) e, no CSV, o cabeçalho.
+    Lança 'ErroDeEnvio' com uma mensagem para o usuário. Roda fora do laço de eventos.
+    """
+    formato = FORMATOS.get(os.path.splitext(arquivo_contatos)[1].lower())
+    if formato is None:
+        raise ErroDeEnvio("Erro: O arquivo de contatos deve ser um .csv (com cabeçalho) ou um .jsonl.")
+    if not assunto.strip() or not corpo_mensagem.strip():
+        raise ErroDeEnvio("Erro: O assunto e o corpo do email não podem ser vazios.")
+    caminho = resolver_caminho_anexo(arquivo_contatos)
+    bucket_name, blob_name = caminho.split("/", 1)
+    blob = obter_cliente_storage().bucket(bucket_name).get_blob(blob_name)
+    # Se o arquivo foi enviado pelo /upload, a campanha lê o conteúdo para o qual o apelido aponta agora.
+    blob = resolver_apelido(blob) if blob is not None else None
+    if blob is None:
+        raise ErroDeEnvio(f"Erro: O arquivo no caminho '{caminho}' não foi encontrado no Google Cloud Storage.")
+    caminho = f"{bucket_name}/{blob.name}"
+    # Os anexos são os mesmos para todos; um anexo inexistente faria todas as linhas falharem.
+    obter_metadados_anexos(nomes_dos_arquivos_anexos)
+
+    colunas, posicao = None, 0
+    if formato == "csv":
+        leitor = LeitorDeContatos(blob, formato, tamanho_bloco=64 * 1024)
+        try:
+            colunas = leitor.ler_cabecalho()
+            posicao = leitor.posicao
+        finally:
+            leitor.fechar()
+        faltando = sorted((campos_do_modelo(assunto) | campos_do_modelo(corpo_mensagem) | {coluna_email}) - set(colunas))
+        if faltando:
+            raise ErroDeEnvio(
+                f"Erro: O arquivo não tem a(s) coluna(s) {', '.join(faltando)}. Colunas disponíveis: {', '.join(colunas)}."
+            )
+    return {
+        "arquivo": caminho, "geracao": blob.generation, "formato": formato, "colunas": colunas, "posicao": posicao,
+        "coluna_email": coluna_email, "assunto": assunto, "corpo_mensagem": corpo_mensagem,
+        "anexos": nomes_dos_arquivos_anexos,
+    }
+
+
+async def iniciar_mala_direta(arquivo_contatos: str, assunto: str, corpo_mensagem: str, coluna_email: str = "email",
+                              nomes_dos_arquivos_anexos: Optional[list[str]] = None,
+                              chave_idempotencia: Optional[str] = None,
+                              tool_context: Optional[ToolContext] = None) -> dict:
+    """
+    Inicia uma mala direta: envia um email personalizado para cada linha de uma lista de contatos guardada no bucket.
+    Use esta ferramenta quando o usuário quiser enviar emails diferentes para muitos contatos de um arquivo
+    (em vez de chamar 'enviar_email' uma vez por contato). A ferramenta responde na hora; os emails saem em segundo plano.
+
+    Args:
+        arquivo_contatos (str): O arquivo de contatos no bucket: um .csv com cabeçalho ou um .jsonl (um objeto por linha).
+        assunto (str): O modelo do assunto. '{coluna}' é trocado pelo valor da coluna em cada linha (ex: "Olá, {nome}").
+        corpo_mensagem (str): O modelo do corpo do email, com os mesmos campos '{coluna}'.
+        coluna_email (str): A coluna com o e-mail do destinatário. Padrão é "email".
+        nomes_dos_arquivos_anexos (Optional[list[str]]): Anexos enviados a todos os contatos. Padrão é None.
+        chave_idempotencia (Optional[str]): Só informe se o usuário quiser de propósito repetir uma campanha idêntica.
+
+    Returns:
+        dict: 'status' ('iniciada' ou 'erro'), o 'id' da campanha para consultar o progresso e se ela já existia ('duplicado').
+    """
+    nomes_dos_arquivos_anexos = nomes_dos_arquivos_anexos or []
+    try:
+        dados = await asyncio.to_thread(
+            _preparar_campanha, arquivo_contatos, assunto, corpo_mensagem, coluna_email, nomes_dos_arquivos_anexos
+        )
+    except ErroDeEnvio as e:
+        return {"status": "erro", "erro": str(e)}
+    except Exception as e:
+        return {"status": "erro", "erro": f"Ocorreu um erro inesperado: {e}"}
+
+    if not chave_idempotencia:
+        # Por padrão, a mesma campanha (arquivo, modelos e anexos) na mesma conversa é uma só.
+        conteudo = json.dumps([escopo_da_conversa(tool_context), dados["arquivo"], dados["geracao"], assunto, corpo_mensagem,
+                               coluna_email, nomes_dos_arquivos_anexos], ensure_ascii=False)
+        chave_idempotencia = hashlib.sha256(conteudo.encode("utf-8")).hexdigest()
+    try:
+        campanha, nova = await asyncio.to_thread(obter_campanhas().criar, chave_idempotencia, dados)
+    except Exception as e:
+        return {"status": "erro", "erro": f"Ocorreu um erro inesperado: {e}"}
+    if nova:
+        iniciar_leitura(campanha["id"])
+    return {"status": "iniciada", "id": campanha["id"], "duplicado": not nova}
+
+
+async def consultar_mala_direta(id_campanha: str) -> dict:
+    """
+    Consulta o progresso de uma mala direta iniciada com 'iniciar_mala_direta'.
+
+    Args:
+        id_campanha (str): O 'id' devolvido por 'iniciar_mala_direta'.
+
+    Returns:
+        dict: A situação da leitura do arquivo ('lendo', 'agendada' ou 'erro'), as linhas lidas, agendadas e inválidas
+              (com exemplos), a quantidade de emails em cada situação da fila e se a campanha terminou ('concluida').
+    """
+    campanha = await asyncio.to_thread(obter_campanhas().consultar, id_campanha)
+    if campanha is None:
+        return {"status": "erro", "erro": f"Erro: Nenhuma campanha encontrada com o id '{id_campanha}'."}
+    envios = await asyncio.to_thread(obter_fila_de_envios().contagem, id_campanha)
+    return {
+        "status": "sucesso", "id": campanha["id"], "situacao": campanha["status"], "arquivo": campanha["arquivo"],
+        "linhas_lidas": campanha["proxima_linha"], "agendadas": campanha["agendadas"],
+        "invalidas": campanha["invalidas"], "exemplos_de_linhas_invalidas": campanha["erros"],
+        "envios": envios, "enviados": envios.get(ENVIADO, 0), "erro": campanha["erro"],
+        "concluida": campanha["status"] == AGENDADA and not envios.get(PENDENTE) and not envios.get(ENVIANDO),
+    }
+
+
+async def retomar_mala_direta(id_campanha: str) -> dict:
+    """
+    Retoma a leitura de uma mala direta que parou com erro (ex: falha temporária do Google Cloud Storage),
+    a partir da última linha agendada. Linhas já agendadas não são enviadas de novo.
+
+    Args:
+        id_campanha (str): O 'id' devolvido por 'iniciar_mala_direta'.
+
+    Returns:
+        dict: 'status' ('retomada' ou 'erro') e a situação atual da campanha.
+    """
+    campanha = await asyncio.to_thread(obter_campanhas().consultar, id_campanha)
+    if campanha is None:
+        return {"status": "erro", "erro": f"Erro: Nenhuma campanha encontrada com o id '{id_campanha}'."}
+    if campanha["status"] == AGENDADA:
+        return {"status": "erro", "erro": "Erro: Todas as linhas desta campanha já foram agendadas."}
+    iniciar_leitura(id_campanha, reabrir=True)
+    return {"status": "retomada", "id": id_campanha, "linhas_lidas": campanha["proxima_linha"]}
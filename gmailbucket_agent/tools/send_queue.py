@@ -0,0 +1,505 @@
+# -*- coding: utf-8 -*-
+
+# --- Importações Padrão ---
+# Importa o módulo 'os' para ler as configurações e criar a pasta do banco de dados.
+import os
+# Importa 'json' para guardar os dados de cada email na fila.
+import json
+# Importa 'time' para os horários de agendamento e de nova tentativa.
+import time
+# Importa 'uuid' para gerar o identificador de cada envio.
+import uuid
+# Importa 'random' para o "jitter" (variação aleatória) das esperas entre tentativas.
+import random
+# Importa 'socket' para reconhecer falhas de conexão em que nada chegou a ser enviado.
+import socket
+# Importa 'hashlib' para gerar a chave de idempotência padrão a partir do conteúdo do email.
+import hashlib
+# Importa 'sqlite3', o banco de dados embutido que guarda a fila em disco.
+import sqlite3
+# Importa 'asyncio' para os workers que esvaziam a fila sem bloquear o servidor.
+import asyncio
+# Importa 'threading' para proteger a conexão com o banco, usada por várias threads.
+import threading
+# Importa 'logging' para registrar as falhas do laço dos workers.
+import logging
+# Importa os tipos usados nas anotações.
+from typing import Optional
+
+# --- Importações do Google ---
+import httplib2
+from google.api_core import exceptions as gcs_exceptions
+from google.adk.tools.tool_context import ToolContext
+from googleapiclient.errors import HttpError
+
+# Importa o envio de um email (que lança as exceções) e as validações compartilhadas.
+from .funcs import ErroDeEnvio, enviar_mensagem_sync, validar_destinatarios
+# Importa a camada de E/S que executa as chamadas bloqueantes em pools de threads limitados.
+from ..io_executor import executar_io
+
+# Caminho do banco SQLite da fila (compartilhado por todos os workers do servidor).
+ENVIOS_DB_PATH = os.getenv(
+    "ENVIOS_DB_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".dados", "envios.db"),
+)
+# Quantos envios cada processo faz ao mesmo tempo.
+ENVIOS_WORKERS = max(1, int(os.getenv("ENVIOS_WORKERS", "2")))
+# Taxa sustentada (envios por segundo) e rajada máxima do balde de fichas, somando todos os processos.
+# Cada 'messages.send' custa 100 das 250 unidades de cota por segundo de um usuário do Gmail.
+ENVIOS_POR_SEGUNDO = float(os.getenv("ENVIOS_POR_SEGUNDO", "2"))
+ENVIOS_RAJADA = float(os.getenv("ENVIOS_RAJADA", "5"))
+# Número máximo de tentativas e limites da espera exponencial entre elas (em segundos).
+ENVIOS_MAX_TENTATIVAS = int(os.getenv("ENVIOS_MAX_TENTATIVAS", "8"))
+ENVIOS_ESPERA_BASE = float(os.getenv("ENVIOS_ESPERA_BASE", "2"))
+ENVIOS_ESPERA_MAX = float(os.getenv("ENVIOS_ESPERA_MAX", "300"))
+# Por quanto tempo (em segundos) um envio fica reservado para o worker que o pegou.
+ENVIOS_RESERVA = float(os.getenv("ENVIOS_RESERVA", "600"))
+# Intervalo (em segundos) entre as consultas à fila quando ela está vazia.
+ENVIOS_INTERVALO = float(os.getenv("ENVIOS_INTERVALO", "1"))
+
+# Chave do estado da sessão com o escopo das chaves de idempotência padrão (um identificador por conversa).
+CHAVE_ESCOPO = "idempotencia_escopo"
+
+logger = logging.getLogger(__name__)
+
+# Situações possíveis de um envio.
+PENDENTE, ENVIANDO, ENVIADO, FALHOU, INCERTO = "pendente", "enviando", "enviado", "falhou", "incerto"
+# Situações em que o envio não muda mais sozinho.
+SITUACOES_FINAIS = (ENVIADO, FALHOU, INCERTO)
+
+# Respostas do Gmail que indicam que o email não foi aceito e pode ser enviado de novo.
+_STATUS_TEMPORARIOS = {429, 500, 502, 503, 504}
+# Erros do GCS (ao ler os anexos, antes do envio) que valem uma nova tentativa.
+_ERROS_GCS_TEMPORARIOS = (
+    gcs_exceptions.TooManyRequests, gcs_exceptions.InternalServerError, gcs_exceptions.BadGateway,
+    gcs_exceptions.ServiceUnavailable, gcs_exceptions.GatewayTimeout,
+)
+# Falhas de conexão em que a requisição nem chegou ao servidor.
+_ERROS_SEM_ENVIO = (ConnectionRefusedError, socket.gaierror, httplib2.ServerNotFoundError)
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS envios (
+    id TEXT PRIMARY KEY,
+    chave_idempotencia TEXT NOT NULL UNIQUE,
+    dados TEXT NOT NULL,
+    status TEXT NOT NULL,
+    tentativas INTEGER NOT NULL DEFAULT 0,
+    proxima_tentativa REAL NOT NULL,
+    reservado_ate REAL,
+    criado_em REAL NOT NULL,
+    atualizado_em REAL NOT NULL,
+    gmail_id TEXT,
+    erro TEXT,
+    campanha TEXT
+);
+CREATE INDEX IF NOT EXISTS envios_prontos ON envios (status, proxima_tentativa);
+CREATE TABLE IF NOT EXISTS balde (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    fichas REAL NOT NULL,
+    atualizado_em REAL NOT NULL
+);
+"""
+
+
+def chave_padrao(destinatarios: list[str], assunto: str, corpo_mensagem: str,
+                 nomes_dos_arquivos_anexos: Optional[list[str]], escopo: str = "") -> str:
+    """Chave de idempotência derivada do conteúdo do email (e de um escopo, como o id da sessão)."""
+    conteudo = json.dumps(
+        [escopo, [d.strip().lower() for d in destinatarios], assunto, corpo_mensagem, nomes_dos_arquivos_anexos or []],
+        ensure_ascii=False, sort_keys=True,
+    )
+    return hashlib.sha256(conteudo.encode("utf-8")).hexdigest()
+
+
+def escopo_da_conversa(tool_context: Optional[ToolContext]) -> str:
+    """
+    Identificador da conversa para as chaves de idempotência padrão, guardado no estado da sessão pela interface
+    pública do 'ToolContext' (criado na primeira chamada de uma ferramenta de envio). Sem contexto, é vazio.
+    """
+    if tool_context is None:
+        return ""
+    escopo = tool_context.state.get(CHAVE_ESCOPO)
+    if not escopo:
+        escopo = uuid.uuid4().hex
+        tool_context.state[CHAVE_ESCOPO] = escopo
+    return escopo
+
+
+def espera_exponencial(tentativa: int, base: float = ENVIOS_ESPERA_BASE, maximo: float = ENVIOS_ESPERA_MAX) -> float:
+    """Espera antes da próxima tentativa: exponencial, com "jitter" completo (entre 0 e o teto)."""
+    return random.uniform(0, min(maximo, base * (2 ** max(0, tentativa - 1))))
+
+
+def classificar_erro(erro: Exception) -> tuple:
+    """
+    Decide o que fazer com um envio que falhou. Devolve (situação, espera_sugerida):
+    PENDENTE para tentar de novo, FALHOU para desistir e INCERTO quando a requisição pode ter
+    chegado ao Gmail (nesse caso o email nunca é reenviado automaticamente, para não duplicá-lo).
+    """
+    if isinstance(erro, HttpError):
+        if erro.resp.status in _STATUS_TEMPORARIOS:
+            retry_after = erro.resp.get("retry-after")
+            return PENDENTE, float(retry_after) if retry_after and retry_after.isdigit() else None
+        return FALHOU, None
+    if isinstance(erro, _ERROS_GCS_TEMPORARIOS) or isinstance(erro, _ERROS_SEM_ENVIO):
+        return PENDENTE, None
+    if isinstance(erro, OSError):
+        # Tempo esgotado ou conexão interrompida no meio da requisição: não há como saber se o email saiu.
+        return INCERTO, None
+    return FALHOU, None
+
+
+class FilaDeEnvios:
+    """
+    Fila de envios persistida em SQLite (modo WAL), compartilhada entre os processos do servidor.
+
+    Cada envio tem uma chave de idempotência única: agendar o mesmo email duas vezes devolve o
+    envio já existente. A taxa de envio é limitada por um balde de fichas guardado no próprio banco,
+    de modo que o limite vale para todos os processos juntos.
+    """
+
+    def __init__(self, caminho: str = ENVIOS_DB_PATH, por_segundo: float = ENVIOS_POR_SEGUNDO,
+                 rajada: float = ENVIOS_RAJADA, max_tentativas: int = ENVIOS_MAX_TENTATIVAS,
+                 reserva: float = ENVIOS_RESERVA):
+        self.caminho = caminho
+        self.por_segundo = por_segundo
+        self.rajada = max(1.0, rajada)
+        self.max_tentativas = max_tentativas
+        self.reserva = reserva
+        if os.path.dirname(caminho):
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(caminho, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        with self._lock:
+            self._db.executescript(_ESQUEMA)
+            # Bancos criados antes da mala direta não têm a coluna 'campanha'.
+            colunas = {linha["name"] for linha in self._db.execute("PRAGMA table_info(envios)")}
+            if "campanha" not in colunas:
+                self._db.execute("ALTER TABLE envios ADD COLUMN campanha TEXT")
+            self._db.execute("CREATE INDEX IF NOT EXISTS envios_campanha ON envios (campanha, status)")
+            self._db.execute(
+                "INSERT OR IGNORE INTO balde (id, fichas, atualizado_em) VALUES (1, ?, ?)", (self.rajada, time.time())
+            )
+
+    def _executar(self, funcao):
+        """Executa 'funcao(conexao)' em uma transação exclusiva (com o lock da conexão)."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                resultado = funcao(self._db)
+                self._db.execute("COMMIT")
+                return resultado
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def _como_dict(linha: sqlite3.Row) -> dict:
+        """Converte uma linha da tabela no formato devolvido pela API (sem os campos internos)."""
+        envio = dict(linha)
+        envio.update(json.loads(envio.pop("dados")))
+        envio.pop("reservado_ate", None)
+        return envio
+
+    def agendar(self, destinatarios: list[str], assunto: str, corpo_mensagem: str,
+                nomes_dos_arquivos_anexos: Optional[list[str]] = None,
+                chave_idempotencia: Optional[str] = None) -> tuple:
+        """
+        Coloca um email na fila. Devolve (envio, novo): se a chave já existir, devolve o envio
+        existente (em qualquer situação) e 'novo' é False.
+        """
+        chave = chave_idempotencia or chave_padrao(destinatarios, assunto, corpo_mensagem, nomes_dos_arquivos_anexos)
+        dados = json.dumps({
+            "destinatarios": destinatarios, "assunto": assunto, "corpo_mensagem": corpo_mensagem,
+            "nomes_dos_arquivos_anexos": nomes_dos_arquivos_anexos or [],
+        }, ensure_ascii=False)
+        agora = time.time()
+
+        def inserir(db):
+            cursor = db.execute(
+                "INSERT OR IGNORE INTO envios (id, chave_idempotencia, dados, status, proxima_tentativa, criado_em, atualizado_em)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (uuid.uuid4().hex, chave, dados, PENDENTE, agora, agora, agora),
+            )
+            linha = db.execute("SELECT * FROM envios WHERE chave_idempotencia = ?", (chave,)).fetchone()
+            return self._como_dict(linha), cursor.rowcount == 1
+
+        return self._executar(inserir)
+
+    def agendar_lote(self, envios: list[dict], campanha: Optional[str] = None) -> int:
+        """
+        Coloca vários emails na fila em uma única transação. Cada item tem 'chave_idempotencia',
+        'destinatarios', 'assunto', 'corpo_mensagem' e 'nomes_dos_arquivos_anexos'.
+        Chaves já existentes são ignoradas. Devolve quantos envios novos entraram na fila.
+        """
+        agora = time.time()
+        linhas = [
+            (uuid.uuid4().hex, envio["chave_idempotencia"], json.dumps({
+                "destinatarios": envio["destinatarios"], "assunto": envio["assunto"],
+                "corpo_mensagem": envio["corpo_mensagem"],
+                "nomes_dos_arquivos_anexos": envio.get("nomes_dos_arquivos_anexos") or [],
+            }, ensure_ascii=False), PENDENTE, agora, agora, agora, campanha)
+            for envio in envios
+        ]
+
+        def inserir(db):
+            antes = db.total_changes
+            db.executemany(
+                "INSERT OR IGNORE INTO envios (id, chave_idempotencia, dados, status, proxima_tentativa, criado_em, atualizado_em, campanha)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                linhas,
+            )
+            return db.total_changes - antes
+
+        return self._executar(inserir) if linhas else 0
+
+    def consultar(self, id_envio: str) -> Optional[dict]:
+        """Devolve um envio pelo id, ou None se ele não existir."""
+        with self._lock:
+            linha = self._db.execute("SELECT * FROM envios WHERE id = ?", (id_envio,)).fetchone()
+        return self._como_dict(linha) if linha else None
+
+    def contagem(self, campanha: Optional[str] = None) -> dict:
+        """Quantidade de envios em cada situação (de todos, ou só os de uma campanha de mala direta)."""
+        with self._lock:
+            if campanha is None:
+                linhas = self._db.execute("SELECT status, COUNT(*) FROM envios GROUP BY status").fetchall()
+            else:
+                linhas = self._db.execute(
+                    "SELECT status, COUNT(*) FROM envios WHERE campanha = ? GROUP BY status", (campanha,)
+                ).fetchall()
+        return {status: quantidade for status, quantidade in linhas}
+
+    def reservar(self) -> tuple:
+        """
+        Pega o próximo envio pronto, se houver uma ficha no balde. Devolve (envio, espera):
+        o envio reservado (ou None) e, se não houver, quantos segundos vale a pena esperar.
+        Envios cuja reserva expirou (o worker que os pegou parou no meio) viram INCERTO.
+        """
+        agora = time.time()
+
+        def reservar_proximo(db):
+            db.execute(
+                "UPDATE envios SET status = ?, erro = ?, atualizado_em = ? WHERE status = ? AND reservado_ate < ?",
+                (INCERTO, "O envio foi interrompido; não é possível saber se o email saiu.", agora, ENVIANDO, agora),
+            )
+            linha = db.execute(
+                "SELECT * FROM envios WHERE status = ? ORDER BY proxima_tentativa LIMIT 1", (PENDENTE,)
+            ).fetchone()
+            if linha is None:
+                return None, ENVIOS_INTERVALO
+            if linha["proxima_tentativa"] > agora:
+                return None, min(ENVIOS_INTERVALO, linha["proxima_tentativa"] - agora)
+            # Reabastece o balde pelo tempo passado e consome uma ficha.
+            fichas, atualizado_em = db.execute("SELECT fichas, atualizado_em FROM balde WHERE id = 1").fetchone()
+            fichas = min(self.rajada, fichas + (agora - atualizado_em) * self.por_segundo)
+            if fichas < 1:
+                db.execute("UPDATE balde SET fichas = ?, atualizado_em = ? WHERE id = 1", (fichas, agora))
+                return None, (1 - fichas) / self.por_segundo
+            db.execute("UPDATE balde SET fichas = ?, atualizado_em = ? WHERE id = 1", (fichas - 1, agora))
+            db.execute(
+                "UPDATE envios SET status = ?, tentativas = tentativas + 1, reservado_ate = ?, atualizado_em = ? WHERE id = ?",
+                (ENVIANDO, agora + self.reserva, agora, linha["id"]),
+            )
+            envio = self._como_dict(linha)
+            envio["tentativas"] += 1
+            return envio, 0.0
+
+        return self._executar(reservar_proximo)
+
+    def concluir(self, id_envio: str, gmail_id: Optional[str]) -> None:
+        """Marca um envio como ENVIADO."""
+        self._executar(lambda db: db.execute(
+            "UPDATE envios SET status = ?, gmail_id = ?, erro = NULL, reservado_ate = NULL, atualizado_em = ? WHERE id = ?",
+            (ENVIADO, gmail_id, time.time(), id_envio),
+        ))
+
+    def registrar_falha(self, envio: dict, erro: Exception) -> str:
+        """Registra a falha de uma tentativa e devolve a nova situação do envio."""
+        situacao, espera = classificar_erro(erro)
+        agora = time.time()
+        if situacao == PENDENTE and envio["tentativas"] >= self.max_tentativas:
+            situacao = FALHOU
+        if espera is None:
+            espera = espera_exponencial(envio["tentativas"])
+
+        def atualizar(db):
+            db.execute(
+                "UPDATE envios SET status = ?, erro = ?, proxima_tentativa = ?, reservado_ate = NULL, atualizado_em = ? WHERE id = ?",
+                (situacao, str(erro), agora + espera, agora, envio["id"]),
+            )
+            if isinstance(erro, HttpError) and erro.resp.status == 429:
+                # Cota estourada: esvazia o balde, para que nenhum worker envie antes da espera.
+                db.execute("UPDATE balde SET fichas = ?, atualizado_em = ? WHERE id = 1",
+                           (-espera * self.por_segundo, agora))
+
+        self._executar(atualizar)
+        return situacao
+
+
+def _enviar_agendado(envio: dict) -> dict:
+    """Envia um email da fila (bloqueante; roda no pool de E/S do Gmail)."""
+    return enviar_mensagem_sync(
+        envio["destinatarios"], envio["assunto"], envio["corpo_mensagem"], envio["nomes_dos_arquivos_anexos"]
+    )
+
+
+class TrabalhadoresDeEnvio:
+    """Conjunto de tarefas asyncio que esvaziam a fila, cada uma enviando um email por vez."""
+
+    def __init__(self, fila: FilaDeEnvios, quantidade: int = ENVIOS_WORKERS):
+        self.fila = fila
+        self.quantidade = quantidade
+        self._tarefas: list = []
+        # Acordado quando um email é agendado neste processo, para não esperar a próxima consulta.
+        self._novo_envio: Optional[asyncio.Event] = None
+
+    def iniciar(self) -> None:
+        """Inicia as tarefas (deve ser chamado dentro do laço de eventos, por exemplo no 'startup')."""
+        if self._tarefas:
+            return
+        self._novo_envio = asyncio.Event()
+        self._tarefas = [asyncio.create_task(self._trabalhar(), name=f"envio-{i}") for i in range(self.quantidade)]
+
+    async def parar(self) -> None:
+        """Cancela as tarefas. Um envio interrompido no meio vira INCERTO quando a sua reserva expirar."""
+        for tarefa in self._tarefas:
+            tarefa.cancel()
+        await asyncio.gather(*self._tarefas, return_exceptions=True)
+        self._tarefas = []
+
+    def avisar(self) -> None:
+        """Avisa os workers de que há um envio novo na fila."""
+        if self._novo_envio is not None:
+            self._novo_envio.set()
+
+    async def _trabalhar(self) -> None:
+        while True:
+            try:
+                envio, espera = await asyncio.to_thread(self.fila.reservar)
+            except Exception:
+                logger.exception("Falha ao consultar a fila de envios; nova consulta em %.1fs.", ENVIOS_INTERVALO)
+                envio, espera = None, ENVIOS_INTERVALO
+            if envio is None:
+                self._novo_envio.clear()
+                try:
+                    await asyncio.wait_for(self._novo_envio.wait(), timeout=max(0.01, espera))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                resposta = await executar_io("gmail", _enviar_agendado, envio)
+            except Exception as e:
+                logger.warning("Falha no envio %s (tentativa %s): %s", envio["id"], envio.get("tentativas"), e)
+                resultado = (self.fila.registrar_falha, envio, e)
+            else:
+                resultado = (self.fila.concluir, envio["id"], (resposta or {}).get("id"))
+            try:
+                await asyncio.to_thread(*resultado)
+            except Exception:
+                # A reserva expira e o envio vira INCERTO (não é reenviado às cegas); o worker segue para o próximo.
+                logger.exception("Falha ao registrar o resultado do envio %s na fila.", envio["id"])
+
+
+# Instâncias únicas do processo, criadas na primeira utilização.
+_fila: Optional[FilaDeEnvios] = None
+_trabalhadores: Optional[TrabalhadoresDeEnvio] = None
+_lock_instancias = threading.Lock()
+
+
+def obter_fila_de_envios() -> FilaDeEnvios:
+    """Devolve a fila de envios compartilhada pelo processo."""
+    global _fila
+    if _fila is None:
+        with _lock_instancias:
+            if _fila is None:
+                _fila = FilaDeEnvios()
+    return _fila
+
+
+def obter_trabalhadores_de_envio() -> TrabalhadoresDeEnvio:
+    """Devolve o conjunto de workers da fila deste processo."""
+    global _trabalhadores
+    if _trabalhadores is None:
+        fila = obter_fila_de_envios()
+        with _lock_instancias:
+            if _trabalhadores is None:
+                _trabalhadores = TrabalhadoresDeEnvio(fila)
+    return _trabalhadores
+
+
+async def aguardar_envio(id_envio: str, prazo: float, intervalo: float = 0.2) -> Optional[dict]:
+    """
+    Espera (por até 'prazo' segundos) um envio chegar a uma situação final e o devolve; depois do prazo,
+    devolve o envio como estiver (ele continua na fila). None se o envio não existir.
+    """
+    fila = obter_fila_de_envios()
+    limite = time.monotonic() + prazo
+    while True:
+        envio = await asyncio.to_thread(fila.consultar, id_envio)
+        if envio is None or envio["status"] in SITUACOES_FINAIS or time.monotonic() >= limite:
+            return envio
+        await asyncio.sleep(min(intervalo, max(0.0, limite - time.monotonic())))
+
+
+async def agendar_email(destinatarios: list[str], assunto: str, corpo_mensagem: str,
+                        nomes_dos_arquivos_anexos: Optional[list[str]] = None,
+                        chave_idempotencia: Optional[str] = None,
+                        tool_context: Optional[ToolContext] = None) -> dict:
+    """
+    Coloca um email na fila de envio e responde na hora, sem esperar o Gmail.
+    O email é enviado em segundo plano, respeitando a cota do Gmail e tentando de novo em caso de falha temporária.
+    Agendar o mesmo email de novo na mesma conversa não gera uma segunda cópia.
+
+    Args:
+        destinatarios (list[str]): Uma lista de e-mails dos destinatários.
+        assunto (str): O assunto do email.
+        corpo_mensagem (str): O conteúdo de texto do email.
+        nomes_dos_arquivos_anexos (Optional[list[str]]): Os nomes dos arquivos (ex: ["relatorio.pdf"]) ou os caminhos
+                                             completos no GCS (ex: "meu-bucket/pasta/arquivo.pdf"). Padrão é None.
+        chave_idempotencia (Optional[str]): Identificador único deste envio. Só informe se o usuário quiser
+                                             enviar de propósito outra cópia de um email idêntico já agendado.
+
+    Returns:
+        dict: 'status' ('agendado' ou 'erro'), o 'id' do envio para consultar a situação e se ele já existia ('duplicado').
+    """
+    try:
+        validar_destinatarios(destinatarios)
+    except ErroDeEnvio as e:
+        return {"status": "erro", "erro": str(e)}
+    if not chave_idempotencia:
+        # Por padrão, o mesmo conteúdo na mesma conversa é o mesmo envio.
+        chave_idempotencia = chave_padrao(
+            destinatarios, assunto, corpo_mensagem, nomes_dos_arquivos_anexos, escopo_da_conversa(tool_context)
+        )
+    try:
+        envio, novo = await asyncio.to_thread(
+            obter_fila_de_envios().agendar, destinatarios, assunto, corpo_mensagem,
+            nomes_dos_arquivos_anexos, chave_idempotencia,
+        )
+    except Exception as e:
+        return {"status": "erro", "erro": f"Ocorreu um erro inesperado: {e}"}
+    obter_trabalhadores_de_envio().avisar()
+    return {"status": "agendado", "id": envio["id"], "situacao": envio["status"], "duplicado": not novo}
+
+
+async def consultar_envio(id_envio: str) -> dict:
+    """
+    Consulta a situação de um email agendado com 'agendar_email'.
+
+    Args:
+        id_envio (str): O 'id' devolvido por 'agendar_email'.
+
+    Returns:
+        dict: A situação ('pendente', 'enviando', 'enviado', 'falhou' ou 'incerto'), as tentativas e o último erro, se houver.
+    """
+    envio = await asyncio.to_thread(obter_fila_de_envios().consultar, id_envio)
+    if envio is None:
+        return {"status": "erro", "erro": f"Erro: Nenhum envio encontrado com o id '{id_envio}'."}
+    return {
+        "status": "sucesso", "id": envio["id"], "situacao": envio["status"], "tentativas": envio["tentativas"],
+        "destinatarios": envio["destinatarios"], "assunto": envio["assunto"], "erro": envio["erro"],
+    }
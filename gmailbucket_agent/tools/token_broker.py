@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+
+# --- Importações Padrão ---
+# Importa o módulo 'os' para ler as configurações e trocar o token.json de forma atômica ('os.replace').
+import os
+# Importa 'json' para ler e validar o conteúdo do token.json.
+import json
+# Importa 'time' para esperar (por tentativas) a trava do arquivo mantida por outro processo.
+import time
+# Importa 'tempfile' para gravar o token novo em um arquivo temporário ao lado do definitivo.
+import tempfile
+# Importa 'threading' para garantir uma única renovação por vez dentro do processo.
+import threading
+# Importa 'datetime' para calcular quanto tempo falta para o token expirar.
+import datetime
+# Importa 'contextmanager' para oferecer a trava do arquivo com a sintaxe 'with'.
+from contextlib import contextmanager
+# Importa os tipos usados nas anotações.
+from typing import Optional
+
+# A trava entre processos usa 'fcntl' (Linux/macOS) ou, no Windows, 'msvcrt'.
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - só no Windows
+    fcntl = None
+    import msvcrt
+
+# --- Importações do Google ---
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+
+# Importa a medição de duração das etapas (a renovação do token e a espera pela trava).
+from ..metrics import medir
+
+# Quanto tempo (em segundos) esperar pela trava do token.json mantida por outro processo.
+GMAIL_TOKEN_TRAVA_ESPERA = float(os.getenv("GMAIL_TOKEN_TRAVA_ESPERA_S", "30"))
+# Um token com menos que isto (em segundos) de validade é tratado como vencido. Fica acima da folga de
+# 3min45s do google-auth, para que um token adotado de outro processo não seja renovado de novo na hora.
+VALIDADE_MINIMA = 240
+
+
+class ErroDeToken(Exception):
+    """Token do Gmail ausente, corrompido ou inacessível; a mensagem explica como resolver."""
+
+
+def segundos_ate_expirar(creds: Optional[Credentials]) -> Optional[float]:
+    """Quantos segundos faltam para o token expirar (None se não houver expiração conhecida)."""
+    expiry = getattr(creds, "expiry", None)
+    if expiry is None:
+        return None
+    # 'expiry' das credenciais do google-auth é um datetime UTC "ingênuo" (sem tzinfo).
+    agora = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    return (expiry - agora).total_seconds()
+
+
+def _vale_por(creds: Optional[Credentials], segundos: float) -> bool:
+    """Se há token e ele ainda vale por mais de 'segundos' (sem expiração conhecida, vale sempre)."""
+    if creds is None or not creds.token:
+        return False
+    restante = segundos_ate_expirar(creds)
+    return restante is None or restante > segundos
+
+
+class CredenciaisCompartilhadas(Credentials):
+    """
+    Credenciais OAuth cuja renovação passa pelo 'CorretorDeToken'.
+
+    O google-auth chama 'refresh' sozinho quando o token vence (antes de cada requisição) e quando a API
+    responde 401. Todos os serviços do pool usam o mesmo objeto, e o corretor atualiza esse objeto no
+    lugar: quem chega depois de uma renovação já encontra o token novo, sem pedir outro.
+    """
+
+    _corretor: Optional["CorretorDeToken"] = None
+
+    def refresh(self, request) -> None:
+        if self._corretor is None:
+            super().refresh(request)
+        else:
+            self._corretor.renovar(token_recusado=self.token)
+
+
+@contextmanager
+def trava_do_arquivo(caminho: str, espera: float = GMAIL_TOKEN_TRAVA_ESPERA):
+    """
+    Trava exclusiva entre processos (ex: vários workers do uvicorn) no arquivo '<caminho>.lock'.
+    Lança 'ErroDeToken' se outro processo a mantiver por mais de 'espera' segundos.
+    """
+    with open(f"{caminho}.lock", "a+b") as arquivo:
+        limite = time.monotonic() + espera
+        with medir("gmail.token_trava"):
+            while True:
+                try:
+                    if fcntl is not None:
+                        fcntl.flock(arquivo.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    else:  # pragma: no cover - só no Windows
+                        arquivo.seek(0)
+                        msvcrt.locking(arquivo.fileno(), msvcrt.LK_NBLCK, 1)
+                    break
+                except OSError:
+                    if time.monotonic() >= limite:
+                        raise ErroDeToken(
+                            f"Outro processo está renovando o token do Gmail há mais de {espera:.0f}s; tente novamente."
+                        )
+                    time.sleep(0.05)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(arquivo.fileno(), fcntl.LOCK_UN)
+            else:  # pragma: no cover - só no Windows
+                arquivo.seek(0)
+                msvcrt.locking(arquivo.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def ler_token(caminho: str, escopos: list[str]) -> Optional[CredenciaisCompartilhadas]:
+    """
+    Lê o token.json (None se o arquivo não existir). Um arquivo ilegível lança 'ErroDeToken' em vez
+    de cair no fluxo de autorização: apagar o arquivo é uma decisão de quem administra o servidor.
+    """
+    try:
+        with open(caminho, encoding="utf-8") as arquivo:
+            info = json.load(arquivo)
+    except FileNotFoundError:
+        return None
+    except ValueError as e:
+        raise ErroDeToken(f"O arquivo '{caminho}' está corrompido ({e}). Apague-o e autorize o acesso de novo.")
+    try:
+        return CredenciaisCompartilhadas.from_authorized_user_info(info, escopos)
+    except ValueError as e:
+        raise ErroDeToken(f"O arquivo '{caminho}' não é um token válido ({e}). Apague-o e autorize o acesso de novo.")
+
+
+def gravar_token(caminho: str, creds: Credentials) -> None:
+    """
+    Grava o token de forma atômica: escreve em um arquivo temporário na mesma pasta e o troca pelo
+    definitivo com 'os.replace'. Quem lê o token.json vê sempre o arquivo antigo ou o novo, nunca um pela metade.
+    """
+    pasta = os.path.dirname(os.path.abspath(caminho))
+    descritor, temporario = tempfile.mkstemp(prefix=".token-", suffix=".tmp", dir=pasta)
+    try:
+        with os.fdopen(descritor, "w", encoding="utf-8") as arquivo:
+            arquivo.write(creds.to_json())
+            arquivo.flush()
+            os.fsync(arquivo.fileno())
+        os.replace(temporario, caminho)
+    except BaseException:
+        try:
+            os.unlink(temporario)
+        except OSError:
+            pass
+        raise
+
+
+def _copiar_token(destino: Credentials, origem: Credentials) -> None:
+    """Copia o token de 'origem' para 'destino' (o objeto compartilhado pelos serviços do pool)."""
+    destino.token = origem.token
+    destino.expiry = origem.expiry
+    if origem.refresh_token:
+        destino._refresh_token = origem.refresh_token
+
+
+class CorretorDeToken:
+    """
+    Dono único do token do Gmail no processo, com renovações coordenadas entre threads e processos.
+
+    - Dentro do processo, uma trava garante uma única renovação por vez; quem esperava por ela reaproveita
+      o token novo (ele é comparado com o token que a API recusou ou que estava vencendo).
+    - Entre processos, a renovação acontece com a trava do '<token.json>.lock'. Depois de obtê-la, o arquivo
+      é relido: se outro worker já renovou, o token dele é adotado, sem nova ida ao servidor OAuth.
+    - O token.json é gravado de forma atômica, então nunca fica truncado.
+    """
+
+    def __init__(self, token_path: str, credentials_path: str, escopos: list[str],
+                 espera_trava: float = GMAIL_TOKEN_TRAVA_ESPERA):
+        self.token_path = token_path
+        self.credentials_path = credentials_path
+        self.escopos = escopos
+        self.espera_trava = espera_trava
+        self._creds: Optional[CredenciaisCompartilhadas] = None
+        self._lock = threading.Lock()
+        # Quantas vezes este processo foi de fato ao servidor OAuth (as demais renovações foram adotadas).
+        self.renovacoes = 0
+
+    def credenciais(self) -> CredenciaisCompartilhadas:
+        """Devolve as credenciais do processo, carregando-as (e renovando-as, se vencidas) na primeira chamada."""
+        if self._creds is None:
+            with self._lock:
+                if self._creds is None:
+                    with trava_do_arquivo(self.token_path, self.espera_trava):
+                        creds = ler_token(self.token_path, self.escopos)
+                        if not _vale_por(creds, VALIDADE_MINIMA):
+                            creds = self._obter_token_novo(creds)
+                    creds._corretor = self
+                    self._creds = creds
+        return self._creds
+
+    def renovar(self, antecedencia: float = VALIDADE_MINIMA, token_recusado: Optional[str] = None) -> None:
+        """
+        Garante um token que valha por mais de 'antecedencia' segundos e que não seja 'token_recusado'
+        (o que a API acabou de rejeitar). Só vai ao servidor OAuth se nem a memória nem o token.json tiverem um.
+        """
+        creds = self.credenciais()
+        antecedencia = max(antecedencia, VALIDADE_MINIMA)
+        with self._lock:
+            if creds.token != token_recusado and _vale_por(creds, antecedencia):
+                # Outra thread já renovou enquanto esta esperava.
+                return
+            with trava_do_arquivo(self.token_path, self.espera_trava):
+                do_arquivo = ler_token(self.token_path, self.escopos)
+                if do_arquivo is not None and do_arquivo.token not in (creds.token, token_recusado) \
+                        and _vale_por(do_arquivo, antecedencia):
+                    # Outro processo já renovou: adota o token dele.
+                    _copiar_token(creds, do_arquivo)
+                    return
+                _copiar_token(creds, self._obter_token_novo(do_arquivo or creds))
+
+    def _obter_token_novo(self, creds: Optional[Credentials]) -> CredenciaisCompartilhadas:
+        """
+        Renova 'creds' no servidor OAuth e grava o token.json. Chamada com as duas travas.
+        Nunca abre o navegador: sem token renovável, lança 'ErroDeToken' (a autorização é feita por 'autorizar').
+        """
+        if creds is None or not creds.refresh_token:
+            raise ErroDeToken(
+                f"Não há token do Gmail renovável em '{self.token_path}'. Autorize o acesso com "
+                "'python -m gmailbucket_agent.autorizar' e, se preciso, copie o token.json para o servidor."
+            )
+        with medir("gmail.token_renovacao"):
+            Credentials.refresh(creds, Request())
+        self.renovacoes += 1
+        gravar_token(self.token_path, creds)
+        return creds
+
+
+def autorizar(token_path: str, credentials_path: str, escopos: list[str]) -> Credentials:
+    """
+    Autoriza o acesso ao Gmail no navegador (fluxo OAuth de app instalado) e grava o token.json.
+    É um passo de instalação, feito na linha de comando: o servidor nunca abre o navegador.
+    """
+    # Importado aqui: só este passo precisa do 'google_auth_oauthlib'.
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    flow = InstalledAppFlow.from_client_secrets_file(credentials_path, escopos)
+    creds = flow.run_local_server(port=0)
+    with trava_do_arquivo(token_path):
+        gravar_token(token_path, creds)
+    return creds
+
@@ -3,26 +3,65 @@ import os
 # Importa o 'uvicorn', que é o servidor ASGI (Asynchronous Server Gateway Interface) que usaremos para rodar a aplicação.
 import uvicorn
 # Importa as classes necessárias do FastAPI para criar a aplicação e manipular uploads de arquivos.
-from fastapi import FastAPI, File, UploadFile
+from fastapi import FastAPI, File, Request, UploadFile
 # Importa a classe 'HTMLResponse' para retornar conteúdo HTML diretamente.
-from fastapi.responses import HTMLResponse
-# Importa a biblioteca cliente do Google Cloud Storage para fazer o upload dos arquivos.
-from google.cloud import storage
-# Importa a função 'load_dotenv' da biblioteca python-dotenv para carregar variáveis de um arquivo .env.
-from dotenv import load_dotenv
-
-# Executa a função para carregar as variáveis definidas no arquivo .env para o ambiente atual.
-load_dotenv()
+from fastapi.responses import HTMLResponse, PlainTextResponse
+# Importa 'StaticFiles' para servir os scripts da página de upload.
+from fastapi.staticfiles import StaticFiles
+# Importa 'BaseModel' do Pydantic para validar as requisições do upload direto.
+from pydantic import BaseModel
+# Importa 'Optional' para os campos opcionais das requisições.
+from typing import Optional
+# Importa a configuração compartilhada: carrega o .env, valida GCS_ATTACHMENT_PATH uma única vez
+# e mantém um único cliente do Google Cloud Storage para fazer o upload dos arquivos.
+from .config import obter_cliente_storage, obter_destino_gcs
+# Importa o envio em blocos (upload resumível) para o GCS e as suas configurações.
+from .gcs_upload import (
+    UPLOAD_CHUNK_SIZE, UPLOAD_DEDUPLICACAO, UPLOAD_MAX_BYTES, LimiteDeUploadMiddleware, concluir_upload_direto,
+    enviar_deduplicado, enviar_stream_para_gcs, iniciar_upload_direto, nome_seguro, validar_tamanho_upload,
+)
+# Importa a camada de E/S que executa as chamadas bloqueantes do GCS em um pool de threads limitado.
+from .io_executor import executar_io, obter_executor_io
+# Importa o registro de métricas (formato Prometheus) e a configuração opcional dos traços.
+from .metrics import configurar_tracos, exportar, por_rotulo, registro
+# Importa o controle de admissão (limite de uploads simultâneos, fila com prazo e recusas 429/503).
+from .admission import ADMISSAO_ATIVA, AdmissaoMiddleware, criar_controles
 
 # Cria uma instância da aplicação FastAPI, que será nosso servidor web.
 app = FastAPI()
+# Serve os scripts da página: o envio de arquivos compartilhado com o chat ('templates/js/upload.js') e o da página ('js/').
+_PASTA_PACOTE = os.path.dirname(os.path.abspath(__file__))
+app.mount("/templates", StaticFiles(directory=os.path.join(_PASTA_PACOTE, "templates")), name="templates")
+app.mount("/js", StaticFiles(directory=os.path.join(_PASTA_PACOTE, "js")), name="js")
+
+# O /metrics também exporta o estado do pool de E/S do GCS (fila, em execução, concluídas e falhas).
+registro.registrar_coletor("gmailbucket_io", lambda: por_rotulo(obter_executor_io().metricas(), "backend"))
+
+# Limita os uploads simultâneos (no total e por usuário); o excedente espera em uma fila curta e, acima dela,
+# recebe 429/503 com 'Retry-After' antes de o arquivo ser recebido.
+if ADMISSAO_ATIVA:
+    controles_de_admissao = criar_controles()
+    app.add_middleware(AdmissaoMiddleware, controles=controles_de_admissao)
+    registro.registrar_coletor("gmailbucket_admissao", lambda: por_rotulo(
+        {nome: controle.estado() for nome, controle in controles_de_admissao.items()}, "endpoint"
+    ))
+
+# Recusa com 413 os uploads maiores que UPLOAD_MAX_BYTES pelo 'Content-Length', antes de o corpo ser lido (e antes
+# de ocupar uma vaga da admissão); sem o cabeçalho, a leitura é interrompida assim que o limite é passado.
+app.add_middleware(LimiteDeUploadMiddleware)
+
+# Instala o exportador de traços (se TRACOS_EXPORTADOR estiver definido) quando o servidor sobe.
+@app.on_event("startup")
+async def iniciar_tracos():
+    configurar_tracos()
 
 # Define um endpoint para a raiz ("/") que responde a requisições GET e retorna um conteúdo HTML.
 @app.get("/", response_class=HTMLResponse)
 async def get_upload_page():
     """Esta função serve a página HTML de upload."""
-    # Abre o arquivo "upload.html" em modo de leitura com codificação UTF-8.
-    with open("upload.html", "r", encoding="utf-8") as f:
+    # Abre o arquivo "upload.html" (ao lado deste script) em modo de leitura com codificação UTF-8.
+    # O caminho é absoluto porque o servidor é iniciado como módulo ('python -m gmailbucket_agent.upload_server').
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "upload.html"), "r", encoding="utf-8") as f:
         # Lê o conteúdo do arquivo e o retorna como resposta.
         return f.read()
 
@@ -33,58 +72,58 @@ async def upload_file(file: UploadFile = File(...)):
     Esta função recebe o arquivo, faz o upload para o GCS
     e retorna o nome do arquivo.
     """
-    # Busca o valor da variável de ambiente 'GCS_ATTACHMENT_PATH', que deve conter o caminho no Google Cloud Storage.
-    gcs_path = os.getenv("GCS_ATTACHMENT_PATH")
-    # Verifica se a variável de ambiente não foi configurada.
-    if not gcs_path:
-        error_msg = "Erro de Configuração: A variável GCS_ATTACHMENT_PATH está faltando no seu .env."
+    # Lê o bucket e a pasta de GCS_ATTACHMENT_PATH (interpretados e validados uma única vez).
+    try:
+        destino = obter_destino_gcs()
+    except ValueError as e:
         # Imprime a mensagem de erro no console do servidor para depuração.
-        print(error_msg)
+        print(e)
         # Retorna uma resposta JSON indicando falha.
-        return {"success": False, "error": error_msg}
+        return {"success": False, "error": str(e)}
 
     # Bloco try/except para capturar possíveis erros durante o processo de upload.
     try:
-        # --- INÍCIO DA LÓGICA ROBUSTA ---
-        # Remove o prefixo 'gs://' se ele existir, para não quebrar o código
-        # Cria uma cópia da variável para processamento, mantendo a original intacta.
-        path_to_process = gcs_path
-        # Verifica se o caminho começa com "gs://".
-        if path_to_process.startswith("gs://"):
-            # Remove os 5 primeiros caracteres ("gs://") para obter um caminho limpo.
-            path_to_process = path_to_process[5:] 
-        # --- FIM DA LÓGICA ROBUSTA ---
-
-        # Agora, o resto do código funciona com um caminho limpo
-        # Verifica se o caminho contém uma barra, que é necessária para separar o bucket da pasta.
-        if '/' not in path_to_process:
+        # Verifica se o caminho contém uma pasta, além do bucket.
+        if not destino.prefixo:
             # Lança um erro se o formato for inválido (ex: apenas o nome do bucket).
             raise ValueError("O caminho no GCS_ATTACHMENT_PATH deve conter o nome do bucket e pelo menos uma pasta (ex: 'meu-bucket/anexos').")
 
-        # Inicializa o cliente do Google Cloud Storage que permitirá a comunicação com a API do GCS.
-        storage_client = storage.Client()
+        # Obtém o cliente compartilhado do Google Cloud Storage. Na primeira vez, a descoberta de
+        # credenciais é bloqueante, por isso a chamada roda no pool de E/S do GCS.
+        storage_client = await executar_io("gcs", obter_cliente_storage)
         
-        # Divide o caminho no primeiro "/" para separar o nome do bucket do caminho da pasta.
-        bucket_name, folder_path = path_to_process.split('/', 1)
-        # Obtém uma referência ao objeto do bucket usando o nome extraído.
+        # Monta o nome final do arquivo no GCS, combinando a pasta e o nome do arquivo original
+        # (só o nome, sem pastas: o cliente não escolhe onde o arquivo é gravado).
+        nome = nome_seguro(file.filename)
+        bucket_name, blob_name = destino.bucket, destino.nome_do_objeto(nome)
         bucket = storage_client.bucket(bucket_name)
         
-        # Monta o nome final do arquivo no GCS, combinando a pasta e o nome do arquivo original.
-        # .strip('/') remove barras extras do início ou fim do caminho da pasta.
-        blob_name = f"{folder_path.strip('/')}/{file.filename}"
-        # Cria um objeto "blob" que representa o arquivo a ser enviado para o bucket.
-        blob = bucket.blob(blob_name)
-        
-        # Lê o conteúdo do arquivo enviado na requisição de forma assíncrona.
-        content = await file.read()
-        # Faz o upload do conteúdo (em bytes) para o blob no GCS, preservando o 'content_type' original.
-        blob.upload_from_string(content, content_type=file.content_type)
+        # O corpo já foi limitado por 'LimiteDeUploadMiddleware'; aqui vale o tamanho do arquivo em si.
+        if file.size is not None:
+            validar_tamanho_upload(file.size, UPLOAD_MAX_BYTES)
+        if UPLOAD_DEDUPLICACAO:
+            # Guarda o conteúdo pelo seu SHA-256 (uma única cópia por conteúdo no bucket)
+            # e cria o apelido 'pasta/nome_do_arquivo', que aponta para ele.
+            resultado = await executar_io(
+                "gcs", enviar_deduplicado, bucket, destino, nome, file.file,
+                content_type=file.content_type, tamanho_chunk=UPLOAD_CHUNK_SIZE, tamanho_maximo=UPLOAD_MAX_BYTES,
+            )
+            situacao = "já existia; só o apelido foi gravado" if resultado["duplicado"] else "gravado"
+            print(f"Arquivo '{nome}' -> 'gs://{bucket_name}/{resultado['objeto']}' ({situacao}).")
+            return {"success": True, "filename": nome, "sha256": resultado["sha256"], "duplicado": resultado["duplicado"]}
+
+        # Envia o arquivo para o GCS em blocos de UPLOAD_CHUNK_SIZE bytes, preservando o 'content_type' original.
+        # Só um bloco fica na memória por vez, e um bloco que falhar é retomado do último byte gravado.
+        await executar_io(
+            "gcs", enviar_stream_para_gcs, bucket.blob(blob_name), file.file,
+            content_type=file.content_type, tamanho_chunk=UPLOAD_CHUNK_SIZE, tamanho_maximo=UPLOAD_MAX_BYTES,
+        )
         
         # Imprime uma mensagem de sucesso no console do servidor.
-        print(f"Arquivo '{file.filename}' enviado com sucesso para 'gs://{bucket_name}/{blob_name}'.")
+        print(f"Arquivo '{nome}' enviado com sucesso para 'gs://{bucket_name}/{blob_name}'.")
         
         # Retorna uma resposta JSON indicando sucesso e o nome do arquivo.
-        return {"success": True, "filename": file.filename}
+        return {"success": True, "filename": nome}
 
     # Captura qualquer exceção que possa ocorrer durante o bloco 'try'.
     except Exception as e:
@@ -93,6 +132,55 @@ async def upload_file(file: UploadFile = File(...)):
         # Retorna uma resposta JSON de falha com a mensagem de erro.
         return {"success": False, "error": str(e)}
 
+# Estrutura da requisição de upload direto: nome, tamanho e tipo do arquivo.
+class UploadDiretoRequest(BaseModel):
+    filename: str
+    size: int = 0
+    content_type: Optional[str] = None
+
+# Define um endpoint para "/upload/direto": abre a sessão resumível para o navegador enviar o arquivo direto ao GCS.
+@app.post("/upload/direto")
+async def upload_direto(pedido: UploadDiretoRequest, request: Request):
+    """
+    Esta função devolve a URL da sessão de upload; os blocos do arquivo vão do navegador direto
+    para o GCS, sem passar por este servidor.
+    """
+    try:
+        destino = obter_destino_gcs()
+        if not destino.prefixo:
+            raise ValueError("O caminho no GCS_ATTACHMENT_PATH deve conter o nome do bucket e pelo menos uma pasta (ex: 'meu-bucket/anexos').")
+        storage_client = await executar_io("gcs", obter_cliente_storage)
+        resultado = await executar_io(
+            "gcs", iniciar_upload_direto, storage_client.bucket(destino.bucket), destino, pedido.filename,
+            pedido.size, content_type=pedido.content_type, origem=request.headers.get("origin"),
+        )
+        return {"success": True, **resultado}
+    except Exception as e:
+        print(f"Erro ao abrir o upload direto: {e}")
+        return {"success": False, "error": str(e)}
+
+# Define um endpoint para "/upload/direto/concluir", chamado pelo navegador depois do último bloco.
+@app.post("/upload/direto/concluir")
+async def upload_direto_concluir(pedido: UploadDiretoRequest):
+    """Esta função confirma (pelos metadados, sem ler o conteúdo) que o arquivo chegou ao GCS."""
+    try:
+        destino = obter_destino_gcs()
+        storage_client = await executar_io("gcs", obter_cliente_storage)
+        resultado = await executar_io(
+            "gcs", concluir_upload_direto, storage_client.bucket(destino.bucket), destino, pedido.filename,
+        )
+        print(f"Arquivo '{resultado['filename']}' enviado direto ao GCS ({resultado['tamanho']} bytes).")
+        return {"success": True, **resultado}
+    except Exception as e:
+        print(f"Erro ao concluir o upload direto: {e}")
+        return {"success": False, "error": str(e)}
+
+# Define um endpoint GET com as métricas do servidor no formato de texto do Prometheus.
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Esta função devolve a duração dos uploads, os bytes enviados e os uploads em andamento."""
+    return PlainTextResponse(exportar(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # Este bloco de código é o ponto de entrada principal e só executa se o script for chamado diretamente.
 if __name__ == "__main__":
     # Inicia o servidor Uvicorn com a aplicação FastAPI.
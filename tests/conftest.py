@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+Configuração comum dos testes: sobe os servidores falsos do GCS e do Gmail ('benchmarks.fakes') e aponta
+o projeto para eles. Roda em 'pytest_configure', ANTES de qualquer teste importar 'gmailbucket_agent'
+(as configurações são lidas na importação).
+"""
+
+# --- Importações Padrão ---
+import shutil
+import tempfile
+
+import pytest
+
+from benchmarks import bench_desempenho
+from benchmarks.fakes import GCSFalso, GmailFalso, credenciais_falsas, permitir_upload_de_midia_por_http
+
+# Servidores falsos e pasta temporária (bancos SQLite, cache de anexos) compartilhados pela sessão de testes.
+_ambiente: dict = {}
+
+
+def pytest_configure(config):
+    _ambiente["pasta"] = tempfile.mkdtemp(prefix="gmailbucket-testes-")
+    _ambiente["gcs"] = GCSFalso().iniciar()
+    _ambiente["gmail"] = GmailFalso().iniciar()
+    bench_desempenho.configurar_ambiente(_ambiente["gcs"].url, _ambiente["gmail"].url, _ambiente["pasta"], False)
+    permitir_upload_de_midia_por_http()
+
+
+def pytest_unconfigure(config):
+    for nome in ("gcs", "gmail"):
+        if nome in _ambiente:
+            _ambiente.pop(nome).parar()
+    if "pasta" in _ambiente:
+        shutil.rmtree(_ambiente.pop("pasta"), ignore_errors=True)
+
+
+@pytest.fixture
+def gcs():
+    """O GCS falso, sem nenhum objeto gravado por testes anteriores."""
+    _ambiente["gcs"].objetos.clear()
+    return _ambiente["gcs"]
+
+
+@pytest.fixture
+def gmail():
+    """O Gmail falso, com o gerenciador de clientes do projeto usando credenciais que não expiram."""
+    from gmailbucket_agent.tools import gmail_client
+    for estado in (_ambiente["gmail"].enviados, _ambiente["gmail"].lotes, _ambiente["gmail"].recusados,
+                   _ambiente["gmail"].erros):
+        estado.clear()
+    anterior = gmail_client._gerenciador
+    gmail_client._gerenciador = gmail_client.GmailClientManager(credenciais=credenciais_falsas())
+    yield _ambiente["gmail"]
+    gmail_client._gerenciador.encerrar()
+    gmail_client._gerenciador = anterior
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""Testes do envio em lote ('enviar_emails_em_lote_sync') contra o endpoint de lote do Gmail falso."""
+
+from gmailbucket_agent.tools.batch import enviar_emails_em_lote_sync
+from gmailbucket_agent.tools.funcs import codificar_mensagem, definir_cabecalhos, montar_mensagem
+
+
+def _destinatarios(quantidade: int) -> list[str]:
+    return [f"pessoa{i}@exemplo.com" for i in range(quantidade)]
+
+
+def test_lote_vai_para_o_endpoint_configurado(gmail):
+    resumo = enviar_emails_em_lote_sync(_destinatarios(3), "Assunto", "Corpo")
+    assert resumo["status"] == "sucesso"
+    # Uma única requisição em lote, para o GMAIL_API_ENDPOINT (e não para www.googleapis.com).
+    assert gmail.lotes == [3]
+    assert [r["id"] for r in resumo["resultados"]] == [enviado["id"] for enviado in gmail.enviados]
+
+
+def test_erro_de_um_envio_fica_so_no_resultado_dele(gmail):
+    gmail.recusados.add("pessoa1@exemplo.com")
+    resumo = enviar_emails_em_lote_sync(_destinatarios(3), "Assunto", "Corpo")
+    assert resumo["status"] == "parcial"
+    assert (resumo["enviados"], resumo["falhas"]) == (2, 1)
+    # Um resultado por destinatário, na ordem da lista recebida.
+    assert [r["destinatario"] for r in resumo["resultados"]] == _destinatarios(3)
+    assert [r["sucesso"] for r in resumo["resultados"]] == [True, False, True]
+    assert "400" in resumo["resultados"][1]["erro"] and "pessoa1@exemplo.com" in resumo["resultados"][1]["erro"]
+    assert "erro" not in resumo["resultados"][0]
+
+
+def test_lote_que_falha_inteiro_marca_todos_os_envios(gmail):
+    gmail.erros.append(503)
+    resumo = enviar_emails_em_lote_sync(_destinatarios(3), "Assunto", "Corpo")
+    assert resumo["status"] == "erro"
+    assert all("503" in r["erro"] for r in resumo["resultados"])
+    assert gmail.enviados == []
+
+
+def test_lotes_fecham_pela_quantidade_e_pelos_bytes(gmail):
+    resumo = enviar_emails_em_lote_sync(_destinatarios(7), "Assunto", "Corpo", tamanho_lote=5)
+    assert resumo["status"] == "sucesso"
+    assert gmail.lotes == [5, 2]
+
+    gmail.lotes.clear()
+    # Todas as cópias têm o mesmo tamanho codificado: o limite comporta duas por lote.
+    message = montar_mensagem("Corpo")
+    definir_cabecalhos(message, ["pessoa0@exemplo.com"], "Assunto")
+    tamanho = len(codificar_mensagem(message)["raw"])
+    resumo = enviar_emails_em_lote_sync(_destinatarios(5), "Assunto", "Corpo", bytes_lote=2 * tamanho + 1)
+    assert resumo["status"] == "sucesso"
+    assert gmail.lotes == [2, 2, 1]
+
+
+def test_mensagem_maior_que_o_limite_vai_sozinha(gmail):
+    resumo = enviar_emails_em_lote_sync(_destinatarios(2), "Assunto", "Corpo", bytes_lote=10)
+    assert resumo["status"] == "sucesso"
+    assert gmail.lotes == []
+    assert len(gmail.enviados) == 2
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""Testes do /chat/stream: os eventos SSE saem na ordem em que o Runner os produz."""
+
+import json
+import asyncio
+
+from google.adk.agents import LlmAgent
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_response import LlmResponse
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from benchmarks.fakes import criar_modelo_falso
+from gmailbucket_agent.chat_stream import eventos_sse, garantir_sessao
+
+
+def somar(a: int, b: int) -> dict:
+    """Soma dois números."""
+    return {"resultado": a + b}
+
+
+class ModeloRoteirizado(BaseLlm):
+    """
+    Modelo falso de dois passos: primeiro transmite o texto em pedaços e pede a ferramenta 'somar';
+    depois da resposta da ferramenta, devolve o texto final. Com 'falhar', lança um erro na primeira chamada.
+    """
+
+    model: str = "roteirizado"
+    falhar: bool = False
+
+    async def generate_content_async(self, llm_request, stream=False):
+        if self.falhar:
+            raise RuntimeError("Modelo indisponível.")
+        ja_somou = any(parte.function_response for conteudo in llm_request.contents for parte in conteudo.parts or [])
+        if ja_somou:
+            yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text="A soma é 5.")]))
+            return
+        for pedaco in ("Vou ", "somar."):
+            yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=pedaco)]), partial=True)
+        yield LlmResponse(content=types.Content(role="model", parts=[
+            types.Part(text="Vou somar."),
+            types.Part(function_call=types.FunctionCall(name="somar", args={"a": 2, "b": 3})),
+        ]))
+
+
+def _coletar(modelo: BaseLlm) -> list[tuple]:
+    """Roda um turno com 'modelo' e devolve os eventos SSE como (nome, dados)."""
+    agente = LlmAgent(name="agente_teste", model=modelo, instruction="Responda.", tools=[somar])
+    runner = Runner(agent=agente, app_name="teste", session_service=InMemorySessionService())
+
+    async def turno():
+        session_id = await garantir_sessao(runner, "usuario", None)
+        return [bloco async for bloco in eventos_sse(runner, "usuario", session_id, "Quanto é 2 + 3?")]
+
+    eventos = []
+    for bloco in asyncio.run(turno()):
+        linha_evento, linha_dados = bloco.strip().split("\n")
+        eventos.append((linha_evento.removeprefix("event: "), json.loads(linha_dados.removeprefix("data: "))))
+    return eventos
+
+
+def test_eventos_saem_na_ordem_do_turno():
+    eventos = _coletar(ModeloRoteirizado())
+    assert [nome for nome, _ in eventos] == [
+        "inicio", "parcial", "parcial", "ferramenta", "mensagem", "resultado_ferramenta", "mensagem", "fim",
+    ]
+    assert [d["texto"] for nome, d in eventos if nome == "parcial"] == ["Vou ", "somar."]
+    assert eventos[3][1] == {"nome": "somar", "argumentos": {"a": 2, "b": 3}}
+    assert eventos[5][1] == {"nome": "somar", "resposta": {"resultado": 5}}
+    assert eventos[-2][1] == {"texto": "A soma é 5."}
+
+
+def test_erro_do_modelo_vira_evento_de_erro_antes_do_fim():
+    eventos = _coletar(ModeloRoteirizado(falhar=True))
+    assert [nome for nome, _ in eventos] == ["inicio", "erro", "fim"]
+    assert "Modelo indisponível" in eventos[1][1]["erro"]
+
+
+def test_endpoint_responde_em_text_event_stream(monkeypatch):
+    from fastapi.testclient import TestClient
+    from gmailbucket_agent import main
+
+    monkeypatch.setattr(main.root_agent, "model", criar_modelo_falso(texto="Olá!"))
+    resposta = TestClient(main.app).post("/chat/stream", json={"message": "Oi", "user_id": "teste-sse"})
+    assert resposta.status_code == 200
+    assert resposta.headers["content-type"].startswith("text/event-stream")
+    nomes = [linha.removeprefix("event: ") for linha in resposta.text.splitlines() if linha.startswith("event: ")]
+    assert nomes == ["inicio", "mensagem", "fim"]
+    assert 'data: {"texto": "Olá!"}' in resposta.text
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""Testes do orçamento do histórico (rascunho preservado no resumo) e do cache da instrução."""
+
+import time
+import json
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from google.adk.models.llm_request import LlmRequest
+from google.genai import errors as genai_errors
+from google.genai import types
+
+from gmailbucket_agent import context_budget
+from gmailbucket_agent.context_budget import aplicar_orcamento, estimar_tokens
+
+RESUMO_RASCUNHO = "Rascunho atual (ainda não enviado): "
+
+
+def _usuario(texto: str) -> types.Content:
+    return types.Content(role="user", parts=[types.Part(text=texto)])
+
+
+def _modelo(texto: str) -> types.Content:
+    return types.Content(role="model", parts=[types.Part(text=texto)])
+
+
+def _rascunho(assunto: str) -> types.Content:
+    """Resposta do agente no formato de confirmação do rascunho, com um corpo longo."""
+    return _modelo(
+        "Confira o rascunho:\n**Destinatários:** ana@exemplo.com\n"
+        f"**Assunto:** {assunto}\n**Corpo:**\n{'Texto do email. ' * 40}\n**Anexos:** relatorio.pdf"
+    )
+
+
+def _envio(assunto: str) -> list:
+    """Chamada de 'enviar_email' e a sua resposta."""
+    return [
+        types.Content(role="model", parts=[types.Part(function_call=types.FunctionCall(
+            id="envio-1", name="enviar_email", args={"destinatarios": ["ana@exemplo.com"], "assunto": assunto},
+        ))]),
+        types.Content(role="user", parts=[types.Part(function_response=types.FunctionResponse(
+            id="envio-1", name="enviar_email", response={"result": "Email enviado com sucesso."},
+        ))]),
+    ]
+
+
+def _resumo(conteudos: list) -> str:
+    assert conteudos[0].parts[0].text.startswith("[Contexto mantido pelo sistema")
+    return conteudos[0].parts[0].text
+
+
+def test_rascunho_cortado_continua_no_resumo():
+    conteudos = [
+        _usuario("Escreva um email para a Ana."), _rascunho("Relatório mensal"),
+        _usuario("Troque o assunto."), _rascunho("Relatório de março"),
+        _usuario("Qual é o dia de hoje?"), _modelo("Hoje é segunda-feira. " * 20),
+        _usuario("E amanhã?"), _modelo("Amanhã é terça-feira."),
+    ]
+    total = sum(estimar_tokens(conteudo) for conteudo in conteudos)
+    reduzidos, corte = aplicar_orcamento(conteudos, total // 3, turnos_recentes=1)
+    assert corte > 3  # a última versão do rascunho saiu do histórico...
+    resumo = _resumo(reduzidos)
+    # ...mas continua no resumo, como um bloco JSON com a versão mais recente.
+    linha = next(linha for linha in resumo.splitlines() if linha.startswith(RESUMO_RASCUNHO))
+    rascunho = json.loads(linha.removeprefix(RESUMO_RASCUNHO))
+    assert rascunho["assunto"] == "Relatório de março"
+    assert rascunho["destinatarios"] == "ana@exemplo.com"
+    assert rascunho["anexos"] == "relatorio.pdf"
+    assert rascunho["corpo"].startswith("Texto do email.")
+    assert reduzidos[1:] == conteudos[corte:]
+
+
+def test_rascunho_enviado_vira_linha_de_envio():
+    conteudos = [
+        _usuario("Escreva um email para a Ana."), _rascunho("Relatório mensal"),
+        _usuario("Pode enviar."), *_envio("Relatório mensal"), _modelo("Enviado!"),
+        _usuario("Obrigado. " * 50), _modelo("De nada. " * 50),
+        _usuario("Tchau."), _modelo("Até mais."),
+    ]
+    total = sum(estimar_tokens(conteudo) for conteudo in conteudos)
+    reduzidos, corte = aplicar_orcamento(conteudos, total // 2, turnos_recentes=1)
+    assert corte >= 5
+    resumo = _resumo(reduzidos)
+    assert RESUMO_RASCUNHO not in resumo
+    assert "- enviar_email para ana@exemplo.com, assunto 'Relatório mensal'" in resumo
+
+
+def test_historico_que_cabe_no_orcamento_nao_e_cortado():
+    conteudos = [_usuario("Oi"), _modelo("Olá!")]
+    assert aplicar_orcamento(conteudos, 1000) == (conteudos, 0)
+
+
+@pytest.fixture
+def caches(monkeypatch):
+    """Troca a API de caches por uma falsa; 'caches.erros' é a fila de exceções das próximas criações."""
+    falsa = SimpleNamespace(criados=0, erros=[])
+
+    async def criar(**kwargs):
+        if falsa.erros:
+            raise falsa.erros.pop(0)
+        falsa.criados += 1
+        return SimpleNamespace(name=f"cachedContents/{falsa.criados}")
+
+    falsa.create = criar
+    monkeypatch.setattr(context_budget, "_cliente_genai", SimpleNamespace(aio=SimpleNamespace(caches=falsa)))
+    for nome, valor in (("_caches", {}), ("_caches_recusados", set()), ("_caches_adiados", {}), ("_lock_caches", None)):
+        monkeypatch.setattr(context_budget, nome, valor)
+    return falsa
+
+
+def _obter_cache() -> str:
+    requisicao = LlmRequest(model="modelo", config=types.GenerateContentConfig(system_instruction="Instrução."))
+    return asyncio.run(context_budget._obter_cache(requisicao))
+
+
+def test_instrucao_abaixo_do_minimo_nunca_mais_tenta_o_cache(caches):
+    caches.erros.append(genai_errors.ClientError(400, {"error": {
+        "code": 400, "status": "INVALID_ARGUMENT",
+        "message": "Cached content is too small. total_token_count=10, min_total_token_count=4096",
+    }}))
+    assert _obter_cache() is None
+    assert _obter_cache() is None
+    assert caches.criados == 0 and caches.erros == []
+
+
+def test_falha_passageira_adia_e_depois_cria_o_cache(caches):
+    caches.erros.append(genai_errors.ServerError(503, {"error": {"code": 503, "status": "UNAVAILABLE", "message": "Sobrecarga."}}))
+    assert _obter_cache() is None
+    # Durante a espera, a requisição segue sem cache e sem nova tentativa.
+    assert _obter_cache() is None
+    assert caches.criados == 0
+    (chave, (falhas, _)), = context_budget._caches_adiados.items()
+    assert falhas == 1
+    # Passada a espera, a criação é tentada de novo e o cache passa a ser usado.
+    context_budget._caches_adiados[chave] = (falhas, time.time() - 1)
+    assert _obter_cache() == "cachedContents/1"
+    assert _obter_cache() == "cachedContents/1"
+    assert caches.criados == 1 and not context_budget._caches_adiados
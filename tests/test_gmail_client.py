@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""Testes do gerenciador de clientes do Gmail (credenciais carregadas uma vez e pool de serviços)."""
+
+import json
+import time
+import datetime
+import logging
+import threading
+
+import pytest
+from google.oauth2 import credentials as google_credentials
+
+from benchmarks.fakes import OAuthFalso, credenciais_falsas
+from gmailbucket_agent.tools import gmail_client
+from gmailbucket_agent.tools.funcs import codificar_mensagem, definir_cabecalhos, enviar_email_sync, montar_mensagem
+from gmailbucket_agent.tools.token_broker import VALIDADE_MINIMA
+
+# Margem de renovação dos testes: maior que a validade do token abaixo, para a thread renovar logo.
+ANTECEDENCIA = 600
+
+
+@pytest.fixture
+def oauth(monkeypatch):
+    with OAuthFalso() as servidor:
+        monkeypatch.setattr(google_credentials, "_GOOGLE_OAUTH2_TOKEN_ENDPOINT", f"{servidor.url}/token")
+        yield servidor
+
+
+@pytest.fixture
+def token_perto_de_expirar(tmp_path):
+    """Token ainda válido na carga (acima de VALIDADE_MINIMA), mas dentro da margem de renovação."""
+    caminho = tmp_path / "token.json"
+    expira = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=VALIDADE_MINIMA + 60)
+    caminho.write_text(json.dumps({
+        "token": "token-antigo", "refresh_token": "refresh-falso",
+        "client_id": "cliente-falso", "client_secret": "segredo-falso",
+        "scopes": gmail_client.SCOPES, "expiry": expira.strftime("%Y-%m-%dT%H:%M:%SZ"),
+    }))
+    return str(caminho)
+
+
+def _aguardar(condicao, prazo: float = 10.0) -> None:
+    limite = time.monotonic() + prazo
+    while not condicao():
+        assert time.monotonic() < limite, "a condição não foi atendida a tempo"
+        time.sleep(0.05)
+
+
+def test_envios_seguidos_reaproveitam_o_mesmo_servico(gmail):
+    for i in range(3):
+        resposta = enviar_email_sync(["a@exemplo.com"], f"Assunto {i}", "Corpo")
+        assert resposta.startswith("Email enviado com sucesso")
+    assert len(gmail.enviados) == 3
+    # Um único 'build' (documento de descoberta lido uma vez) para os três envios.
+    assert gmail_client.obter_gerenciador_gmail()._criados == 1
+
+
+def test_pool_cria_no_maximo_tamanho_pool_servicos(gmail):
+    gerenciador = gmail_client.GmailClientManager(tamanho_pool=2, credenciais=credenciais_falsas())
+    emprestados = []
+    todos_dentro = threading.Barrier(2)
+
+    def usar():
+        with gerenciador.servico() as service:
+            emprestados.append(service)
+            todos_dentro.wait(timeout=5)
+
+    threads = [threading.Thread(target=usar) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Dois empréstimos simultâneos recebem serviços distintos (cada um com o seu 'Http')...
+    assert len({id(service) for service in emprestados}) == 2
+
+    # ...e os seguintes reaproveitam os que voltaram ao pool, sem criar outros.
+    for _ in range(5):
+        with gerenciador.servico() as service:
+            assert service in emprestados
+    assert gerenciador._criados == 2
+    gerenciador.encerrar()
+
+
+def test_token_e_renovado_em_segundo_plano_e_o_pool_usa_o_novo(gmail, oauth, token_perto_de_expirar):
+    gerenciador = gmail_client.GmailClientManager(token_perto_de_expirar, "", antecedencia_renovacao=ANTECEDENCIA)
+    try:
+        with gerenciador.servico() as service:
+            # A carga não renova: o token ainda vale mais que VALIDADE_MINIMA.
+            assert service._http.credentials.token == "token-antigo"
+        assert oauth.renovacoes == 0
+
+        # A thread de renovação acorda (espera mínima de 1s) e troca o token antes de ele expirar.
+        _aguardar(lambda: gerenciador.credenciais().token == "token-1")
+        assert oauth.renovacoes == 1
+        message = montar_mensagem("Corpo")
+        definir_cabecalhos(message, ["a@exemplo.com"], "Assunto")
+        for _ in range(3):
+            with gerenciador.servico() as service:
+                # O serviço já criado no pool enxerga o token renovado (as credenciais são as mesmas).
+                assert service._http.credentials.token == "token-1"
+                service.users().messages().send(userId="me", body=codificar_mensagem(message)).execute()
+        assert len(gmail.enviados) == 3
+        assert gerenciador._criados == 1
+        # Nenhuma renovação no caminho do envio.
+        assert oauth.renovacoes == 1
+    finally:
+        gerenciador.encerrar()
+
+
+def test_falha_na_renovacao_em_segundo_plano_vai_para_o_log(oauth, token_perto_de_expirar, caplog):
+    oauth.erros.append(400)
+    gerenciador = gmail_client.GmailClientManager(token_perto_de_expirar, "", antecedencia_renovacao=ANTECEDENCIA)
+    with caplog.at_level(logging.WARNING, logger=gmail_client.__name__):
+        try:
+            assert gerenciador.credenciais().token == "token-antigo"
+            _aguardar(lambda: any("Falha ao renovar o token" in r.getMessage() for r in caplog.records))
+        finally:
+            gerenciador.encerrar()
+    # O token atual continua em uso até a próxima tentativa.
+    assert gerenciador.credenciais().token == "token-antigo"
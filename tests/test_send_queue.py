@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""Testes da fila durável de envios ('FilaDeEnvios' e 'TrabalhadoresDeEnvio') contra o Gmail falso."""
+
+import asyncio
+import time
+
+import pytest
+from googleapiclient.errors import HttpError
+
+from gmailbucket_agent.tools import send_queue
+from gmailbucket_agent.tools.send_queue import (
+    ENVIADO, INCERTO, SITUACOES_FINAIS, FilaDeEnvios, TrabalhadoresDeEnvio,
+)
+
+
+@pytest.fixture
+def fila(tmp_path):
+    # Taxa alta: só os testes do limite de taxa dependem dela.
+    return FilaDeEnvios(str(tmp_path / "envios.db"), por_segundo=100, rajada=10)
+
+
+@pytest.fixture
+def sem_espera(monkeypatch):
+    """Tentativas seguintes sem a espera exponencial (o Gmail falso não manda Retry-After)."""
+    monkeypatch.setattr(send_queue, "espera_exponencial", lambda tentativa: 0.0)
+
+
+def _esvaziar(fila: FilaDeEnvios, ids: list, quantidade: int = 2, prazo: float = 10.0) -> list:
+    """Roda os workers até todos os envios chegarem a uma situação final e devolve os envios."""
+    async def rodar():
+        trabalhadores = TrabalhadoresDeEnvio(fila, quantidade)
+        trabalhadores.iniciar()
+        try:
+            limite = time.monotonic() + prazo
+            while any(fila.consultar(i)["status"] not in SITUACOES_FINAIS for i in ids):
+                assert time.monotonic() < limite, "a fila não esvaziou a tempo"
+                await asyncio.sleep(0.02)
+        finally:
+            await trabalhadores.parar()
+
+    asyncio.run(rodar())
+    return [fila.consultar(i) for i in ids]
+
+
+def test_mesma_chave_agendada_duas_vezes_envia_uma_vez(gmail, fila):
+    envio, novo = fila.agendar(["ana@exemplo.com"], "Assunto", "Corpo")
+    repetido, novo_repetido = fila.agendar(["ana@exemplo.com"], "Assunto", "Corpo")
+    assert (novo, novo_repetido) == (True, False)
+    assert repetido["id"] == envio["id"]
+
+    [enviado] = _esvaziar(fila, [envio["id"]])
+    assert enviado["status"] == ENVIADO
+    assert len(gmail.enviados) == 1
+    assert enviado["gmail_id"] == gmail.enviados[0]["id"]
+
+    # Agendar de novo depois do envio devolve o envio concluído, sem reenviar.
+    depois, novo_depois = fila.agendar(["ana@exemplo.com"], "Assunto", "Corpo")
+    assert (depois["id"], depois["status"], novo_depois) == (envio["id"], ENVIADO, False)
+    assert fila.contagem() == {ENVIADO: 1}
+
+
+def test_erro_temporario_e_tentado_de_novo_ate_enviar(gmail, fila, sem_espera):
+    gmail.erros.extend([503, 429])
+    envio, _ = fila.agendar(["ana@exemplo.com"], "Assunto", "Corpo")
+
+    [enviado] = _esvaziar(fila, [envio["id"]], quantidade=1)
+    assert enviado["status"] == ENVIADO
+    assert enviado["tentativas"] == 3
+    assert len(gmail.enviados) == 1
+
+
+def test_erro_temporario_para_no_limite_de_tentativas(gmail, tmp_path, sem_espera):
+    fila = FilaDeEnvios(str(tmp_path / "envios.db"), por_segundo=100, rajada=10, max_tentativas=2)
+    gmail.erros.extend([503, 503, 503])
+    envio, _ = fila.agendar(["ana@exemplo.com"], "Assunto", "Corpo")
+
+    [falhou] = _esvaziar(fila, [envio["id"]], quantidade=1)
+    assert falhou["status"] == send_queue.FALHOU
+    assert falhou["tentativas"] == 2
+    assert "503" in falhou["erro"]
+    assert gmail.enviados == []
+
+
+def test_limite_de_taxa_espaca_os_envios(gmail, tmp_path):
+    fila = FilaDeEnvios(str(tmp_path / "envios.db"), por_segundo=10, rajada=1)
+    ids = [fila.agendar([f"pessoa{i}@exemplo.com"], "Assunto", "Corpo")[0]["id"] for i in range(4)]
+
+    enviados = _esvaziar(fila, ids, quantidade=4)
+    assert all(envio["status"] == ENVIADO for envio in enviados)
+    # Uma ficha por envio, reposta a cada 0,1s: mesmo com 4 workers, os envios saem espaçados.
+    instantes = sorted(enviado["instante"] for enviado in gmail.enviados)
+    assert len(instantes) == 4
+    intervalos = [depois - antes for antes, depois in zip(instantes, instantes[1:])]
+    assert min(intervalos) >= 0.08
+
+
+def test_429_esvazia_o_balde(gmail, tmp_path, monkeypatch):
+    # Espera fixa: com o "jitter" completo ela poderia sair perto de zero.
+    monkeypatch.setattr(send_queue, "espera_exponencial", lambda tentativa: 1.0)
+    fila = FilaDeEnvios(str(tmp_path / "envios.db"), por_segundo=10, rajada=5)
+    fila.agendar(["ana@exemplo.com"], "Assunto", "Corpo")
+    fila.agendar(["bia@exemplo.com"], "Assunto", "Corpo")
+    gmail.erros.append(429)
+
+    envio, _ = fila.reservar()
+    with pytest.raises(HttpError) as erro:
+        send_queue._enviar_agendado(envio)
+    assert fila.registrar_falha(envio, erro.value) == send_queue.PENDENTE
+
+    # O balde tinha fichas para a rajada, mas depois do 429 ninguém envia antes da espera.
+    proximo, espera = fila.reservar()
+    assert proximo is None
+    assert espera > 0
+
+
+def test_envio_interrompido_vira_incerto_depois_de_reiniciar(gmail, tmp_path):
+    caminho = str(tmp_path / "envios.db")
+    fila = FilaDeEnvios(caminho, reserva=0.05)
+    envio, _ = fila.agendar(["ana@exemplo.com"], "Assunto", "Corpo")
+    reservado, _ = fila.reservar()
+    assert reservado["id"] == envio["id"]
+    # O processo "caiu" com o envio em ENVIANDO; outro processo abre o mesmo banco.
+    time.sleep(0.1)
+
+    reaberta = FilaDeEnvios(caminho)
+    assert reaberta.reservar() == (None, send_queue.ENVIOS_INTERVALO)
+    recuperado = reaberta.consultar(envio["id"])
+    assert recuperado["status"] == INCERTO
+    # Não se sabe se o email saiu: ele não é reenviado às cegas.
+    _esvaziar(reaberta, [envio["id"]])
+    assert gmail.enviados == []
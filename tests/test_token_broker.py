@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""Testes do corretor de token: uma única renovação por vez, entre threads e entre processos."""
+
+import json
+import datetime
+import threading
+
+import pytest
+from google.oauth2 import credentials as google_credentials
+
+from benchmarks import bench_token
+from benchmarks.fakes import OAuthFalso
+from gmailbucket_agent.tools.gmail_client import SCOPES
+from gmailbucket_agent.tools.token_broker import CorretorDeToken, ErroDeToken
+
+
+@pytest.fixture
+def oauth(monkeypatch):
+    with OAuthFalso(latencia=0.05) as servidor:
+        monkeypatch.setattr(google_credentials, "_GOOGLE_OAUTH2_TOKEN_ENDPOINT", f"{servidor.url}/token")
+        yield servidor
+
+
+@pytest.fixture
+def token_vencido(tmp_path):
+    caminho = tmp_path / "token.json"
+    vencido = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(minutes=5)
+    caminho.write_text(json.dumps({
+        "token": "token-vencido", "refresh_token": "refresh-falso",
+        "client_id": "cliente-falso", "client_secret": "segredo-falso",
+        "scopes": SCOPES, "expiry": vencido.strftime("%Y-%m-%dT%H:%M:%SZ"),
+    }))
+    return str(caminho)
+
+
+def _em_paralelo(funcao, threads: int = 8) -> list:
+    """Chama 'funcao' em várias threads liberadas ao mesmo tempo e devolve os resultados (ou exceções)."""
+    largada = threading.Barrier(threads)
+    resultados = []
+
+    def trabalhador():
+        largada.wait(timeout=5)
+        try:
+            resultados.append(funcao())
+        except Exception as e:
+            resultados.append(e)
+
+    grupo = [threading.Thread(target=trabalhador) for _ in range(threads)]
+    for thread in grupo:
+        thread.start()
+    for thread in grupo:
+        thread.join()
+    return resultados
+
+
+def test_threads_compartilham_uma_renovacao(oauth, token_vencido):
+    corretor = CorretorDeToken(token_vencido, "", SCOPES)
+    tokens = {creds.token for creds in _em_paralelo(corretor.credenciais)}
+    assert tokens == {"token-1"}
+    assert oauth.renovacoes == 1
+
+    # A API recusa o token em todas as threads ao mesmo tempo: ainda assim, uma única renovação.
+    _em_paralelo(lambda: corretor.renovar(token_recusado="token-1"))
+    assert oauth.renovacoes == 2
+    assert corretor.credenciais().token == "token-2"
+    # O token.json foi regravado inteiro, com o token novo.
+    assert json.load(open(token_vencido))["token"] == "token-2"
+
+
+def test_processos_compartilham_uma_renovacao_por_fase():
+    medidas = bench_token.medir("corretor", processos=3, threads=4, latencia=0.05)
+    assert medidas["erros"] == 0, medidas["exemplos_de_erro"]
+    assert (medidas["renovacoes_fase1"], medidas["renovacoes_fase2"]) == (1, 1)
+
+
+def test_sem_token_renovavel_nao_abre_o_navegador(tmp_path):
+    corretor = CorretorDeToken(str(tmp_path / "token.json"), "", SCOPES)
+    with pytest.raises(ErroDeToken, match="gmailbucket_agent.autorizar"):
+        corretor.credenciais()
+
+
+def test_token_corrompido_lanca_erro_de_token(tmp_path):
+    caminho = tmp_path / "token.json"
+    caminho.write_text('{"token": "trunc')
+    with pytest.raises(ErroDeToken, match="corrompido"):
+        CorretorDeToken(str(caminho), "", SCOPES).credenciais()
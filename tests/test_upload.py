@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""Testes do POST /upload com deduplicação (conteúdo guardado pelo SHA-256, nomes de arquivo seguros) e da retomada do upload."""
+
+import io
+import hashlib
+
+import pytest
+from fastapi.testclient import TestClient
+
+from benchmarks.bench_desempenho import BUCKET, PASTA
+from gmailbucket_agent import main
+from gmailbucket_agent.config import obter_cliente_storage
+from gmailbucket_agent.gcs_upload import enviar_stream_para_gcs
+
+
+@pytest.fixture
+def cliente(gcs):
+    return TestClient(main.app)
+
+
+def _enviar(cliente, nome: str, dados: bytes) -> dict:
+    return cliente.post("/upload", files={"file": (nome, dados, "text/plain")}).json()
+
+
+def test_conteudo_repetido_so_grava_o_apelido(cliente, gcs):
+    dados = b"relatorio " * 1000
+    sha256 = hashlib.sha256(dados).hexdigest()
+
+    primeiro = _enviar(cliente, "a.txt", dados)
+    assert primeiro == {"success": True, "filename": "a.txt", "sha256": sha256, "duplicado": False}
+    assert gcs.objetos[(BUCKET, f"{PASTA}/objetos/{sha256}")]["dados"] == dados
+
+    recebidos = gcs.bytes_recebidos
+    segundo = _enviar(cliente, "b.txt", dados)
+    assert segundo == {"success": True, "filename": "b.txt", "sha256": sha256, "duplicado": True}
+    # O conteúdo repetido não foi enviado de novo: só o apelido (vazio, com os metadados) chegou ao GCS.
+    assert gcs.bytes_recebidos - recebidos < len(dados)
+    assert sorted(nome for _, nome in gcs.objetos) == [f"{PASTA}/a.txt", f"{PASTA}/b.txt", f"{PASTA}/objetos/{sha256}"]
+
+
+def test_conteudo_gravado_por_outro_upload_no_meio_tempo_e_duplicado(cliente, gcs, monkeypatch):
+    from google.cloud.storage import Blob
+
+    dados = b"corrida"
+    sha256 = hashlib.sha256(dados).hexdigest()
+
+    def nao_existe_ainda(self, *args, **kwargs):
+        # A consulta não vê o conteúdo, mas ele aparece antes do fim do envio: a gravação condicional é recusada (412).
+        gcs.guardar(BUCKET, self.name, dados)
+        return False
+
+    monkeypatch.setattr(Blob, "exists", nao_existe_ainda)
+    resposta = _enviar(cliente, "c.txt", dados)
+    assert resposta == {"success": True, "filename": "c.txt", "sha256": sha256, "duplicado": True}
+
+
+@pytest.mark.parametrize("nome", ["objetos/{sha256}", "../objetos/{sha256}", "objetos"])
+def test_nome_em_pasta_reservada_e_recusado(cliente, gcs, nome):
+    dados = b"conteudo compartilhado"
+    sha256 = hashlib.sha256(dados).hexdigest()
+    assert _enviar(cliente, "original.txt", dados)["success"]
+    conteudo = dict(gcs.objetos[(BUCKET, f"{PASTA}/objetos/{sha256}")])
+
+    resposta = _enviar(cliente, nome.format(sha256=sha256), b"outra coisa")
+    assert not resposta["success"]
+    assert "reservada" in resposta["error"]
+    # O conteúdo compartilhado continua intacto.
+    assert gcs.objetos[(BUCKET, f"{PASTA}/objetos/{sha256}")] == conteudo
+
+
+def test_nome_com_pastas_fica_so_com_o_nome_do_arquivo(cliente, gcs):
+    resposta = _enviar(cliente, "../../outra-pasta/d.txt", b"d")
+    assert resposta["success"] and resposta["filename"] == "d.txt"
+    assert (BUCKET, f"{PASTA}/d.txt") in gcs.objetos
+
+
+def test_consulta_de_progresso_com_5xx_continua_tentando(gcs, monkeypatch):
+    from google.cloud.storage import Blob
+
+    dados = b"retomada " * 1000
+    original = Blob.create_resumable_upload_session
+
+    def sessao_e_depois_falhas(self, *args, **kwargs):
+        url = original(self, *args, **kwargs)
+        # O envio do bloco falha e a consulta de progresso que vem em seguida também.
+        gcs.erros.extend([503, 503])
+        return url
+
+    monkeypatch.setattr(Blob, "create_resumable_upload_session", sessao_e_depois_falhas)
+    blob = obter_cliente_storage().bucket(BUCKET).blob(f"{PASTA}/e.txt")
+    recurso = enviar_stream_para_gcs(blob, io.BytesIO(dados), "text/plain", max_tentativas=3)
+    assert int(recurso["size"]) == len(dados)
+    assert gcs.erros == []
+    assert gcs.objetos[(BUCKET, f"{PASTA}/e.txt")]["dados"] == dados
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""Testes do upload direto para o GCS: sessão resumível aberta pelo servidor e conclusão sem ler o conteúdo."""
+
+import pytest
+import requests
+from fastapi.testclient import TestClient
+from google.cloud import storage
+
+from benchmarks.bench_desempenho import BUCKET, PASTA
+from gmailbucket_agent import gcs_upload, main
+from gmailbucket_agent.config import obter_destino_gcs
+
+
+@pytest.fixture
+def cliente(gcs):
+    return TestClient(main.app)
+
+
+def _abrir(cliente, nome: str, tamanho: int) -> dict:
+    return cliente.post("/upload/direto", json={"filename": nome, "size": tamanho}).json()
+
+
+def _concluir(cliente, nome: str, tamanho: int) -> dict:
+    return cliente.post("/upload/direto/concluir", json={"filename": nome, "size": tamanho}).json()
+
+
+def _enviar_blocos(sessao: dict, dados: bytes) -> None:
+    """Faz o que o navegador faz: envia os bytes direto para a sessão do GCS."""
+    resposta = requests.put(sessao["url_sessao"], data=dados,
+                            headers={"Content-Range": f"bytes 0-{len(dados) - 1}/{len(dados)}"})
+    assert resposta.ok, resposta.text
+
+
+def test_arquivo_vai_direto_ao_gcs_e_a_conclusao_so_le_os_metadados(cliente, gcs):
+    dados = b"conteudo do anexo" * 100
+    sessao = _abrir(cliente, "../a.txt", len(dados))
+    assert sessao["success"] and sessao["filename"] == "a.txt"
+    _enviar_blocos(sessao, dados)
+
+    enviados = gcs.bytes_enviados
+    resposta = _concluir(cliente, "a.txt", len(dados))
+    assert resposta == {"success": True, "filename": "a.txt", "tamanho": len(dados)}
+    # O servidor não baixou o arquivo para concluir o upload.
+    assert gcs.bytes_enviados == enviados
+    assert gcs.objetos[(BUCKET, f"{PASTA}/a.txt")]["dados"] == dados
+    assert [nome for _, nome in gcs.objetos] == [f"{PASTA}/a.txt"]
+
+
+def test_conclusao_sem_o_arquivo_no_gcs_e_recusada(cliente):
+    assert _abrir(cliente, "c.txt", 3)["success"]
+    resposta = _concluir(cliente, "c.txt", 3)
+    assert not resposta["success"]
+    assert "ainda não foi concluído" in resposta["error"]
+
+
+def test_arquivo_maior_que_o_limite_e_apagado_na_conclusao(cliente, gcs):
+    sessao = _abrir(cliente, "grande.bin", 10)
+    # A sessão aceita o tamanho declarado; o limite é conferido no que de fato chegou.
+    _enviar_blocos(sessao, b"x" * 100)
+    with pytest.raises(ValueError, match="UPLOAD_MAX_BYTES"):
+        gcs_upload.concluir_upload_direto(storage.Client().bucket(BUCKET), obter_destino_gcs(), "grande.bin",
+                                          tamanho_maximo=50)
+    assert (BUCKET, f"{PASTA}/grande.bin") not in gcs.objetos
+
+
+def test_nome_na_pasta_dos_conteudos_e_recusado(cliente, gcs):
+    resposta = _abrir(cliente, "objetos/" + "0" * 64, 1)
+    assert not resposta["success"] and "reservada" in resposta["error"]